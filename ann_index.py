@@ -0,0 +1,162 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from sparse_matrix import CSRMatrix, top_k_indices
+
+# Приближенный поиск ближайших соседей (IVF, inverted file):
+#   1. Документы проецируются в пространство малой размерности разреженной случайной
+#      проекцией (каждый термин - несколько координат со случайным знаком) и
+#      кластеризуются сферическим k-means (по косинусу).
+#   2. Центроид кластера - нормированная сумма векторов TF-IDF его документов в исходном
+#      пространстве терминов; центроиды хранятся разреженной матрицей.
+#   3. Строки матрицы документов переставляются так, чтобы документы одного кластера
+#      шли подряд. Запрос выбирает n_probe кластеров с наибольшим сходством с центроидом
+#      и считает точные оценки только по элементам своих терминов внутри этих кластеров.
+# Чем больше n_probe, тем выше полнота и дольше поиск; n_probe = n_lists - точный поиск.
+
+DEFAULT_DIM = 128
+DEFAULT_ITERATIONS = 10
+PROJECTION_NONZEROS = 4
+ROW_BLOCK = 65536
+
+
+def project_rows(matrix: CSRMatrix, dim: int, seed: int) -> np.ndarray:
+    """Разреженная случайная проекция строк в dim измерений с нормировкой строк"""
+    rng = np.random.default_rng(seed)
+    dims = rng.integers(0, dim, size=(matrix.n_cols, PROJECTION_NONZEROS))
+    signs = rng.choice([-1.0, 1.0], size=(matrix.n_cols, PROJECTION_NONZEROS))
+
+    projected = np.zeros((matrix.n_rows, dim), dtype=np.float32)
+    # Блоками строк, чтобы промежуточные массивы не росли с размером корпуса
+    for start in range(0, matrix.n_rows, ROW_BLOCK):
+        end = min(start + ROW_BLOCK, matrix.n_rows)
+        lo, hi = matrix.indptr[start], matrix.indptr[end]
+        rows = np.repeat(np.arange(end - start), np.diff(matrix.indptr[start:end + 1]))
+        indices, data = matrix.indices[lo:hi], matrix.data[lo:hi]
+        block = np.zeros((end - start) * dim)
+        for k in range(PROJECTION_NONZEROS):
+            block += np.bincount(rows * dim + dims[indices, k], weights=data * signs[indices, k],
+                                 minlength=len(block))
+        projected[start:end] = block.reshape(end - start, dim)
+
+    norms = np.linalg.norm(projected, axis=1, keepdims=True)
+    np.divide(projected, norms, out=projected, where=norms > 0)
+    return projected
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int, seed: int) -> np.ndarray:
+    """Кластеризация нормированных векторов по косинусу; возвращает номер кластера каждой строки"""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    centroids = vectors[rng.choice(n, size=n_clusters, replace=False)].copy()
+    assignment = np.zeros(n, dtype=np.int64)
+
+    for _ in range(iterations + 1):
+        for start in range(0, n, ROW_BLOCK):
+            assignment[start:start + ROW_BLOCK] = np.argmax(vectors[start:start + ROW_BLOCK] @ centroids.T, axis=1)
+        if _ == iterations:
+            break
+
+        # Новые центроиды - нормированные суммы векторов кластеров
+        counts = np.bincount(assignment, minlength=n_clusters)
+        order = np.argsort(assignment, kind='stable')
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        centroids[nonempty] = np.add.reduceat(vectors[order], starts, axis=0)
+        # Пустые кластеры получают случайный документ
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = vectors[rng.choice(n, size=len(empty), replace=False)]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        np.divide(centroids, norms, out=centroids, where=norms > 0)
+    return assignment
+
+
+def take_rows(matrix: CSRMatrix, rows: np.ndarray) -> CSRMatrix:
+    """Матрица из указанных строк в указанном порядке"""
+    lengths = np.diff(matrix.indptr)[rows]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    positions = np.repeat(matrix.indptr[rows] - indptr[:-1], lengths) + np.arange(indptr[-1])
+    return CSRMatrix(indptr, matrix.indices[positions], matrix.data[positions], matrix.n_cols)
+
+
+class IVFIndex:
+    """Индекс приближенного поиска: кластеры документов с разреженными центроидами"""
+
+    def __init__(self, centroids: CSRMatrix, list_ptr: np.ndarray, doc_rows: np.ndarray, lists_matrix: CSRMatrix):
+        self.centroids = centroids        # Центроиды кластеров в пространстве терминов
+        self.list_ptr = list_ptr          # Кластер l - строки [list_ptr[l], list_ptr[l+1]) в lists_matrix
+        self.doc_rows = doc_rows          # Строка lists_matrix -> номер документа в исходной матрице
+        self.lists_matrix = lists_matrix  # Матрица документов, упорядоченных по кластерам
+        # Границы кластеров в позициях элементов lists_matrix
+        self.list_positions = lists_matrix.indptr[list_ptr]
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.list_ptr) - 1
+
+    @classmethod
+    def build(cls, matrix: CSRMatrix, n_lists: int = 0, dim: int = DEFAULT_DIM,
+              iterations: int = DEFAULT_ITERATIONS, seed: int = 0) -> 'IVFIndex':
+        """Строит индекс по матрице нормированных векторов документов (по умолчанию sqrt(N) кластеров)"""
+        n_docs = matrix.n_rows
+        n_lists = min(n_docs, n_lists or max(1, int(round(np.sqrt(n_docs)))))
+        assignment = spherical_kmeans(project_rows(matrix, dim, seed), n_lists, iterations, seed)
+
+        doc_rows = np.argsort(assignment, kind='stable')
+        list_ptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_ptr[1:])
+        lists_matrix = take_rows(matrix, doc_rows)
+
+        # Центроиды: суммы строк кластера по терминам, нормированные
+        element_lists = np.repeat(assignment, np.diff(matrix.indptr))
+        keys, inverse = np.unique(element_lists * matrix.n_cols + matrix.indices, return_inverse=True)
+        sums = np.bincount(inverse, weights=matrix.data, minlength=len(keys))
+        rows = keys // matrix.n_cols
+        norms = np.sqrt(np.bincount(rows, weights=sums * sums, minlength=n_lists))
+        indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_lists), out=indptr[1:])
+        centroids = CSRMatrix(indptr, (keys % matrix.n_cols).astype(np.int32), sums / norms[rows], matrix.n_cols)
+        return cls(centroids, list_ptr, doc_rows, lists_matrix)
+
+    def search(self, term_ids: Sequence[int], weights: Sequence[float], top_k: int,
+               n_probe: int) -> Tuple[List[Tuple[int, float]], Dict[str, int]]:
+        """Поиск в n_probe ближайших кластерах; возвращает (номер документа, оценка) и статистику"""
+        list_scores = self.centroids.dot_columns(term_ids, weights)
+        probed = top_k_indices(list_scores, n_probe)
+        # В кластере с нулевым сходством с центроидом ни один документ не содержит терминов запроса
+        probed = np.sort(probed[list_scores[probed] > 0])
+
+        matrix = self.lists_matrix
+        starts, ends = self.list_positions[probed], self.list_positions[probed + 1]
+        position_parts, weight_parts = [], []
+        for term_id, weight in zip(term_ids, weights):
+            # Позиции элементов столбца возрастают, поэтому элементы кластера - непрерывный отрезок
+            column = matrix.col_order[matrix.col_ptr[term_id]:matrix.col_ptr[term_id + 1]]
+            lo, hi = np.searchsorted(column, starts), np.searchsorted(column, ends)
+            lengths = hi - lo
+            within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            position_parts.append(column[np.repeat(lo, lengths) + within])
+            weight_parts.append(np.full(lengths.sum(), weight))
+
+        positions = np.concatenate(position_parts) if position_parts else np.zeros(0, dtype=np.int64)
+        rows = np.searchsorted(matrix.indptr, positions, side='right') - 1
+        touched, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts) * matrix.data[positions]
+                             if position_parts else None, minlength=len(touched))
+
+        # Порядок при равных оценках - по номеру документа, как при полном переборе
+        docs = self.doc_rows[touched]
+        order = np.argsort(docs, kind='stable')
+        docs, scores = docs[order], scores[order]
+        top = top_k_indices(scores, top_k)
+        stats = {'lists_probed': len(probed), 'n_lists': self.n_lists,
+                 'candidates': int((self.list_ptr[probed + 1] - self.list_ptr[probed]).sum()),
+                 'postings_evaluated': len(positions)}
+        return [(int(docs[i]), float(scores[i])) for i in top if scores[i] > 0], stats
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти индекса (включая переставленную копию матрицы документов)"""
+        return self.centroids.nbytes + self.lists_matrix.nbytes + self.list_ptr.nbytes + self.doc_rows.nbytes
@@ -0,0 +1,183 @@
+import os
+import time
+import random
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Ограничение частоты запросов к одному хосту: rate запросов в секунду, всплеск до burst"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ждет, пока в ведре появится жетон, и забирает его"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CrawlStats:
+    """Счетчики загрузки для отчета о пропускной способности"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.retries = 0
+        self.downloaded = 0
+        self.failed = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0
+        return (f"Страниц: {self.downloaded}, ошибок: {self.failed}, запросов: {self.requests}, "
+                f"повторов: {self.retries}, время: {elapsed:.2f} с, "
+                f"{self.downloaded / elapsed if elapsed else 0:.1f} страниц/с, "
+                f"{self.bytes / 2**20 / elapsed if elapsed else 0:.2f} МБ/с, "
+                f"задержка p50 {p50:.0f} мс, p99 {p99:.0f} мс")
+
+
+class AsyncCrawler:
+    """Асинхронный загрузчик страниц.
+
+    Соединения переиспользуются (keep-alive) в общем пуле aiohttp, число одновременных
+    запросов ограничено concurrency, а частота запросов к каждому хосту - ведром жетонов.
+    Неудачные запросы повторяются с экспоненциальной задержкой. Номера файлов
+    присваиваются успешным страницам в порядке списка URL, как в последовательном режиме.
+    """
+
+    def __init__(self, output_dir: str, index_path: str, concurrency: int = 16,
+                 host_rate: float = 5.0, host_burst: int = 5, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 10.0, max_pages: int = 100):
+        self.output_dir = output_dir
+        self.index_path = index_path
+        self.concurrency = concurrency
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats = CrawlStats()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+        return bucket
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """Загружает страницу с повторами; возвращает текст или None"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats.retries += 1
+                # Экспоненциальная задержка со случайной добавкой, чтобы повторы не шли разом
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+            await self._bucket(url).acquire()
+            self.stats.requests += 1
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        # Ошибки кодировки не должны терять страницу: неверные байты заменяются
+                        text = await response.text(errors='replace')
+                        self.stats.latencies.append(time.perf_counter() - start)
+                        return text
+                    if response.status not in RETRY_STATUSES:
+                        print(f"Не удалось загрузить страницу {url}: HTTP {response.status}")
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Ошибка при загрузке {url}: {e!r}")
+        return None
+
+    async def _worker(self, session: aiohttp.ClientSession, queue: asyncio.Queue,
+                      results: Dict[int, Optional[str]], ready: asyncio.Event) -> None:
+        while True:
+            position, url = await queue.get()
+            try:
+                results[position] = await self.fetch(session, url)
+            except Exception as e:
+                # Любая другая ошибка страницы не должна останавливать обработчик: иначе
+                # результат позиции не появится и crawl будет ждать его бесконечно
+                print(f"Ошибка при обработке {url}: {e!r}")
+                results[position] = None
+            finally:
+                queue.task_done()
+                ready.set()
+
+    async def crawl(self, urls: List[str]) -> List[Tuple[int, str]]:
+        """Загружает страницы; возвращает список (номер файла, URL) успешно загруженных"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        queue: asyncio.Queue = asyncio.Queue()
+        for position, url in enumerate(urls):
+            queue.put_nowait((position, url))
+
+        results: Dict[int, Optional[str]] = {}
+        ready = asyncio.Event()
+        saved: List[Tuple[int, str]] = []
+        next_position = 0
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={'User-Agent': USER_AGENT}) as session:
+            workers = [asyncio.create_task(self._worker(session, queue, results, ready))
+                       for _ in range(min(self.concurrency, len(urls)))]
+            with open(self.index_path, 'w', encoding='utf-8', buffering=1024 * 1024) as index_file:
+                index_file.write("Номер файла\tURL\n")
+                # Результаты записываются по порядку списка: готовый непрерывный префикс
+                # сбрасывается на диск, остальные ждут в памяти
+                while next_position < len(urls) and len(saved) < self.max_pages:
+                    await ready.wait()
+                    ready.clear()
+                    while next_position in results and len(saved) < self.max_pages:
+                        text = results.pop(next_position)
+                        url = urls[next_position]
+                        next_position += 1
+                        if text is None:
+                            self.stats.failed += 1
+                            continue
+                        file_number = len(saved) + 1
+                        with open(os.path.join(self.output_dir, f"{file_number}.html"), 'w', encoding='utf-8') as f:
+                            f.write(text)
+                        index_file.write(f"{file_number}\t{url}\n")
+                        saved.append((file_number, url))
+                        self.stats.downloaded += 1
+                        self.stats.bytes += len(text.encode('utf-8'))
+
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return saved
+
+
+def crawl(urls: List[str], output_dir: str, index_path: str, **options) -> Tuple[List[Tuple[int, str]], CrawlStats]:
+    """Синхронная обертка: загружает страницы и возвращает сохраненные страницы и статистику"""
+    crawler = AsyncCrawler(output_dir, index_path, **options)
+    saved = asyncio.run(crawler.crawl(urls))
+    return saved, crawler.stats
@@ -0,0 +1,100 @@
+import time
+import argparse
+
+import numpy as np
+
+from bench_search import synthetic_term
+from search_engine import MODEL_PATH, VectorSearchEngine
+
+
+def topical_corpus(engine: VectorSearchEngine, n_docs: int, n_topics: int, vocab_size: int,
+                   doc_len: int, seed: int = 0) -> None:
+    """Синтетический корпус с тематической структурой: большая часть слов документа
+    берется из словаря его темы, остальные - из общего словаря (частоты по закону Ципфа)"""
+    rng = np.random.default_rng(seed)
+    probabilities = 1.0 / np.arange(1, vocab_size + 1)
+    probabilities /= probabilities.sum()
+    topic_terms = [rng.permutation(vocab_size) for _ in range(n_topics)]
+
+    indptr, indices, counts = [0], [], []
+    for doc in range(n_docs):
+        topic = topic_terms[rng.integers(n_topics)]
+        n_topic = rng.binomial(doc_len, 0.7)
+        ids = np.concatenate([topic[rng.choice(vocab_size, size=n_topic, p=probabilities)],
+                              rng.choice(vocab_size, size=doc_len - n_topic, p=probabilities)])
+        terms, term_counts = np.unique(ids, return_counts=True)
+        indices.append(terms)
+        counts.append(term_counts)
+        indptr.append(indptr[-1] + len(terms))
+
+    indices = np.concatenate(indices)
+    df = np.bincount(indices, minlength=vocab_size)
+    idf = np.log(n_docs / np.maximum(df, 1))
+    weights = np.concatenate(counts) / doc_len * idf[indices]
+    engine.build_from_csr([synthetic_term(i) for i in range(vocab_size)], [str(i + 1) for i in range(n_docs)],
+                          np.asarray(indptr, dtype=np.int64), indices, weights)
+
+
+def sample_queries(engine: VectorSearchEngine, n_queries: int, seed: int = 0) -> list:
+    """Запросы из 1-3 терминов случайного документа"""
+    rng = np.random.default_rng(seed + 1)
+    matrix = engine._csr_matrix()
+    queries = []
+    while len(queries) < n_queries:
+        cols, _ = matrix.row(int(rng.integers(matrix.n_rows)))
+        if len(cols):
+            picked = rng.choice(cols, size=min(len(cols), int(rng.integers(1, 4))), replace=False)
+            queries.append(' '.join(engine.id_to_term[col] for col in picked.tolist()))
+    return queries
+
+
+def timed_search(engine: VectorSearchEngine, queries: list, top_k: int, **options):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(engine.search(query, top_k, **options).results)
+        latencies.append(time.perf_counter() - start)
+    return results, np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Полнота recall@10 и задержки приближенного поиска (mode=ann) '
+                                                 'относительно точного поиска')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='вместо модели - синтетический корпус с темами из указанного числа документов')
+    parser.add_argument('--topics', type=int, default=200)
+    parser.add_argument('--storage', default='csr')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    engine = VectorSearchEngine(args.storage, cache_size=0)
+    if args.synthetic:
+        topical_corpus(engine, args.synthetic, args.topics, vocab_size=100_000, doc_len=200)
+    else:
+        engine.load_model(args.model)
+    queries = sample_queries(engine, args.queries)
+
+    start = time.perf_counter()
+    engine.warm_up(ann=True)
+    ann = engine.ann
+    print(f"Документов {len(engine.doc_ids)}, кластеров {ann.n_lists}; индекс построен за "
+          f"{time.perf_counter() - start:.1f} с, {ann.nbytes / 2**20:.1f} МБ")
+
+    # Эталон - точный поиск; документы с нулевой оценкой не учитываются
+    exact, exact_ms = timed_search(engine, queries, args.top_k)
+    truth = [{doc for doc, score in result if score > 0} for result in exact]
+    print(f"точный поиск: среднее {exact_ms.mean():7.3f} мс, p99 {np.percentile(exact_ms, 99):7.3f} мс")
+
+    for n_probe in sorted({min(p, ann.n_lists) for p in args.probes}):
+        approximate, ann_ms = timed_search(engine, queries, args.top_k, mode='ann', n_probe=n_probe)
+        recall = np.mean([len(expected & {doc for doc, _ in result}) / len(expected)
+                          for expected, result in zip(truth, approximate) if expected])
+        print(f"n_probe {n_probe:>4}: recall@{args.top_k} {recall:6.3f}, среднее {ann_ms.mean():7.3f} мс, "
+              f"p99 {np.percentile(ann_ms, 99):7.3f} мс, ускорение {exact_ms.mean() / ann_ms.mean():5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import time
+import random
+import argparse
+
+from search_engine import MODEL_PATH, STORAGE_BACKENDS, VectorSearchEngine
+
+
+def same_results(single, batch, tolerance: float = 1e-9) -> bool:
+    """Совпадение документов и оценок (оценки могут отличаться в последних битах из-за порядка сложения)"""
+    if len(single) != len(batch):
+        return False
+    for (doc_a, score_a), (doc_b, score_b) in zip(single, batch):
+        if abs(score_a - score_b) > tolerance:
+            return False
+        if doc_a != doc_b and abs(score_a - score_b) > 0:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетный поиск (search_many) против цикла вызовов search')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--queries', type=int, default=5000, help='число запросов в пакете')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, nargs='+', default=list(STORAGE_BACKENDS))
+    args = parser.parse_args()
+
+    for storage in args.storage:
+        engine = VectorSearchEngine(storage)
+        engine.load_model(args.model)
+        terms = list(engine.term_to_id)
+        rng = random.Random(0)
+        queries = [' '.join(rng.sample(terms, rng.randint(1, 4))) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        single = [engine.search(query, args.top_k).results for query in queries]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = engine.search_many(queries, args.top_k)
+        batch_time = time.perf_counter() - start
+
+        # При равных оценках документы могут идти в разном порядке, только если оценки
+        # различаются в последних битах; сравниваем с допуском
+        matches = sum(same_results(a, b) for a, b in zip(single, batch))
+        print(f"{storage:>5}: документов {len(engine.doc_ids)}, запросов {len(queries)}; "
+              f"search в цикле {len(queries) / single_time:9.0f} запросов/с, "
+              f"search_many {len(queries) / batch_time:9.0f} запросов/с "
+              f"(ускорение {single_time / batch_time:5.1f}x); совпадает {matches}/{len(queries)}")
+
+
+if __name__ == '__main__':
+    main()
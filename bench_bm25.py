@@ -0,0 +1,101 @@
+import time
+import argparse
+from typing import Callable, List
+
+import numpy as np
+
+from search_engine import MODEL_PATH, VectorSearchEngine
+from tfidf_model import TfIdfModel
+
+
+def time_queries(run: Callable[[str], object], queries: List[str]) -> float:
+    """Среднее время одного запроса в миллисекундах"""
+    start = time.perf_counter()
+    for query in queries:
+        run(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def known_item_queries(model: TfIdfModel, n_queries: int, seed: int) -> List[tuple]:
+    """Запросы из 2-4 слов случайного документа (слова выбираются пропорционально числу вхождений).
+
+    Документ, из которого взят запрос, считается искомым: по его рангу оценивается качество.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    while len(queries) < n_queries:
+        row = int(rng.integers(len(model.doc_ids)))
+        start, end = model.indptr[row], model.indptr[row + 1]
+        if end - start < 2:
+            continue
+        counts = model.counts[start:end].astype(np.float64)
+        picked = rng.choice(model.indices[start:end], size=min(end - start, int(rng.integers(2, 5))),
+                            replace=False, p=counts / counts.sum())
+        queries.append((' '.join(model.terms[term] for term in picked.tolist()), model.doc_ids[row]))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержки и качество BM25 с досрочной остановкой в сравнении с косинусом')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model = TfIdfModel.load(args.model)
+    engine = VectorSearchEngine('csr', cache_size=0)
+    start = time.perf_counter()
+    engine.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights, model.idf)
+    cosine_time = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights, model.idf,
+                          model.counts)
+    bm25_time = time.perf_counter() - start - cosine_time
+    print(f"Документов {len(model.doc_ids)}, терминов {len(model.terms)}; индекс BM25 {engine.bm25.nbytes / 2**20:.1f} МБ "
+          f"(с прямым индексом), построение {bm25_time:.1f} с")
+
+    queries = known_item_queries(model, args.queries, args.seed)
+    texts = [query for query, _ in queries]
+    engine.warm_up()
+
+    def bm25_exhaustive(query: str):
+        return engine.bm25.search(engine.query_terms(query), args.top_k, early_termination=False)
+
+    cases = (
+        ('косинус, перебор', lambda query: engine.search(query, args.top_k)),
+        ('косинус, maxscore', lambda query: engine.search(query, args.top_k, mode='maxscore')),
+        ('BM25, все записи', bm25_exhaustive),
+        ('BM25, с остановкой', lambda query: engine.search(query, args.top_k, mode='bm25')),
+    )
+    for name, run in cases:
+        print(f"{name:>20}: {time_queries(run, texts):7.3f} мс на запрос")
+
+    # Досрочная остановка не должна менять результат
+    evaluated = total = same = 0
+    for query in texts:
+        early, stats, _ = engine.search(query, args.top_k, mode='bm25')
+        evaluated += stats['postings_evaluated']
+        total += stats['postings_total']
+        ranked, _ = bm25_exhaustive(query)
+        same += [doc for doc, _ in early[:len(ranked)]] == [engine.doc_ids[doc] for doc, _ in ranked]
+    print(f"Просмотрено записей с остановкой: {evaluated / max(1, total):.3f} от всех; "
+          f"совпадение с полным просмотром {same / len(texts):.3f}")
+
+    # Качество: ранг документа, из которого взят запрос (MRR и доля найденных в top-k)
+    for mode in ('exhaustive', 'bm25'):
+        ranks = []
+        for query, doc_id in queries:
+            found = [doc for doc, score in engine.search(query, args.top_k, mode=mode).results if score > 0]
+            ranks.append(found.index(doc_id) + 1 if doc_id in found else 0)
+        ranks = np.array(ranks)
+        print(f"{mode:>10}: MRR@{args.top_k} {np.mean(np.divide(1.0, ranks, out=np.zeros(len(ranks)), where=ranks > 0)):.3f}, "
+              f"искомый документ в top-{args.top_k} {np.mean(ranks > 0):.3f}")
+    overlap = np.mean([len({doc for doc, _ in engine.search(query, args.top_k).results}
+                           & {doc for doc, _ in engine.search(query, args.top_k, mode='bm25').results}) / args.top_k
+                       for query in texts])
+    print(f"Пересечение top-{args.top_k} BM25 и косинуса: {overlap:.3f}")
+
+
+if __name__ == '__main__':
+    main()
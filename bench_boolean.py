@@ -0,0 +1,90 @@
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from postings import Complement, intersect, make_postings, materialize, union
+
+
+def synthetic_postings(n_docs: int, n_terms: int, seed: int) -> List[np.ndarray]:
+    """Генерирует списки документов с частотами по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    postings = []
+    for rank in range(1, n_terms + 1):
+        df = max(1, int(n_docs * min(0.5, 0.3 / rank ** 0.8)))
+        postings.append(np.sort(rng.choice(n_docs, size=df, replace=False)).astype(np.uint32))
+    return postings
+
+
+def measure_memory(build: Callable[[], object]):
+    """Строит структуру и возвращает ее вместе с объемом выделенной памяти"""
+    tracemalloc.start()
+    structure = build()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, allocated
+
+
+def time_queries(run: Callable[[int, int], object], pairs, repeats: int) -> float:
+    """Медианное время одного запроса в миллисекундах"""
+    timings = []
+    for a, b in pairs:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            run(a, b)
+        timings.append((time.perf_counter() - start) / repeats)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение множеств строк и целочисленных списков в булевом поиске')
+    parser.add_argument('--docs', type=int, default=200_000)
+    parser.add_argument('--terms', type=int, default=2_000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    n_docs = args.docs
+    raw = synthetic_postings(n_docs, args.terms, args.seed)
+    total_postings = sum(len(numbers) for numbers in raw)
+    doc_names = [str(number + 1) for number in range(n_docs)]
+    print(f"Документов: {n_docs}, терминов: {args.terms}, записей: {total_postings}")
+
+    # Прежнее представление: множества строковых идентификаторов
+    sets, sets_bytes = measure_memory(lambda: [{doc_names[n] for n in numbers.tolist()} for numbers in raw])
+    all_documents = set(doc_names)
+    # Новое представление: номера документов в массивах или битовых картах
+    compact, compact_bytes = measure_memory(lambda: [make_postings(numbers.tolist(), n_docs) for numbers in raw])
+
+    print(f"Память на запись: множества {sets_bytes / total_postings:.1f} Б, "
+          f"списки {compact_bytes / total_postings:.2f} Б")
+
+    # Пары терминов: частый с редким, два частых, два редких
+    rng = np.random.default_rng(args.seed + 1)
+    pairs = [(int(rng.integers(0, 20)), int(rng.integers(0, args.terms))) for _ in range(args.queries)]
+
+    def value(term: int):
+        return compact[term].value(n_docs)
+
+    cases: Dict[str, tuple] = {
+        'a AND b': (lambda a, b: sets[a] & sets[b],
+                    lambda a, b: materialize(intersect(value(a), value(b), n_docs), n_docs)),
+        'a OR b': (lambda a, b: sets[a] | sets[b],
+                   lambda a, b: materialize(union([value(a), value(b)], n_docs), n_docs)),
+        'a AND NOT b': (lambda a, b: sets[a] & (all_documents - sets[b]),
+                        lambda a, b: materialize(intersect(value(a), Complement(value(b)), n_docs), n_docs)),
+        'NOT b': (lambda a, b: all_documents - sets[b],
+                  lambda a, b: materialize(Complement(value(b)), n_docs)),
+    }
+    print(f"{'запрос':>12} {'множества, мс':>14} {'списки, мс':>11} {'ускорение':>10}")
+    for name, (baseline, optimized) in cases.items():
+        baseline_ms = time_queries(baseline, pairs, args.repeats)
+        optimized_ms = time_queries(optimized, pairs, args.repeats)
+        print(f"{name:>12} {baseline_ms:>14.3f} {optimized_ms:>11.3f} {baseline_ms / optimized_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
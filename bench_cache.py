@@ -0,0 +1,73 @@
+import time
+import random
+import argparse
+
+import numpy as np
+
+from lab3 import InvertedIndex
+from query_cache import CACHE_POLICIES
+from search_engine import MODEL_PATH, VectorSearchEngine
+
+
+def query_stream(terms: list, n_queries: int, n_popular: int, one_off: float, operators: bool, seed: int = 0) -> list:
+    """Поток запросов: популярные запросы с частотами по закону Ципфа вперемешку с однократными"""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+
+    def make_query() -> str:
+        words = rng.sample(terms, rng.randint(1, 3))
+        return f" {rng.choice(['AND', 'OR'])} ".join(words) if operators else ' '.join(words)
+
+    popular = [make_query() for _ in range(n_popular)]
+    probabilities = 1.0 / np.arange(1, n_popular + 1)
+    probabilities /= probabilities.sum()
+    choices = np_rng.choice(n_popular, size=n_queries, p=probabilities).tolist()
+    return [make_query() if rng.random() < one_off else popular[choice] for choice in choices]
+
+
+def run(name: str, make_engine, queries: list, cache_size: int) -> None:
+    for policy in ('off',) + CACHE_POLICIES:
+        engine = make_engine(0 if policy == 'off' else cache_size, 'lru' if policy == 'off' else policy)
+        start = time.perf_counter()
+        for query in queries:
+            engine.search(query)
+        elapsed = time.perf_counter() - start
+        stats = engine.cache.stats()
+        print(f"{name:>8}, кэш {policy:>7}: {len(queries) / elapsed:8.0f} запросов/с, "
+              f"среднее {elapsed / len(queries) * 1000:6.3f} мс, попаданий {stats['hit_rate']:6.1%}, "
+              f"из кэша {stats['hit_latency_ms']:6.3f} мс, вычисление {stats['miss_latency_ms']:6.3f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Кэш результатов запросов: доля попаданий и задержки по политикам')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--index', default='inverted_index.txt', help='текстовый индекс для булева поиска')
+    parser.add_argument('--queries', type=int, default=50000, help='длина потока запросов')
+    parser.add_argument('--popular', type=int, default=20000, help='число различных популярных запросов')
+    parser.add_argument('--one-off', type=float, default=0.3, help='доля однократных запросов')
+    parser.add_argument('--cache-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    def vector_engine(cache_size, policy):
+        engine = VectorSearchEngine('csr', cache_size, policy)
+        engine.load_model(args.model)
+        return engine
+
+    terms = list(vector_engine(0, 'lru').term_to_id)
+    queries = query_stream(terms, args.queries, args.popular, args.one_off, operators=False)
+    print(f"Запросов {len(queries)}, популярных {args.popular}, однократных {args.one_off:.0%}, "
+          f"размер кэша {args.cache_size}")
+    run('вектор', vector_engine, queries, args.cache_size)
+
+    def boolean_index(cache_size, policy):
+        index = InvertedIndex(cache_size, policy)
+        index.load_index(args.index)
+        return index
+
+    terms = sorted(boolean_index(0, 'lru').index)
+    queries = query_stream(terms, args.queries, args.popular, args.one_off, operators=True)
+    run('булев', boolean_index, queries, args.cache_size)
+
+
+if __name__ == '__main__':
+    main()
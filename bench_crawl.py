@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from async_crawler import crawl
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Локальная замена сайта: статьи /ru/articles/N/ с задержкой, пропусками и временными сбоями"""
+
+    protocol_version = 'HTTP/1.1'   # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_times.append(time.monotonic())
+            attempt = server.attempts[self.path] = server.attempts.get(self.path, 0) + 1
+        time.sleep(server.latency)
+
+        number = int(self.path.strip('/').split('/')[-1])
+        if number in server.missing:
+            status, body = 404, b'not found'
+        elif number in server.flaky and attempt == 1:
+            status, body = 503, b'try again'
+        else:
+            status = 200
+            body = f"<html><body><h1>Статья {number}</h1><p>{'текст ' * server.page_words}</p></body></html>".encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Загрузчик закрывает соединения незавершенных запросов, когда набрано нужное число страниц
+        pass
+
+
+def start_server(latency: float, missing: set, flaky: set, page_words: int) -> StandInServer:
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    server.latency = latency
+    server.missing = missing
+    server.flaky = flaky
+    server.page_words = page_words
+    server.lock = threading.Lock()
+    server.request_times = []
+    server.attempts = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def max_requests_per_second(times: list) -> int:
+    """Наибольшее число запросов в любом окне длиной в секунду"""
+    times = sorted(times)
+    best, start = 0, 0
+    for end in range(len(times)):
+        while times[end] - times[start] >= 1.0:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка и замер асинхронного загрузчика на локальном сервере')
+    parser.add_argument('--urls', type=int, default=300, help='число URL в списке')
+    parser.add_argument('--max-pages', type=int, default=200, help='сколько страниц загрузить')
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа сервера, с')
+    parser.add_argument('--page-words', type=int, default=2000, help='размер страницы в словах')
+    parser.add_argument('--rate', type=float, default=50.0, help='запросов в секунду к хосту')
+    parser.add_argument('--burst', type=int, default=10, help='всплеск запросов к хосту')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    missing = set(rng.sample(range(1, args.urls + 1), args.urls // 10))
+    flaky = set(rng.sample(range(1, args.urls + 1), args.urls // 20)) - missing
+    server = start_server(args.latency, missing, flaky, args.page_words)
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{host}/ru/articles/{number}/" for number in range(1, args.urls + 1)]
+
+    # Ожидаемый результат последовательного режима: успешные страницы по порядку списка
+    expected = [url for number, url in zip(range(1, args.urls + 1), urls) if number not in missing][:args.max_pages]
+    print(f"URL: {args.urls}, отсутствуют: {len(missing)}, временные сбои: {len(flaky)}, "
+          f"задержка сервера {args.latency * 1000:.0f} мс, лимит {args.rate:g} запросов/с к хосту")
+    print(f"Последовательный режим с паузой 1 с занял бы не меньше {len(expected) + len(missing):.0f} с")
+
+    for concurrency in args.concurrency:
+        with server.lock:
+            server.request_times.clear()
+            server.attempts.clear()
+        work_dir = tempfile.mkdtemp()
+        try:
+            output_dir = os.path.join(work_dir, 'pages')
+            index_path = os.path.join(work_dir, 'index.txt')
+            saved, stats = crawl(urls, output_dir, index_path, concurrency=concurrency,
+                                 host_rate=args.rate, host_burst=args.burst, retries=3,
+                                 backoff=0.05, max_pages=args.max_pages)
+            same = [url for _, url in saved] == expected
+            files_ok = all(os.path.exists(os.path.join(output_dir, f"{number}.html")) for number, _ in saved)
+            peak = max_requests_per_second(server.request_times)
+            print(f"concurrency={concurrency:>3}: {stats.report()}")
+            print(f"               порядок как у последовательного режима: {'да' if same and files_ok else 'НЕТ'}, "
+                  f"пик {peak} запросов/с (лимит {args.rate:g} + всплеск {args.burst})")
+        finally:
+            shutil.rmtree(work_dir)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+from lab2 import Tokenizer
+
+
+def run(tokenizer: Tokenizer, files: list[str]) -> tuple[float, int, list[set[str]]]:
+    """Извлекает токены из всех файлов; возвращает время, пик памяти и токены"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = [tokenizer.extract_tokens(file_path) for file_path in files]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение способов извлечения текста из HTML')
+    parser.add_argument('--pages', default='pages', help='директория с HTML-файлами')
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз пройти по файлам')
+    args = parser.parse_args()
+
+    files = [os.path.join(args.pages, name) for name in sorted(os.listdir(args.pages)) if name.endswith('.html')]
+    files = files * args.repeat
+    total_mb = sum(os.path.getsize(file_path) for file_path in files) / 2**20
+    print(f"Файлов: {len(files)}, объем: {total_mb:.1f} МБ")
+
+    reference = None
+    for name in ('bs4', 'stream', 'stream-nochrome'):
+        elapsed, peak, tokens = run(Tokenizer(name), files)
+        if reference is None:
+            reference = tokens
+            check = 'эталон'
+        else:
+            same = sum(a == b for a, b in zip(reference, tokens))
+            check = f"совпадает с bs4: {same}/{len(files)}"
+        print(f"{name:>16}: {elapsed:7.2f} с, {total_mb / elapsed:6.2f} МБ/с, "
+              f"пик памяти {peak / 2**20:6.1f} МБ, {check}")
+
+
+if __name__ == '__main__':
+    main()
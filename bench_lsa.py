@@ -0,0 +1,70 @@
+import time
+import argparse
+
+import numpy as np
+
+from lsa import LsaModel
+from search_engine import MODEL_PATH, VectorSearchEngine
+from tfidf_model import TfIdfModel
+
+
+def ndcg(ranked: list, gains: dict, k: int) -> float:
+    """NDCG@k списка документов; релевантность - оценка точного поиска"""
+    dcg = sum(gains.get(doc, 0.0) / np.log2(i + 2) for i, doc in enumerate(ranked[:k]))
+    ideal = sum(gain / np.log2(i + 2) for i, gain in enumerate(sorted(gains.values(), reverse=True)[:k]))
+    return dcg / ideal if ideal > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Качество ранжирования и память режима LSA относительно TF-IDF')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--ranks', type=int, nargs='+', default=[25, 50, 100, 200])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    model = TfIdfModel.load(args.model)
+    engine = VectorSearchEngine('csr', cache_size=0)
+    engine.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights)
+
+    # Запросы из 1-3 терминов случайного документа
+    rng = np.random.default_rng(0)
+    queries = []
+    while len(queries) < args.queries:
+        cols, _ = engine.doc_matrix.row(int(rng.integers(len(engine.doc_ids))))
+        if len(cols):
+            picked = rng.choice(cols, size=min(len(cols), int(rng.integers(1, 4))), replace=False)
+            queries.append(' '.join(engine.id_to_term[col] for col in picked.tolist()))
+
+    start = time.perf_counter()
+    exact = [engine.search(query, args.top_k).results for query in queries]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    gains = [{doc: score for doc, score in result if score > 0} for result in exact]
+
+    n_docs = len(engine.doc_ids)
+    sparse_bytes = (engine.doc_matrix.indices.itemsize + engine.doc_matrix.data.itemsize) * len(engine.doc_matrix.data)
+    print(f"Документов {n_docs}, терминов {engine.vector_dim}. На документ: плотный вектор "
+          f"{engine.vector_dim * 8} байт, CSR {sparse_bytes / n_docs:.0f} байт; точный поиск {exact_ms:.3f} мс")
+
+    # Ранг не больше числа документов и терминов
+    for rank in sorted({min(rank, n_docs, engine.vector_dim) for rank in args.ranks}):
+        start = time.perf_counter()
+        engine.lsa = LsaModel.fit(model, rank)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [engine.search(query, args.top_k, mode='lsa').results for query in queries]
+        lsa_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        overlap = np.mean([len(set(expected) & {doc for doc, _ in result}) / len(expected)
+                           for expected, result in zip(gains, results) if expected])
+        quality = np.mean([ndcg([doc for doc, _ in result], expected, args.top_k)
+                           for expected, result in zip(gains, results) if expected])
+        lsa = engine.lsa
+        print(f"ранг {lsa.rank:>4}: построение {fit_time:6.1f} с, на документ {lsa.rank * lsa.embeddings.itemsize} байт, "
+              f"проекция {lsa.projection.nbytes / 2**20:6.1f} МБ; пересечение top-{args.top_k} {overlap:.3f}, "
+              f"NDCG@{args.top_k} {quality:.3f}; поиск {lsa_ms:.3f} мс")
+
+
+if __name__ == '__main__':
+    main()
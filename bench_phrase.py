@@ -0,0 +1,126 @@
+import os
+import time
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from bench_search import synthetic_term
+from lab3 import InvertedIndex
+
+
+def synthetic_documents(n_docs: int, length: int, vocabulary: int, seed: int) -> List[np.ndarray]:
+    """Длинные документы: последовательности номеров слов с частотами по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, vocabulary + 1) ** 1.05
+    weights /= weights.sum()
+    return [rng.choice(vocabulary, size=length, p=weights) for _ in range(n_docs)]
+
+
+def lemma_positions(sequence: np.ndarray) -> Dict[int, np.ndarray]:
+    """Позиции каждой леммы в последовательности документа"""
+    order = np.argsort(sequence, kind='stable')
+    lemmas = sequence[order]
+    starts = np.flatnonzero(np.diff(lemmas, prepend=-1))
+    return dict(zip(lemmas[starts].tolist(), np.split(order, starts[1:])))
+
+
+def time_queries(run: Callable[[str], object], queries: List[str]) -> float:
+    """Медианное время одного запроса в миллисекундах"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержки фразовых запросов и NEAR на длинных документах')
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--length', type=int, default=5000, help='число слов в документе')
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--distance', type=int, default=5, help='k в запросах NEAR/k')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.docs, args.length, args.vocabulary, args.seed)
+    words = [synthetic_term(i) for i in range(args.vocabulary)]
+
+    # Слова приводятся к леммам так же, как при построении индекса из файла счетчиков
+    index = InvertedIndex(cache_size=0)
+    lemmas = [index.get_lemma(word) for word in words]
+    lemma_ids = {lemma: idx for idx, lemma in enumerate(sorted(set(lemmas)))}
+    word_lemma = np.array([lemma_ids[lemma] for lemma in lemmas])
+    id_to_lemma = sorted(lemma_ids, key=lemma_ids.get)
+    sequences = [word_lemma[document] for document in documents]
+
+    start = time.perf_counter()
+    for number, sequence in enumerate(sequences):
+        positions = {id_to_lemma[lemma_id]: group.tolist() for lemma_id, group in lemma_positions(sequence).items()}
+        index.add_document(str(number + 1), {lemma: set() for lemma in positions}, positions)
+    index.optimize()
+    build_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        segment_path = os.path.join(directory, 'phrase_index.bin')
+        index.save_segment(segment_path)
+        with_positions = os.path.getsize(segment_path)
+        positional, index.positional = index.positional, False
+        index.save_segment(segment_path)
+        without_positions = os.path.getsize(segment_path)
+        index.positional = positional
+        index.save_segment(segment_path)
+        segment = InvertedIndex(cache_size=0)
+        segment.load_segment(segment_path)
+        print(f"Документов {args.docs} по {args.length} слов, построение {build_time:.1f} с; сегмент "
+              f"{without_positions / 2**20:.1f} МБ без позиций, {with_positions / 2**20:.1f} МБ с позициями")
+
+        # Фразы из 2-3 соседних слов и пары слов NEAR берутся из случайных документов
+        rng = np.random.default_rng(args.seed + 1)
+        phrases, near_queries = [], []
+        for _ in range(args.queries):
+            document = documents[int(rng.integers(args.docs))]
+            at = int(rng.integers(args.length - args.distance))
+            size = int(rng.integers(2, 4))
+            phrases.append(' '.join(words[word] for word in document[at:at + size]))
+            near_queries.append(f"{words[document[at]]} NEAR/{args.distance} "
+                                f"{words[document[at + int(rng.integers(1, args.distance + 1))]]}")
+
+        def scan(phrase: str) -> List[str]:
+            """Прямой просмотр последовательностей слов документов, прошедших AND"""
+            ids = [lemma_ids[index.get_lemma(word)] for word in phrase.split()]
+            found = []
+            for document_id in index.search(' AND '.join(phrase.split())):
+                sequence = sequences[int(document_id) - 1]
+                match = np.ones(len(sequence) - len(ids) + 1, dtype=bool)
+                for offset, lemma_id in enumerate(ids):
+                    match &= sequence[offset:len(sequence) - len(ids) + 1 + offset] == lemma_id
+                if match.any():
+                    found.append(document_id)
+            return found
+
+        same = np.mean([sorted(scan(phrase)) == index.search(f'"{phrase}"') == segment.search(f'"{phrase}"')
+                        for phrase in phrases])
+        candidates = np.mean([len(index.search(' AND '.join(phrase.split()))) for phrase in phrases])
+        matches = np.mean([len(index.search(f'"{phrase}"')) for phrase in phrases])
+        print(f"Фраз {len(phrases)}: в среднем {candidates:.1f} документов со всеми словами, {matches:.1f} с фразой; "
+              f"совпадение с прямым просмотром {same:.3f}")
+
+        cases = (
+            ('AND (без позиций)', lambda phrase: index.search(' AND '.join(phrase.split())), phrases),
+            ('прямой просмотр', scan, phrases),
+            ('фраза, память', lambda phrase: index.search(f'"{phrase}"'), phrases),
+            ('фраза, сегмент', lambda phrase: segment.search(f'"{phrase}"'), phrases),
+            (f'NEAR/{args.distance}, память', index.search, near_queries),
+            (f'NEAR/{args.distance}, сегмент', segment.search, near_queries),
+        )
+        for name, run, queries in cases:
+            print(f"{name:>20}: {time_queries(run, queries):8.3f} мс на запрос")
+        segment.segment.close()
+
+
+if __name__ == '__main__':
+    main()
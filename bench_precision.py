@@ -0,0 +1,65 @@
+import time
+import argparse
+
+import numpy as np
+
+from search_engine import MODEL_PATH, VectorSearchEngine
+from tfidf_model import TfIdfModel
+
+CONFIGURATIONS = (
+    ('csr', 'float64', 'row'),
+    ('csr', 'float32', 'row'),
+    ('csr', 'uint16', 'row'),
+    ('csr', 'uint16', 'column'),
+    ('csr', 'uint8', 'row'),
+    ('csr', 'uint8', 'column'),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Размер индекса, задержки и совпадение top-10 при разной точности весов')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    model = TfIdfModel.load(args.model)
+    rng = np.random.default_rng(0)
+    baseline = None
+    for storage, precision, scale_axis in CONFIGURATIONS:
+        engine = VectorSearchEngine(storage, cache_size=0, precision=precision, scale_axis=scale_axis)
+        engine.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights)
+        if baseline is None:
+            # Запросы из 1-3 терминов случайного документа
+            queries = []
+            while len(queries) < args.queries:
+                cols, _ = engine.doc_matrix.row(int(rng.integers(len(engine.doc_ids))))
+                if len(cols):
+                    picked = rng.choice(cols, size=min(len(cols), int(rng.integers(1, 4))), replace=False)
+                    queries.append(' '.join(engine.id_to_term[col] for col in picked.tolist()))
+
+        start = time.perf_counter()
+        results = [engine.search(query, args.top_k).results for query in queries]
+        single_ms = (time.perf_counter() - start) / len(queries) * 1000
+        start = time.perf_counter()
+        engine.search_many(queries, args.top_k)
+        batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        if baseline is None:
+            baseline = results
+        # Совпадение с float64: доля документов с ненулевой оценкой из эталонного top-k и доля
+        # запросов с тем же порядком документов
+        expected = [[doc for doc, score in result if score > 0] for result in baseline]
+        overlap = np.mean([len(set(docs) & {doc for doc, _ in result}) / len(docs)
+                           for docs, result in zip(expected, results) if docs])
+        same_order = np.mean([docs == [doc for doc, _ in result][:len(docs)]
+                              for docs, result in zip(expected, results)])
+        weights = engine.doc_matrix.data.nbytes + sum(
+            scale.nbytes for scale in (engine.doc_matrix.row_scale, engine.doc_matrix.col_scale) if scale is not None)
+        print(f"{precision:>7} ({scale_axis:>6}): индекс {engine.doc_matrix.nbytes / 2**20:8.1f} МБ, "
+              f"из них веса {weights / 2**20:7.1f} МБ; поиск {single_ms:6.3f} мс, пакетный {batch_ms:6.3f} мс "
+              f"на запрос; пересечение top-{args.top_k} с float64 {overlap:.4f}, тот же порядок {same_order:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from search_engine import VectorSearchEngine, STORAGE_BACKENDS
+
+DOC_COUNTS = (100, 10_000, 100_000)
+LETTERS = 'абвгдежзийклмнопрстуфхцчшщъыьэюя'
+
+
+def synthetic_term(i: int, width: int = 6) -> str:
+    """Термин синтетического корпуса: номер в записи русскими буквами (проходит токенизацию запросов)"""
+    letters = []
+    for _ in range(width):
+        i, digit = divmod(i, len(LETTERS))
+        letters.append(LETTERS[digit])
+    return ''.join(reversed(letters))
+
+
+def current_rss() -> int:
+    """Возвращает текущий RSS процесса в байтах"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Вне Linux доступен только пиковый RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def synthetic_documents(n_docs: int, vocab_size: int, terms_per_doc: int, seed: int):
+    """Генерирует документы с распределением терминов по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    terms = [synthetic_term(i) for i in range(vocab_size)]
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks
+    probs /= probs.sum()
+
+    def documents():
+        for doc in range(n_docs):
+            ids = np.unique(rng.choice(vocab_size, size=terms_per_doc, p=probs))
+            weights = rng.random(len(ids))
+            yield str(doc + 1), [(terms[i], float(w)) for i, w in zip(ids, weights)]
+
+    return terms, documents()
+
+
+def synthetic_queries(n_queries: int, vocab_size: int, seed: int) -> List[str]:
+    """Генерирует запросы из 1-3 терминов"""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(n_queries):
+        ids = rng.integers(0, min(vocab_size, 5000), size=rng.integers(1, 4))
+        queries.append(' '.join(synthetic_term(i) for i in ids))
+    return queries
+
+
+def run_case(storage: str, n_docs: int, args, queue) -> None:
+    """Замер для одного хранилища и размера корпуса (выполняется в отдельном процессе)"""
+    rss_before = current_rss()
+    engine = VectorSearchEngine(storage=storage)
+    terms, documents = synthetic_documents(n_docs, args.vocab, args.terms_per_doc, args.seed)
+    start = time.perf_counter()
+    engine.build_index(terms, documents)
+    build_time = time.perf_counter() - start
+    rss_after = current_rss()
+
+    latencies = []
+    rankings = []
+    for query in synthetic_queries(args.queries, args.vocab, args.seed):
+        start = time.perf_counter()
+        results = engine.search(query, top_k=10).results
+        latencies.append(time.perf_counter() - start)
+        rankings.append([doc_id for doc_id, _ in results])
+
+    queue.put({
+        'rss_mb': (rss_after - rss_before) / 2**20,
+        'build_s': build_time,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+        'rankings': rankings,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение хранилищ VectorSearchEngine')
+    parser.add_argument('--docs', type=int, nargs='+', default=list(DOC_COUNTS))
+    parser.add_argument('--vocab', type=int, default=20_000, help='размер словаря')
+    parser.add_argument('--terms-per-doc', type=int, default=150)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dense-limit-mb', type=float, default=2048,
+                        help='не запускать dense, если матрица займет больше')
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    print(f"{'документов':>10} {'хранилище':>9} {'RSS, МБ':>9} {'сборка, с':>10} {'p50, мс':>9} {'p99, мс':>9}")
+    for n_docs in args.docs:
+        results: Dict[str, dict] = {}
+        for storage in STORAGE_BACKENDS:
+            dense_mb = n_docs * args.vocab * 8 / 2**20
+            if storage == 'dense' and dense_mb > args.dense_limit_mb:
+                print(f"{n_docs:>10} {storage:>9}   пропущено (потребуется ~{dense_mb:.0f} МБ)")
+                continue
+
+            # Каждый замер в свежем процессе, чтобы RSS не смешивался
+            queue = ctx.Queue()
+            process = ctx.Process(target=run_case, args=(storage, n_docs, args, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results[storage] = result
+            print(f"{n_docs:>10} {storage:>9} {result['rss_mb']:>9.1f} {result['build_s']:>10.2f} "
+                  f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+
+        if len(results) == len(STORAGE_BACKENDS):
+            same = results['dense']['rankings'] == results['csr']['rankings']
+            print(f"{'':>10} ранжирование совпадает: {'да' if same else 'НЕТ'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import json
+import random
+import signal
+import socket
+import argparse
+import subprocess
+import http.client
+from multiprocessing import Pool
+from urllib.parse import quote
+
+from tfidf_model import TfIdfModel
+from search_engine import MODEL_PATH
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(port: int, path: str):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_ready(port: int, timeout: float) -> dict:
+    """Ждет ответа 200 от /ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, body = get(port, '/ready')
+            if status == 200:
+                return json.loads(body)
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не стал готов за {timeout} с")
+
+
+def child_pids(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def memory_kb(pid: int) -> dict:
+    """RSS, PSS (общие страницы делятся между процессами) и USS (только свои страницы) процесса"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].endswith(':') and len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {'rss': values.get('Rss', 0), 'pss': values.get('Pss', 0),
+            'uss': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)}
+
+
+def client(task):
+    """Процесс нагрузки: последовательные запросы в течение duration секунд"""
+    port, queries, duration, mode, seed = task
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        query = rng.choice(queries)
+        start = time.perf_counter()
+        try:
+            status, _ = get(port, f"/search?q={quote(query)}&mode={mode}")
+            if status != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест serve.py: QPS и память в зависимости от числа процессов')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help='число процессов нагрузки')
+    parser.add_argument('--duration', type=float, default=5.0, help='длительность замера, с')
+    parser.add_argument('--storage', default='csr')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--snapshot', default='', help='файл снимка (по умолчанию - временный)')
+    parser.add_argument('--mode', default='exhaustive')
+    args = parser.parse_args()
+
+    terms = TfIdfModel.load(args.model).terms
+    rng = random.Random(0)
+    queries = [' '.join(rng.sample(terms, rng.randint(1, 3))) for _ in range(1000)]
+    snapshot = args.snapshot or f"/tmp/bench_serve_{os.getpid()}.snapshot"
+    print(f"Модель: {args.model}, хранилище: {args.storage}, клиентов: {args.clients}, ядер: {os.cpu_count()}")
+
+    for workers in args.workers:
+        port = free_port()
+        server = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(workers), '--port', str(port),
+                                   '--storage', args.storage, '--model', args.model, '--snapshot', snapshot],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            wait_ready(port, timeout=600)
+            tasks = [(port, queries, args.duration, args.mode, seed) for seed in range(args.clients)]
+            start = time.perf_counter()
+            with Pool(args.clients) as pool:
+                results = pool.map(client, tasks)
+            elapsed = time.perf_counter() - start
+
+            latencies = sorted(latency for part, _ in results for latency in part)
+            errors = sum(part_errors for _, part_errors in results)
+            memory = [memory_kb(pid) for pid in child_pids(server.pid)]
+            total_pss = memory_kb(server.pid)['pss'] + sum(m['pss'] for m in memory)
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(f"процессов {workers:>2}: {len(latencies) / elapsed:8.1f} запросов/с, p50 {p50:6.1f} мс, p99 {p99:6.1f} мс, "
+                  f"ошибок {errors}; на процесс RSS {max(m['rss'] for m in memory) / 1024:6.1f} МБ, "
+                  f"свои страницы (USS) {max(m['uss'] for m in memory) / 1024:6.1f} МБ; "
+                  f"всего PSS с главным процессом {total_pss / 1024:6.1f} МБ")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+    if not args.snapshot and os.path.exists(snapshot):
+        os.remove(snapshot)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import time
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+from bench_wildcard import LETTERS, synthetic_vocabulary
+from spelling import MAX_EDITS, SpellingCorrector, allowed_edits, bounded_levenshtein
+from term_dictionary import TermDictionary
+
+
+def make_typo(word: str, edits: int, rng: np.random.Generator) -> str:
+    """Слово с заданным числом случайных правок: замена, вставка, удаление или перестановка соседних букв"""
+    for _ in range(edits):
+        at = int(rng.integers(len(word)))
+        letter = LETTERS[int(rng.integers(len(LETTERS)))]
+        kind = int(rng.integers(4))
+        if kind == 0:
+            word = word[:at] + letter + word[at + 1:]
+        elif kind == 1:
+            word = word[:at] + letter + word[at:]
+        elif kind == 2 and len(word) > 3:
+            word = word[:at] + word[at + 1:]
+        elif at + 1 < len(word):
+            word = word[:at] + word[at + 1] + word[at] + word[at + 2:]
+    return word
+
+
+def brute_force(dictionary: TermDictionary, lengths: np.ndarray, word: str, max_edits: int) -> Optional[str]:
+    """Ближайший термин перебором всего словаря (с тем же выбором: расстояние, затем частота)"""
+    candidates = np.flatnonzero(np.abs(lengths - len(word)) <= max_edits)
+    distances = np.concatenate([
+        bounded_levenshtein(word, [dictionary.terms[i] for i in candidates[start:start + 100000].tolist()], max_edits)
+        for start in range(0, len(candidates), 100000)])
+    if not len(distances) or distances.min() > max_edits:
+        return None
+    best = candidates[distances == distances.min()]
+    return dictionary.terms[int(best[np.argmax(dictionary.frequencies[best])])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержки и точность исправления опечаток на большом словаре лемм')
+    parser.add_argument('--terms', type=int, default=1000000, help='размер синтетического словаря')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--brute-force', type=int, default=20, help='сколько слов сверять с перебором словаря')
+    parser.add_argument('--budget', type=float, default=50.0, help='бюджет на слово, мс')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    terms, frequencies = synthetic_vocabulary(args.terms, args.seed)
+    start = time.perf_counter()
+    dictionary = TermDictionary(terms, frequencies)
+    corrector = SpellingCorrector(dictionary, budget_ms=args.budget)
+    print(f"Словарь {len(dictionary)} лемм, индекс 3-грамм {dictionary.kgrams.nbytes / 2**20:.1f} МБ, "
+          f"построение {time.perf_counter() - start:.1f} с")
+
+    # Опечатки в словах, выбранных пропорционально частоте (1 правка в коротких словах, 1-2 в длинных)
+    rng = np.random.default_rng(args.seed + 1)
+    picked = rng.choice(len(dictionary), size=args.queries, p=dictionary.frequencies / dictionary.frequencies.sum())
+    originals: List[str] = []
+    typos: List[str] = []
+    for term in (dictionary.terms[i] for i in picked.tolist()):
+        max_edits = allowed_edits(len(term), MAX_EDITS)
+        if max_edits == 0:
+            continue
+        typo = make_typo(term, int(rng.integers(1, max_edits + 1)), rng)
+        if typo != term and allowed_edits(len(typo), MAX_EDITS):
+            originals.append(term)
+            typos.append(typo)
+
+    timings, corrections = [], []
+    for typo in typos:
+        corrector.clear_cache()
+        start = time.perf_counter()
+        corrections.append(corrector.correct(typo))
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    corrections = np.array([correction or '' for correction in corrections], dtype=object)
+    restored = np.mean(corrections == np.array(originals, dtype=object))
+    print(f"Слов с опечатками {len(typos)}: {np.median(timings):.3f} мс (p99 {np.percentile(timings, 99):.3f}, "
+          f"макс. {timings.max():.3f}); восстановлено исходное слово {restored:.3f}, "
+          f"исправлено на другое {np.mean((corrections != '') & (corrections != np.array(originals, dtype=object))):.3f}, "
+          f"без исправления {np.mean(corrections == ''):.3f}")
+
+    # Перебор всего словаря дает эталон выбора: доля совпадений показывает полноту отбора кандидатов
+    lengths = np.fromiter(map(len, dictionary.terms), dtype=np.int64, count=len(dictionary))
+    checked = typos[:args.brute_force]
+    start = time.perf_counter()
+    expected = [brute_force(dictionary, lengths, typo, allowed_edits(len(typo), MAX_EDITS)) for typo in checked]
+    brute_ms = (time.perf_counter() - start) / max(1, len(checked)) * 1000
+    same = np.mean([(correction or None) == reference for correction, reference in zip(corrections, expected)])
+    print(f"Перебор словаря: {brute_ms:.1f} мс на слово; совпадение с ним на {len(checked)} словах {same:.3f}")
+
+    # Бюджет времени: с малым бюджетом часть слов остается без исправления, но задержка ограничена
+    for budget in (0.5, 2.0, 5.0):
+        limited = SpellingCorrector(dictionary, budget_ms=budget)
+        timings, skipped = [], 0
+        for typo in typos:
+            start = time.perf_counter()
+            skipped += limited.correct(typo) is None
+            timings.append(time.perf_counter() - start)
+            limited.clear_cache()
+        timings = np.array(timings) * 1000
+        print(f"Бюджет {budget:4.1f} мс: p99 {np.percentile(timings, 99):.3f} мс, без исправления {skipped / len(typos):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from lab4 import collect_sharded, count_shard
+from tfidf_model import TfIdfModel
+
+
+def generate_corpus(root: str, n_docs: int, vocab_size: int, doc_len: int, seed: int = 0) -> list:
+    """Синтетический корпус в формате задания 2: файлы токенов и лемм с частотами по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    tokens_dir = os.path.join(root, 'tokens')
+    lemmas_dir = os.path.join(root, 'lemmas')
+    os.makedirs(tokens_dir)
+    os.makedirs(lemmas_dir)
+
+    probabilities = 1.0 / np.arange(1, vocab_size + 1)
+    probabilities /= probabilities.sum()
+    words = [f"слово{i}" for i in range(vocab_size)]
+    doc_ids = [str(i) for i in range(1, n_docs + 1)]
+    for doc_id in doc_ids:
+        ids = rng.choice(vocab_size, size=doc_len, p=probabilities)
+        with open(os.path.join(tokens_dir, f"{doc_id}.txt"), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(words[i] for i in ids) + '\n')
+        # Лемма - слово без последней цифры, формы - уникальные слова документа
+        forms = {}
+        for i in np.unique(ids).tolist():
+            forms.setdefault(words[i][:-1], []).append(words[i])
+        with open(os.path.join(lemmas_dir, f"{doc_id}.txt"), 'w', encoding='utf-8') as f:
+            for lemma, lemma_forms in forms.items():
+                f.write(f"{lemma} {' '.join(lemma_forms)}\n")
+    return doc_ids, tokens_dir, lemmas_dir
+
+
+def same_model(a: TfIdfModel, b: TfIdfModel) -> bool:
+    """Побитовое совпадение моделей"""
+    return (a.terms == b.terms and a.doc_ids == b.doc_ids
+            and all(np.array_equal(x, y) for x, y in ((a.df, b.df), (a.indptr, b.indptr), (a.indices, b.indices),
+                                                       (a.counts, b.counts)))
+            and a.idf.tobytes() == b.idf.tobytes() and a.weights.tobytes() == b.weights.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Масштабирование параллельного расчета TF-IDF по числу процессов')
+    parser.add_argument('--docs', type=int, default=20000, help='число документов')
+    parser.add_argument('--vocab', type=int, default=200000, help='размер словаря')
+    parser.add_argument('--doc-len', type=int, default=300, help='токенов в документе')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        doc_ids, tokens_dir, lemmas_dir = generate_corpus(root, args.docs, args.vocab, args.doc_len)
+        print(f"Корпус: {args.docs} документов, словарь {args.vocab}, подготовлен за {time.perf_counter() - start:.1f} с; "
+              f"ядер: {os.cpu_count()}")
+
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            start = time.perf_counter()
+            if workers == 1:
+                token_counts, lemma_counts, _ = count_shard((doc_ids, tokens_dir, lemmas_dir))
+            else:
+                token_counts, lemma_counts, _ = collect_sharded(doc_ids, workers, tokens_dir, lemmas_dir)
+            counted = time.perf_counter() - start
+            models = (TfIdfModel.from_counts(token_counts), TfIdfModel.from_counts(lemma_counts))
+            elapsed = time.perf_counter() - start
+
+            if baseline is None:
+                baseline, base_time = models, elapsed
+                check = 'эталон'
+            else:
+                same = all(same_model(a, b) for a, b in zip(baseline, models))
+                check = 'совпадает с последовательным побитно' if same else 'ОТЛИЧАЕТСЯ от последовательного'
+            print(f"процессов {workers:>2}: подсчет {counted:6.2f} с, всего {elapsed:6.2f} с, "
+                  f"ускорение {base_time / elapsed:4.2f}x, {check}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
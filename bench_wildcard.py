@@ -0,0 +1,108 @@
+import time
+import argparse
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from search_engine import MODEL_PATH
+from term_dictionary import TermDictionary, wildcard_regex
+from tfidf_model import TfIdfModel
+
+# Примерные частоты букв русского текста (для синтетического словаря)
+LETTERS = 'оеаинтсрвлкмдпуяыьгзбчйхжшюцщэфъё'
+LETTER_WEIGHTS = np.array([110, 85, 80, 74, 67, 63, 55, 47, 45, 44, 35, 32, 30, 28, 26, 20, 19, 17, 17, 16, 16,
+                           14, 12, 10, 9, 7, 6, 5, 4, 3, 3, 1, 1], dtype=np.float64)
+
+
+def synthetic_vocabulary(n_terms: int, seed: int = 0) -> Tuple[List[str], np.ndarray]:
+    """Синтетический словарь: n_terms разных слов из 3-14 букв и частоты по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list(LETTERS))
+    terms = set()
+    while len(terms) < n_terms:
+        lengths = rng.integers(3, 15, size=n_terms - len(terms) + 1000)
+        text = ''.join(letters[rng.choice(len(LETTERS), size=int(lengths.sum()), p=LETTER_WEIGHTS / LETTER_WEIGHTS.sum())])
+        ends = np.cumsum(lengths).tolist()
+        terms.update(text[end - length:end] for end, length in zip(ends, lengths.tolist()))
+    terms = sorted(terms)[:n_terms]
+    frequencies = np.maximum(1, np.rint(1e6 / np.arange(1, n_terms + 1))).astype(np.int64)
+    return terms, rng.permutation(frequencies)
+
+
+def latencies(run: Callable[[str], object], queries: List[str]) -> np.ndarray:
+    """Время каждого запроса в миллисекундах"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def sample_patterns(terms: List[str], n_patterns: int, seed: int) -> List[Tuple[str, str]]:
+    """Маски из случайных терминов словаря: (вид маски, маска)"""
+    rng = np.random.default_rng(seed)
+    patterns = []
+    while len(patterns) < n_patterns:
+        term = terms[int(rng.integers(len(terms)))]
+        if len(term) < 5:
+            continue
+        at = int(rng.integers(1, len(term) - 3))
+        patterns.append(('префикс', term[:int(rng.integers(2, 5))] + '*'))
+        patterns.append(('суффикс', '*' + term[-int(rng.integers(3, 5)):]))
+        patterns.append(('подстрока', '*' + term[at:at + 3] + '*'))
+        patterns.append(('символ ?', term[:at] + '?' + term[at + 1:]))
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Маски и подсказки по отсортированному словарю и индексу k-грамм')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--synthetic', type=int, default=0, help='синтетический словарь такого размера вместо модели')
+    parser.add_argument('--patterns', type=int, default=200)
+    parser.add_argument('--scan', type=int, default=20, help='сколько масок каждого вида сверять с полным перебором')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        terms, frequencies = synthetic_vocabulary(args.synthetic, args.seed)
+    else:
+        model = TfIdfModel.load(args.model)
+        terms, frequencies = model.terms, model.df
+
+    start = time.perf_counter()
+    dictionary = TermDictionary(terms, frequencies)
+    sort_time = time.perf_counter() - start
+    start = time.perf_counter()
+    kgrams = dictionary.kgrams
+    kgram_time = time.perf_counter() - start
+    print(f"Терминов {len(dictionary)}: сортировка {sort_time:.2f} с, индекс 3-грамм {kgram_time:.2f} с "
+          f"({kgrams.nbytes / 2**20:.1f} МБ, {len(kgrams.gram_codes)} разных 3-грамм)")
+
+    def scan(pattern: str) -> List[str]:
+        """Полный перебор словаря регулярным выражением - для сравнения и проверки"""
+        regex = wildcard_regex(pattern)
+        return [term for term in dictionary.terms if regex.fullmatch(term)]
+
+    patterns = sample_patterns(dictionary.terms, args.patterns, args.seed + 1)
+    for kind in dict.fromkeys(kind for kind, _ in patterns):
+        queries = [pattern for pattern_kind, pattern in patterns if pattern_kind == kind]
+        timings = latencies(dictionary.match, queries)
+        matches = np.mean([len(dictionary.match(pattern)) for pattern in queries])
+
+        checked = queries[:args.scan]
+        scan_timings = latencies(scan, checked)
+        same = np.mean([[dictionary.terms[i] for i in dictionary.match(pattern).tolist()] == scan(pattern)
+                        for pattern in checked])
+        print(f"{kind:>10}: {np.median(timings):8.3f} мс (p99 {np.percentile(timings, 99):8.3f}), "
+              f"перебор {np.median(scan_timings):8.3f} мс; в среднем {matches:9.1f} терминов, совпадение {same:.3f}")
+
+    # Подсказки для начала слова из 1-4 букв
+    rng = np.random.default_rng(args.seed + 2)
+    prefixes = [term[:int(rng.integers(1, 5))] for term in rng.choice(dictionary.terms, size=1000).tolist()]
+    timings = latencies(dictionary.complete, prefixes)
+    print(f"{'подсказки':>10}: {np.median(timings):8.3f} мс (p99 {np.percentile(timings, 99):8.3f}) на запрос top-10")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sparse_matrix import top_k_indices
+
+# Ранжирование BM25 по спискам с заранее вычисленными вкладами (impact-ordered postings):
+#   1. При построении для каждой пары (термин, документ) вычисляется вклад BM25
+#      idf * tf' * (k1 + 1) / (tf' + k1), где tf' - число вхождений, нормированное по длине
+#      документа: tf / (1 - b + b * длина / средняя длина). Для BM25F tf' - взвешенная сумма
+#      таких величин по полям документа, каждое со своими весом, b и средней длиной.
+#   2. Вклады квантуются в целые 1..levels (общий масштаб scale), список термина упорядочен
+#      по убыванию вклада и разбит на отрезки с одинаковым вкладом.
+#   3. Запрос обрабатывает отрезки своих терминов от больших вкладов к меньшим, накапливая
+#      оценки документов. Остаток - сумма вкладов следующих отрезков всех терминов - ограничивает
+#      сверху то, что еще может получить любой документ. Если в обработанных отрезках термина
+#      k и более документов, итоговая k-я оценка не меньше вклада последнего из них. Как только
+#      остаток меньше такой границы, а документов, которым остатка до нее хватает, немного,
+#      обработка прекращается: остальные документы в top-k уже не попадут, а точные оценки
+#      кандидатов дочитываются из прямого индекса (вклады терминов по документам).
+K1 = 1.2
+B = 0.75
+IMPACT_LEVELS = 255
+# Наибольшее число кандидатов, оценки которых дочитываются из прямого индекса
+MAX_CANDIDATES = 1024
+
+
+class ImpactIndex:
+    """Списки документов терминов с квантованными вкладами BM25 в порядке убывания вклада"""
+
+    ARRAYS = ('segment_ptr', 'segment_starts', 'segment_impacts', 'docs', 'doc_ptr', 'doc_terms', 'doc_impacts')
+
+    def __init__(self, segment_ptr: np.ndarray, segment_starts: np.ndarray, segment_impacts: np.ndarray,
+                 docs: np.ndarray, doc_ptr: np.ndarray, doc_terms: np.ndarray, doc_impacts: np.ndarray,
+                 scale: float):
+        self.segment_ptr = segment_ptr          # Термин t - отрезки [segment_ptr[t], segment_ptr[t+1])
+        self.segment_starts = segment_starts    # Отрезок s - документы docs[segment_starts[s]:segment_starts[s+1]]
+        self.segment_impacts = segment_impacts  # Вклад документов отрезка (по убыванию внутри термина)
+        self.docs = docs                        # Номера документов списков
+        self.doc_ptr = doc_ptr                  # Прямой индекс: документ d - [doc_ptr[d], doc_ptr[d+1])
+        self.doc_terms = doc_terms              # id терминов документа по возрастанию
+        self.doc_impacts = doc_impacts          # Их вклады
+        self.scale = scale                      # Вклад 1 соответствует оценке BM25 scale
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ptr) - 1
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.segment_ptr) - 1
+
+    @classmethod
+    def build(cls, indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray, n_terms: int,
+              k1: float = K1, b: float = B, levels: int = IMPACT_LEVELS) -> 'ImpactIndex':
+        """Строит индекс BM25 по матрице числа вхождений документ-термин в формате CSR"""
+        return cls.build_fields(indptr, indices, [counts], n_terms, [1.0], [b], k1, levels)
+
+    @classmethod
+    def build_fields(cls, indptr: np.ndarray, indices: np.ndarray, field_counts: Sequence[np.ndarray],
+                     n_terms: int, field_weights: Sequence[float], field_b: Sequence[float],
+                     k1: float = K1, levels: int = IMPACT_LEVELS) -> 'ImpactIndex':
+        """Строит индекс BM25F: field_counts - число вхождений в каждом поле на той же структуре CSR"""
+        n_docs = len(indptr) - 1
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+
+        # Число вхождений, нормированное по длине документа в каждом поле
+        tf = np.zeros(len(indices))
+        for counts, weight, b in zip(field_counts, field_weights, field_b):
+            counts = np.asarray(counts, dtype=np.float64)
+            lengths = np.bincount(rows, weights=counts, minlength=n_docs)
+            average = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+            tf += weight * counts / (1.0 - b + b * lengths[rows] / average)
+
+        keep = tf > 0
+        rows, indices, tf = rows[keep], indices[keep], tf[keep]
+        df = np.bincount(indices, minlength=n_terms)
+        # IDF в варианте Lucene: всегда положителен, даже для терминов из всех документов
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        scores = idf[indices] * tf * (k1 + 1.0) / (tf + k1)
+        scale = float(scores.max()) / levels if len(scores) else 1.0
+        impacts = np.clip(np.rint(scores / scale), 1, levels).astype(np.uint8 if levels <= 255 else np.uint16) \
+            if len(scores) else np.zeros(0, dtype=np.uint8)
+
+        # Списки: по термину, внутри - по убыванию вклада, при равном вкладе - по документу
+        order = np.lexsort((rows, -impacts.astype(np.int64), indices))
+        docs = rows[order].astype(np.uint32)
+        list_terms, list_impacts = indices[order], impacts[order]
+        # Отрезок начинается там, где меняется термин или вклад
+        starts = np.flatnonzero(np.concatenate(([len(docs) > 0], (np.diff(list_terms) != 0)
+                                                | (np.diff(list_impacts.astype(np.int64)) != 0))))
+        segment_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(list_terms[starts], minlength=n_terms), out=segment_ptr[1:])
+        segment_starts = np.append(starts, len(docs)).astype(np.int64)
+
+        # Прямой индекс: вклады по документам, термины по возрастанию
+        forward = np.lexsort((indices, rows))
+        doc_ptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_docs), out=doc_ptr[1:])
+        return cls(segment_ptr, segment_starts, list_impacts[starts], docs,
+                   doc_ptr, indices[forward].astype(np.int32), impacts[forward], scale)
+
+    def search(self, terms: Dict[int, int], top_k: int,
+               early_termination: bool = True) -> Tuple[List[Tuple[int, float]], Dict[str, int]]:
+        """Поиск по отрезкам в порядке убывания вклада; terms - id термина -> число вхождений в запрос.
+
+        Возвращает (номер документа, оценка BM25) по убыванию оценки и статистику.
+        Без early_termination просматриваются все записи (точный перебор для сравнения).
+        """
+        segments = []
+        pending = {}  # Термин -> вклад его следующего необработанного отрезка
+        total = 0
+        for term_id, count in terms.items():
+            if not 0 <= term_id < self.n_terms:
+                continue
+            first, last = int(self.segment_ptr[term_id]), int(self.segment_ptr[term_id + 1])
+            if first == last:
+                continue
+            for segment in range(first, last):
+                segments.append((int(self.segment_impacts[segment]) * count, term_id, count, segment, last))
+            pending[term_id] = int(self.segment_impacts[first]) * count
+            total += int(self.segment_starts[last] - self.segment_starts[first])
+        if top_k <= 0 or not segments:
+            return [], {'postings_total': total, 'postings_evaluated': 0, 'postings_skipped': total}
+
+        # Отрезки одного термина идут по убыванию вклада, поэтому сортировка сохраняет их порядок
+        segments.sort(key=lambda item: -item[0])
+        remaining = sum(pending.values())
+        scores = np.zeros(self.n_docs, dtype=np.int64)
+        evaluated = 0
+        next_check = 0
+        bound = 0  # Нижняя граница k-й оценки
+        covered = dict.fromkeys(pending, 0)  # Термин -> число документов в его обработанных отрезках
+        candidates = None
+        for contribution, term_id, count, segment, last in segments:
+            docs = self.docs[self.segment_starts[segment]:self.segment_starts[segment + 1]]
+            scores[docs] += contribution
+            evaluated += len(docs)
+
+            following = int(self.segment_impacts[segment + 1]) * count if segment + 1 < last else 0
+            remaining -= pending[term_id] - following
+            pending[term_id] = following
+            if not early_termination or remaining == 0:
+                continue
+            covered[term_id] += len(docs)
+            if covered[term_id] >= top_k:
+                # Документы в списке термина не повторяются: у k из них оценка не меньше вклада отрезка
+                bound = max(bound, contribution)
+            # Отбор кандидатов просматривает все оценки, поэтому выполняется, только когда
+            # остаток опустился ниже границы, а после неудачи - не раньше удвоения числа записей
+            if remaining < bound and evaluated >= next_check:
+                next_check = 2 * evaluated
+                candidates = np.flatnonzero(scores >= bound - remaining)
+                if len(candidates) <= MAX_CANDIDATES:
+                    break
+                candidates = None
+
+        if candidates is None:
+            top = top_k_indices(scores, top_k)
+            top = top[scores[top] > 0]
+            values = scores[top]
+        else:
+            # Оставшиеся записи не читаются: оценки кандидатов дочитываются из прямого индекса
+            exact = self._exact_scores(candidates, terms)
+            order = np.lexsort((candidates, -exact))[:top_k]
+            top, values = candidates[order], exact[order]
+        stats = {'postings_total': total, 'postings_evaluated': evaluated, 'postings_skipped': total - evaluated}
+        return [(int(doc), float(value) * self.scale) for doc, value in zip(top.tolist(), values.tolist())], stats
+
+    def _exact_scores(self, docs: np.ndarray, terms: Dict[int, int]) -> np.ndarray:
+        """Полные оценки документов по прямому индексу"""
+        term_ids = np.array(list(terms), dtype=np.int64)
+        counts = np.array(list(terms.values()), dtype=np.int64)
+        # Двоичный поиск каждого термина запроса сразу во всех строках прямого индекса
+        rows = np.repeat(docs, len(term_ids))
+        wanted = np.tile(term_ids, len(docs))
+        low, ends = self.doc_ptr[rows], self.doc_ptr[rows + 1]
+        high = ends.copy()
+        active = low < high
+        while active.any():
+            middle = (low + high) // 2
+            less = self.doc_terms[np.where(active, middle, 0)] < wanted
+            low = np.where(active & less, middle + 1, low)
+            high = np.where(active & ~less, middle, high)
+            active = low < high
+        found = low < ends
+        found[found] = self.doc_terms[low[found]] == wanted[found]
+        impacts = np.zeros(len(rows), dtype=np.int64)
+        impacts[found] = self.doc_impacts[low[found]]
+        return (impacts * np.tile(counts, len(docs))).reshape(len(docs), len(term_ids)).sum(axis=1)
+
+    def arrays(self, prefix: str = 'bm25_') -> Dict[str, np.ndarray]:
+        """Массивы индекса для записи в снимок"""
+        arrays = {prefix + name: getattr(self, name) for name in self.ARRAYS}
+        arrays[prefix + 'scale'] = np.array([self.scale])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str = 'bm25_') -> Optional['ImpactIndex']:
+        """Индекс из массивов снимка (None, если их там нет)"""
+        if prefix + 'docs' not in arrays:
+            return None
+        return cls(*(arrays[prefix + name] for name in cls.ARRAYS), float(arrays[prefix + 'scale'][0]))
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти индекса (включая прямой индекс)"""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
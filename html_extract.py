@@ -0,0 +1,114 @@
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Iterator, List
+
+from bs4 import BeautifulSoup
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# Содержимое этих тегов не считается текстом страницы (так же поступает BeautifulSoup.get_text)
+HIDDEN_TAGS = frozenset({'script', 'style', 'template'})
+# Элементы оформления сайта: меню, шапка, подвал, боковые панели
+CHROME_TAGS = frozenset({'nav', 'header', 'footer', 'aside'})
+
+
+class TextExtractor(ABC):
+    """Интерфейс извлечения текста из HTML-файла"""
+
+    @abstractmethod
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        """Выдает текст страницы частями; границы частей являются границами слов"""
+
+
+class BeautifulSoupExtractor(TextExtractor):
+    """Эталонное извлечение: полное дерево BeautifulSoup и get_text"""
+
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        soup = BeautifulSoup(html, 'html.parser')
+        yield soup.get_text(separator=' ')
+
+
+class _TextCollector(HTMLParser):
+    """Потоковый разбор HTML: собирает текстовые узлы вне скрытых тегов"""
+
+    def __init__(self, skip_tags: frozenset):
+        super().__init__(convert_charrefs=True)
+        self.skip_tags = skip_tags
+        self.skip_depth = 0
+        self.buffer: List[str] = []   # Части текущего текстового узла
+        self.ready: List[str] = []    # Завершенные текстовые узлы
+
+    def _end_text_node(self) -> None:
+        if self.buffer:
+            if not self.skip_depth:
+                self.ready.append(''.join(self.buffer))
+            self.buffer.clear()
+
+    def handle_starttag(self, tag, attrs):
+        self._end_text_node()
+        if tag in self.skip_tags:
+            self.skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_text_node()
+
+    def handle_endtag(self, tag):
+        self._end_text_node()
+        if tag in self.skip_tags and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        # Узел может прийти несколькими вызовами, если он пересекает границу блока чтения
+        self.buffer.append(data)
+
+    def handle_comment(self, data):
+        self._end_text_node()
+
+    def handle_decl(self, decl):
+        self._end_text_node()
+
+    def handle_pi(self, data):
+        self._end_text_node()
+
+    def unknown_decl(self, data):
+        self._end_text_node()
+
+
+class StreamingExtractor(TextExtractor):
+    """Потоковое извлечение на html.parser: файл читается блоками, дерево не строится"""
+
+    def __init__(self, skip_chrome: bool = False):
+        self.skip_tags = HIDDEN_TAGS | CHROME_TAGS if skip_chrome else HIDDEN_TAGS
+
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        collector = _TextCollector(self.skip_tags)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                collector.feed(block)
+                if collector.ready:
+                    yield from collector.ready
+                    collector.ready.clear()
+
+        collector.close()
+        collector._end_text_node()
+        yield from collector.ready
+
+
+EXTRACTORS = ('stream', 'stream-nochrome', 'bs4')
+
+
+def get_extractor(name: str) -> TextExtractor:
+    """Создает извлекатель текста по имени"""
+    if name == 'stream':
+        return StreamingExtractor()
+    if name == 'stream-nochrome':
+        return StreamingExtractor(skip_chrome=True)
+    if name == 'bs4':
+        return BeautifulSoupExtractor()
+    raise ValueError(f"Неизвестный способ извлечения текста: {name}")
@@ -0,0 +1,301 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from postings import Postings, make_postings
+from term_counts import decode_varints
+
+# Формат сегмента (все числа little-endian):
+#   заголовок   - MAGIC, версия, флаги, число документов и терминов, смещения разделов;
+#   документы   - u32-смещения (n_docs + 1) и строки идентификаторов в UTF-8;
+#   словарь     - u32-смещения терминов (n_terms + 1), u64-смещения списков (n_terms + 1),
+#                 u32 документная частота (n_terms) и строки терминов в UTF-8,
+#                 отсортированные по байтам (что совпадает с порядком str);
+#   списки      - номера документов в таблице, разности соседних номеров в varint;
+#   позиции     - только с флагом FLAG_POSITIONS: u64-смещения блоков терминов (n_terms + 1),
+#                 в блоке термина u32-смещения (df + 1) и позиции слов в каждом документе
+#                 его списка - разностями в varint.
+# Сегменты без позиций имеют нулевые флаги и смещение позиций (в прежних файлах это заполнение заголовка).
+MAGIC = b'OIPSEG\x00\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQQQ')
+HEADER_SIZE = 64
+FLAG_POSITIONS = 1
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Дописывает неотрицательное число в формате varint (по 7 бит в байте)"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(doc_numbers: Iterable[int]) -> bytes:
+    """Кодирует возрастающий список номеров документов разностями в varint"""
+    out = bytearray()
+    previous = 0
+    for number in doc_numbers:
+        encode_varint(number - previous, out)
+        previous = number
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> List[int]:
+    """Восстанавливает номера документов из разностей"""
+    return np.cumsum(decode_varints(np.frombuffer(data, dtype=np.uint8))).tolist()
+
+
+def write_segment(file_path: str, doc_table: List[str], index: Mapping[str, Iterable[int]],
+                  positions: Optional[Mapping[str, Mapping[int, bytes]]] = None) -> None:
+    """Записывает инвертированный индекс в бинарный сегмент.
+
+    doc_table - идентификаторы документов по номерам, index - возрастающие номера документов терминов,
+    positions - позиции слов термина по номерам документов (закодированные encode_postings) или None.
+    """
+    terms = sorted(term for term in index if len(index[term]))
+
+    # Таблица документов
+    doc_blob = bytearray()
+    doc_offsets = [0]
+    for document_id in doc_table:
+        doc_blob += document_id.encode('utf-8')
+        doc_offsets.append(len(doc_blob))
+    docs_section = struct.pack(f'<{len(doc_offsets)}I', *doc_offsets) + doc_blob
+
+    # Словарь терминов и сжатые списки документов
+    term_blob = bytearray()
+    term_offsets = [0]
+    postings_blob = bytearray()
+    postings_offsets = [0]
+    doc_freqs = []
+    positions_blob = bytearray()
+    positions_offsets = [0]
+    for term in terms:
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+        numbers = list(index[term])
+        postings_blob += encode_postings(numbers)
+        postings_offsets.append(len(postings_blob))
+        doc_freqs.append(len(numbers))
+        if positions is not None:
+            lists = [positions[term][number] for number in numbers]
+            list_offsets = [0]
+            for data in lists:
+                list_offsets.append(list_offsets[-1] + len(data))
+            positions_blob += struct.pack(f'<{len(list_offsets)}I', *list_offsets) + b''.join(lists)
+            positions_offsets.append(len(positions_blob))
+    terms_section = (struct.pack(f'<{len(term_offsets)}I', *term_offsets)
+                     + struct.pack(f'<{len(postings_offsets)}Q', *postings_offsets)
+                     + struct.pack(f'<{len(doc_freqs)}I', *doc_freqs)
+                     + term_blob)
+
+    docs_offset = HEADER_SIZE
+    terms_offset = docs_offset + len(docs_section)
+    postings_offset = terms_offset + len(terms_section)
+    flags, positions_offset, positions_section = 0, 0, b''
+    if positions is not None:
+        flags = FLAG_POSITIONS
+        positions_offset = postings_offset + len(postings_blob)
+        positions_section = struct.pack(f'<{len(positions_offsets)}Q', *positions_offsets) + positions_blob
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(doc_table), len(terms),
+                         docs_offset, terms_offset, postings_offset, positions_offset)
+
+    # Пишем во временный файл и заменяем, чтобы открытые mmap-читатели не увидели половину файла
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\x00'))
+        file.write(docs_section)
+        file.write(terms_section)
+        file.write(postings_blob)
+        file.write(positions_section)
+    os.replace(tmp_path, file_path)
+
+
+class SegmentReader:
+    """Читает бинарный сегмент через mmap: открытие за O(1), списки декодируются по запросу"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER_SIZE:
+            raise ValueError(f"Файл {file_path} не является сегментом индекса")
+        (magic, version, flags, self.n_docs, self.n_terms, self._docs_offset, self._terms_offset,
+         self._postings_offset, self._positions_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Файл {file_path} не является сегментом индекса")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия сегмента {version} в файле {file_path}")
+
+        # Расположение массивов внутри разделов
+        self._doc_blob = self._docs_offset + 4 * (self.n_docs + 1)
+        self._term_offsets = self._terms_offset
+        self._postings_offsets = self._term_offsets + 4 * (self.n_terms + 1)
+        self._doc_freqs = self._postings_offsets + 8 * (self.n_terms + 1)
+        self._term_blob = self._doc_freqs + 4 * self.n_terms
+        self.has_positions = bool(flags & FLAG_POSITIONS)
+        self._positions_blob = self._positions_offset + 8 * (self.n_terms + 1)
+
+        self._doc_table: Optional[List[str]] = None
+
+    def close(self) -> None:
+        """Закрывает отображение файла"""
+        self._mmap.close()
+
+    def _u32(self, offset: int) -> int:
+        return struct.unpack_from('<I', self._mmap, offset)[0]
+
+    def _u64(self, offset: int) -> int:
+        return struct.unpack_from('<Q', self._mmap, offset)[0]
+
+    @property
+    def doc_table(self) -> List[str]:
+        """Таблица идентификаторов документов (декодируется при первом обращении)"""
+        if self._doc_table is None:
+            offsets = struct.unpack_from(f'<{self.n_docs + 1}I', self._mmap, self._docs_offset)
+            blob = self._mmap[self._doc_blob:self._doc_blob + offsets[-1]]
+            self._doc_table = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.n_docs)]
+        return self._doc_table
+
+    def term_at(self, position: int) -> str:
+        """Возвращает термин по его позиции в словаре"""
+        start = self._u32(self._term_offsets + 4 * position)
+        end = self._u32(self._term_offsets + 4 * (position + 1))
+        return self._mmap[self._term_blob + start:self._term_blob + end].decode('utf-8')
+
+    def find_term(self, term: str) -> int:
+        """Ищет термин в словаре двоичным поиском, возвращает позицию или -1"""
+        key = term.encode('utf-8')
+        low, high = 0, self.n_terms
+        while low < high:
+            middle = (low + high) // 2
+            start = self._u32(self._term_offsets + 4 * middle)
+            end = self._u32(self._term_offsets + 4 * (middle + 1))
+            current = self._mmap[self._term_blob + start:self._term_blob + end]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def doc_freq(self, position: int) -> int:
+        """Количество документов, содержащих термин"""
+        return self._u32(self._doc_freqs + 4 * position)
+
+    def doc_freqs(self) -> np.ndarray:
+        """Количество документов всех терминов в порядке словаря (копия, файл можно закрыть)"""
+        return np.frombuffer(self._mmap, dtype='<u4', count=self.n_terms, offset=self._doc_freqs).copy()
+
+    def postings(self, position: int) -> List[int]:
+        """Декодирует номера документов термина"""
+        start = self._u64(self._postings_offsets + 8 * position)
+        end = self._u64(self._postings_offsets + 8 * (position + 1))
+        return decode_postings(self._mmap[self._postings_offset + start:self._postings_offset + end])
+
+    def positions(self, position: int, rank: int) -> bytes:
+        """Сжатые позиции термина в документе с номером rank в его списке (декодирует decode_postings)"""
+        block = self._positions_blob + self._u64(self._positions_offset + 8 * position)
+        start = self._u32(block + 4 * rank)
+        end = self._u32(block + 4 * (rank + 1))
+        data = block + 4 * (self.doc_freq(position) + 1)
+        return self._mmap[data + start:data + end]
+
+    def position_lists(self, position: int) -> 'SegmentPositions':
+        """Позиции термина по номерам документов"""
+        return SegmentPositions(self, position)
+
+    def terms(self) -> Iterator[str]:
+        """Перебирает термины словаря в отсортированном порядке"""
+        for position in range(self.n_terms):
+            yield self.term_at(position)
+
+
+class SegmentPostings(Mapping):
+    """Отображение термин -> номера документов поверх сегмента с кэшем декодированных списков"""
+
+    def __init__(self, reader: SegmentReader):
+        self._reader = reader
+        self._cache: Dict[str, Postings] = {}
+
+    def __getitem__(self, term: str) -> Postings:
+        if term in self._cache:
+            return self._cache[term]
+        position = self._reader.find_term(term)
+        if position < 0:
+            raise KeyError(term)
+        postings = make_postings(self._reader.postings(position), self._reader.n_docs)
+        self._cache[term] = postings
+        return postings
+
+    def __len__(self) -> int:
+        return self._reader.n_terms
+
+    def __iter__(self) -> Iterator[str]:
+        return self._reader.terms()
+
+    def __contains__(self, term) -> bool:
+        return term in self._cache or self._reader.find_term(term) >= 0
+
+
+class SegmentPositions(Mapping):
+    """Отображение номер документа -> сжатые позиции термина поверх сегмента.
+
+    Список документов термина декодируется при первом обращении, позиции читаются
+    только для запрошенных документов.
+    """
+
+    def __init__(self, reader: SegmentReader, position: int):
+        self._reader = reader
+        self._position = position
+        self._numbers: Optional[List[int]] = None
+
+    def _doc_numbers(self) -> List[int]:
+        if self._numbers is None:
+            self._numbers = self._reader.postings(self._position)
+        return self._numbers
+
+    def __getitem__(self, number: int) -> bytes:
+        numbers = self._doc_numbers()
+        rank = bisect_left(numbers, number)
+        if rank == len(numbers) or numbers[rank] != number:
+            raise KeyError(number)
+        return self._reader.positions(self._position, rank)
+
+    def __len__(self) -> int:
+        return self._reader.doc_freq(self._position)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._doc_numbers())
+
+
+def main():
+    import argparse
+    from lab3 import InvertedIndex
+
+    parser = argparse.ArgumentParser(description='Конвертер инвертированного индекса между текстовым и бинарным форматами')
+    parser.add_argument('direction', choices=('to-binary', 'to-text'),
+                        help='to-binary: текст -> сегмент, to-text: сегмент -> текст')
+    parser.add_argument('source', help='исходный файл индекса')
+    parser.add_argument('target', help='файл результата')
+    args = parser.parse_args()
+
+    index = InvertedIndex()
+    if args.direction == 'to-binary':
+        index.load_index(args.source)
+        index.save_segment(args.target)
+    else:
+        index.load_segment(args.source)
+        index.save_index(args.target)
+
+
+if __name__ == '__main__':
+    main()
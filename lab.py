@@ -1,14 +1,17 @@
 import requests
 import os
+import argparse
 from urllib.parse import urlparse
 import time
 
+from async_crawler import crawl
+
 def create_directory(directory):
     """Создает директорию, если она не существует"""
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def download_page(url, output_dir, file_number):
+def download_page(url, output_dir, file_number, session=None):
     """Загружает страницу и сохраняет её в файл"""
     try:
         # Добавляем задержку между запросами
@@ -18,7 +21,7 @@ def download_page(url, output_dir, file_number):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = (session or requests).get(url, headers=headers, timeout=10)
         
         # Проверяем успешность запроса
         if response.status_code == 200:
@@ -36,7 +39,25 @@ def download_page(url, output_dir, file_number):
         print(f"Ошибка при загрузке {url}: {str(e)}")
         return False
 
+def read_urls(file_path):
+    """Читает список URL из файла (по одному в строке)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
 def main():
+    parser = argparse.ArgumentParser(description='Загрузка HTML-страниц')
+    parser.add_argument('--urls', help='файл со списком URL (по умолчанию - встроенный список)')
+    parser.add_argument('--output', default='pages', help='директория для страниц')
+    parser.add_argument('--index', default='index.txt', help='файл с номерами и URL страниц')
+    parser.add_argument('--max-pages', type=int, default=100, help='сколько страниц загрузить')
+    parser.add_argument('--serial', action='store_true',
+                        help='прежний последовательный режим: одна страница в секунду')
+    parser.add_argument('--concurrency', type=int, default=16, help='максимум одновременных запросов')
+    parser.add_argument('--rate', type=float, default=5.0, help='запросов в секунду к одному хосту')
+    parser.add_argument('--burst', type=int, default=5, help='допустимый всплеск запросов к одному хосту')
+    parser.add_argument('--retries', type=int, default=3, help='число повторов неудачного запроса')
+    args = parser.parse_args()
+
     # Список URL-адресов для загрузки (замените на свой список)
     urls = [
         "https://habr.com/ru/articles/1/",
@@ -141,32 +162,41 @@ def main():
         "https://habr.com/ru/articles/127/",
     ]
     
+    if args.urls:
+        urls = read_urls(args.urls)
+
     # Создаем директорию для сохранения страниц
-    output_dir = "pages"
+    output_dir = args.output
     create_directory(output_dir)
+
+    if not args.serial:
+        # Асинхронная загрузка с пулом соединений и ограничением частоты по хостам
+        saved, stats = crawl(urls, output_dir, args.index, concurrency=args.concurrency,
+                             host_rate=args.rate, host_burst=args.burst, retries=args.retries,
+                             max_pages=args.max_pages)
+        print(f"\nЗагрузка завершена. Успешно загружено страниц: {len(saved)}")
+        print(stats.report())
+        return
     
-    # Создаем или очищаем index.txt
-    with open("index.txt", 'w', encoding='utf-8') as index_file:
-        index_file.write("Номер файла\tURL\n")
-    
-    # Загружаем страницы
+    # Загружаем страницы последовательно через одно keep-alive соединение
     successful_downloads = 0
     file_number = 1
     
-    for url in urls:
-        if download_page(url, output_dir, file_number):
-            # Записываем информацию в index.txt
-            with open("index.txt", 'a', encoding='utf-8') as index_file:
+    with requests.Session() as session, open(args.index, 'w', encoding='utf-8') as index_file:
+        index_file.write("Номер файла\tURL\n")
+        for url in urls:
+            if download_page(url, output_dir, file_number, session):
+                # Записываем информацию в index.txt
                 index_file.write(f"{file_number}\t{url}\n")
-            
-            successful_downloads += 1
-            file_number += 1
-            print(f"Успешно загружена страница: {url}")
-        else:
-            print(f"Не удалось загрузить страницу: {url}")
-            
-        if successful_downloads >= 100:
-            break
+                
+                successful_downloads += 1
+                file_number += 1
+                print(f"Успешно загружена страница: {url}")
+            else:
+                print(f"Не удалось загрузить страницу: {url}")
+                
+            if successful_downloads >= args.max_pages:
+                break
     
     print(f"\nЗагрузка завершена. Успешно загружено страниц: {successful_downloads}")
 
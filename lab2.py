@@ -1,68 +1,111 @@
 import os
 import re
-import pymorphy2
+import time
+import argparse
 import shutil
 
-from collections import defaultdict
-from bs4 import BeautifulSoup
+from collections import Counter, defaultdict
+from itertools import count
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lemmatizer import get_lemmatizer
+from html_extract import EXTRACTORS, get_extractor
+from manifest import (MANIFEST_PATH, diff_hashes, document_sort_key, load_manifest, manifest_hashes,
+                      save_manifest, scan_pages)
+from term_counts import COUNTS_PATH, CorpusCounts, CountsBuilder
+
+WORD_PATTERN = re.compile(r'\b[а-яё]+\b', flags=re.IGNORECASE)
+
+# Список русских стоп-слов
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 
+    'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 
+    'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'вдруг', 
+    'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж', 
+    'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть', 
+    'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 
+    'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого', 
+    'какой', 'совсем', 'этом', 'об', 'им', 'здесь', 'при', 'куда', 'зачем', 'всех', 'можно', 'над', 
+    'про', 'тут', 'нам', 'нас', 'ими', 'или', 'мой', 'свой', 'твой', 'нам', 'чтобы', 'были', 'кому', 
+    'больше', 'после', 'через',
+})
+
+
+def iter_word_positions(text: str, positions: Iterator[int]) -> Iterator[Tuple[int, str]]:
+    """Слова текста (как iter_words) вместе с позициями - номерами из positions.
+
+    Номер получает каждое русское слово, в том числе стоп-слова и короткие, поэтому
+    расстояние между словами сохраняется. Общий positions продолжает нумерацию
+    в следующей части текста.
+    """
+    # Сначала берется слово, затем номер: после последнего слова номер не расходуется
+    for token, position in zip(WORD_PATTERN.findall(text), positions):
+        token_lower = token.lower()
+        # Проверяем, что токен - это слово и не стоп-слово
+        if token_lower.isalpha() and token_lower not in STOP_WORDS and len(token_lower) > 2:
+            yield position, token_lower
+
+
+def iter_words(text: str) -> Iterator[str]:
+    """Слова текста в нижнем регистре: русские, не стоп-слова, длиннее двух букв (в порядке текста)"""
+    for _, token in iter_word_positions(text, count()):
+        yield token
+
 
 class Tokenizer:
-    def __init__(self):
-        self.morph = pymorphy2.MorphAnalyzer()
-        
-        # Список русских стоп-слов
-        self.stop_words = {
-            'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 
-            'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 
-            'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'вдруг', 
-            'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж', 
-            'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть', 
-            'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 
-            'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого', 
-            'какой', 'совсем', 'этом', 'об', 'им', 'здесь', 'при', 'куда', 'зачем', 'всех', 'можно', 'над', 
-            'про', 'тут', 'нам', 'нас', 'ими', 'или', 'мой', 'свой', 'твой', 'нам', 'чтобы', 'были', 'кому', 
-            'больше', 'после', 'через',
-        }
+    def __init__(self, extractor: str = 'stream'):
+        self.lemmatizer = get_lemmatizer()
+        self.extractor = get_extractor(extractor)
+        self.stop_words = STOP_WORDS  # Список русских стоп-слов
 
     def extract_tokens(self, file_path: str) -> set[str]:
         """Извлекает токены из HTML файла"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            html = f.read()
-
-        # Извлекаем текст из HTML
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(separator=' ')
-
-        # Находим только русские слова
-        tokens_raw = re.findall(r'\b[а-яё]+\b', text, flags=re.IGNORECASE)
-        tokens = set()
-
-        # Фильтруем токены
-        for token in tokens_raw:
-            token_lower = token.lower()
-            # Проверяем, что токен - это слово и не стоп-слово
-            if token_lower.isalpha() and token_lower not in self.stop_words and len(token_lower) > 2:
-                tokens.add(token_lower)
-        
-        return tokens
+        return set(self.count_tokens(file_path))
+
+    def count_tokens(self, file_path: str) -> Counter:
+        """Число вхождений каждого токена HTML файла"""
+        return Counter({token: len(positions) for token, positions in self.token_positions(file_path).items()})
+
+    def token_positions(self, file_path: str) -> Dict[str, List[int]]:
+        """Позиции вхождений каждого токена HTML файла (номера слов текста по возрастанию)"""
+        positions = defaultdict(list)
+        numbers = count()
+
+        # Текст из HTML поступает частями по мере разбора файла, нумерация слов сквозная
+        for text in self.extractor.iter_text(file_path):
+            # Находим только русские слова, отбрасывая стоп-слова и короткие
+            for position, token in iter_word_positions(text, numbers):
+                positions[token].append(position)
+
+        return dict(positions)
 
     def group_by_lemma(self, tokens: set[str]) -> dict[str, set[str]]:
         """Группирует токены по леммам"""
         lemmas = defaultdict(set)
 
         for token in tokens:
-            parsed = self.morph.parse(token)
-            if parsed:
-                lemma = parsed[0].normal_form
+            lemma = self.lemmatizer.lemmatize(token)
+            if lemma is not None:
                 lemmas[lemma].add(token)
 
         return lemmas
 
-    def process_file(self, file_path: str, file_number: str) -> None:
-        """Обрабатывает HTML файл и создает файлы токенов и лемм"""
-        tokens = self.extract_tokens(file_path)
-        lemmas = self.group_by_lemma(tokens)
+    def process_file(self, file_path: str, file_number: str,
+                     export_text: bool = False) -> Tuple[Dict[str, List[int]], Dict[str, Optional[str]]]:
+        """Обрабатывает HTML файл: позиции вхождений токенов и лемма каждого токена.
 
+        С export_text создаются также текстовые файлы токенов и лемм.
+        """
+        positions = self.token_positions(file_path)
+        token_lemmas = {token: self.lemmatizer.lemmatize(token) for token in positions}
+        if export_text:
+            self.write_text(file_number, set(positions), self.group_by_lemma(set(positions)))
+        return positions, token_lemmas
+
+    @staticmethod
+    def write_text(file_number: str, tokens: set[str], lemmas: dict[str, set[str]]) -> None:
+        """Создает файлы токенов и лемм документа"""
         # Создаем директории для результатов
         tokens_dir = os.path.join('lab2results', 'tokens')
         lemmas_dir = os.path.join('lab2results', 'lemmas')
@@ -81,54 +124,169 @@ class Tokenizer:
         with open(lemmas_file, 'w', encoding='utf-8') as f:
             for lemma in sorted(lemmas):
                 f.write(lemma + ' ' + ' '.join(sorted(lemmas[lemma])) + '\n')
-        
-        return len(tokens), len(lemmas)
+
+
+# Токенизатор процесса-обработчика: создается один раз при запуске процесса
+_worker_tokenizer = None
+
+
+def _init_worker(extractor: str) -> None:
+    """Инициализирует процесс пула: загружает словари MorphAnalyzer один раз"""
+    global _worker_tokenizer
+    _worker_tokenizer = Tokenizer(extractor)
+
+
+def process_task(tokenizer: Tokenizer, task: tuple[str, str, bool]) -> tuple[dict, dict, int]:
+    """Обрабатывает один файл: задача - (путь к файлу, номер файла, создавать ли текстовые файлы)"""
+    file_path, file_number, export_text = task
+    positions, token_lemmas = tokenizer.process_file(file_path, file_number, export_text)
+    return positions, token_lemmas, os.path.getsize(file_path)
+
+
+def _process_in_worker(task: tuple[str, str, bool]) -> tuple[dict, dict, int]:
+    """Обрабатывает один файл в процессе пула"""
+    return process_task(_worker_tokenizer, task)
+
+
+def process_files(tasks: list[tuple[str, str]], workers: int, chunksize: int, extractor: str = 'stream',
+                  export_text: bool = False):
+    """Обрабатывает файлы последовательно или в пуле процессов.
+
+    Результаты выдаются в порядке входного списка, поэтому итоги не зависят от числа процессов.
+    """
+    tasks = [(file_path, file_number, export_text) for file_path, file_number in tasks]
+    if workers <= 1:
+        tokenizer = Tokenizer(extractor)
+        for task in tasks:
+            yield process_task(tokenizer, task)
+        return
+
+    if chunksize <= 0:
+        # Порции покрупнее уменьшают накладные расходы на передачу задач между процессами
+        chunksize = max(1, len(tasks) // (workers * 4))
+    with Pool(processes=workers, initializer=_init_worker, initargs=(extractor,)) as pool:
+        yield from pool.imap(_process_in_worker, tasks, chunksize=chunksize)
+
+
+def print_progress(done: int, total: int, total_bytes: int, elapsed: float) -> None:
+    """Печатает прогресс и пропускную способность обработки"""
+    files_per_second = done / elapsed if elapsed > 0 else 0.0
+    mb_per_second = total_bytes / 2**20 / elapsed if elapsed > 0 else 0.0
+    print(f"Обработано {done}/{total} файлов: {files_per_second:.1f} файлов/с, {mb_per_second:.2f} МБ/с")
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Токенизация и лемматизация HTML-страниц')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='число процессов для обработки (по умолчанию 1)')
+    parser.add_argument('--chunksize', type=int, default=0,
+                        help='число файлов в одной порции для процесса (0 - подобрать автоматически)')
+    parser.add_argument('--extractor', choices=EXTRACTORS, default='stream',
+                        help='способ извлечения текста из HTML (bs4 - эталонный BeautifulSoup)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='обработать только новые и измененные страницы (по манифесту)')
+    parser.add_argument('--export-text', action='store_true',
+                        help='создать также текстовые файлы токенов и лемм (lab2results/tokens, lemmas)')
+    args = parser.parse_args()
+
     # Создаем директорию для результатов
     output_dir = 'lab2results'
     os.makedirs(output_dir, exist_ok=True)
     
-    # Удаляем предыдущие результаты, если они есть
     tokens_dir = os.path.join(output_dir, 'tokens')
     lemmas_dir = os.path.join(output_dir, 'lemmas')
+
+    # Манифест: хеши страниц, обработанных в прошлый раз
+    input_dir = 'pages'
+    previous_manifest = load_manifest() if args.incremental else {}
+    manifest = scan_pages(input_dir, previous_manifest)
     
-    if os.path.exists(tokens_dir):
-        shutil.rmtree(tokens_dir)
-    if os.path.exists(lemmas_dir):
-        shutil.rmtree(lemmas_dir)
-    
-    # Создаем новые директории
-    os.makedirs(tokens_dir, exist_ok=True)
-    os.makedirs(lemmas_dir, exist_ok=True)
+    # Текстовые файлы удаляются, только если они будут созданы заново: без --export-text
+    # прежние токены и леммы остаются для тех, кто читает их из директорий
+    if args.export_text:
+        if not args.incremental:
+            # Удаляем предыдущие результаты, если они есть
+            if os.path.exists(tokens_dir):
+                shutil.rmtree(tokens_dir)
+            if os.path.exists(lemmas_dir):
+                shutil.rmtree(lemmas_dir)
+
+        # Создаем новые директории для текстовых файлов
+        os.makedirs(tokens_dir, exist_ok=True)
+        os.makedirs(lemmas_dir, exist_ok=True)
+
+    added, modified, removed = diff_hashes(manifest_hashes(manifest), manifest_hashes(previous_manifest))
+    if args.incremental:
+        print(f"Новых страниц: {len(added)}, измененных: {len(modified)}, удаленных: {len(removed)}")
+
+    # Счетчики неизмененных страниц берутся из прошлого файла счетчиков
+    previous = CorpusCounts(COUNTS_PATH) if args.incremental and os.path.exists(COUNTS_PATH) else None
+
+    # Удаляем результаты для исчезнувших страниц
+    for file_number in removed:
+        for directory in (tokens_dir, lemmas_dir):
+            file_path = os.path.join(directory, f"{file_number}.txt")
+            if os.path.exists(file_path):
+                os.remove(file_path)
 
-    tokenizer = Tokenizer()
     processed_files = 0
+    processed_bytes = 0
     total_tokens = 0
     total_lemmas = 0
 
-    # Обрабатываем все HTML файлы
-    input_dir = 'pages'
-    for filename in sorted(os.listdir(input_dir)):
-        if filename.endswith('.html'):
-            file_path = os.path.join(input_dir, filename)
-            file_number = os.path.splitext(filename)[0]
-            
-            print(f"Обработка файла: {filename}")
-            tokens_count, lemmas_count = tokenizer.process_file(file_path, file_number)
-            
-            total_tokens += tokens_count
-            total_lemmas += lemmas_count
-            processed_files += 1
+    # Собираем HTML файлы, которые нужно обработать (в порядке номеров документов);
+    # страницы, которых нет в прошлом файле счетчиков, обрабатываются заново
+    documents = sorted(manifest, key=document_sort_key)
+    changed = set(added) | set(modified)
+    changed.update(document_id for document_id in documents
+                   if previous is None or document_id not in previous.doc_numbers)
+    tasks = [(os.path.join(input_dir, manifest[document_id]['file']), document_id)
+             for document_id in documents if document_id in changed]
+
+    print(f"Найдено файлов: {len(tasks)}, процессов: {args.workers}")
+    start_time = time.perf_counter()
+    last_report = start_time
+
+    # Обрабатываем файлы, собирая позиции токенов всех страниц в порядке документов
+    builder = CountsBuilder(previous.lemma_map() if previous is not None else {})
+    results = process_files(tasks, args.workers, args.chunksize, args.extractor, args.export_text)
+    for document_id in documents:
+        if document_id not in changed:
+            builder.add_document(document_id, previous.token_positions(previous.doc_numbers[document_id]))
+            continue
+
+        positions, document_lemmas, file_size = next(results)
+        builder.add_document(document_id, positions, document_lemmas)
+        total_tokens += len(positions)
+        total_lemmas += len({lemma for lemma in document_lemmas.values() if lemma is not None})
+        processed_files += 1
+        processed_bytes += file_size
+
+        now = time.perf_counter()
+        if now - last_report >= 1.0:
+            print_progress(processed_files, len(tasks), processed_bytes, now - start_time)
+            last_report = now
+    builder.save(COUNTS_PATH)
+
+    # Манифест сохраняется только после успешной обработки всех файлов
+    save_manifest(manifest)
 
     print(f"\nОбработка завершена.")
+    print_progress(processed_files, len(tasks), processed_bytes, time.perf_counter() - start_time)
     print(f"Обработано файлов: {processed_files}")
     print(f"Всего уникальных токенов: {total_tokens}")
     print(f"Всего уникальных лемм: {total_lemmas}")
-    print(f"Токены и леммы сохранены в директориях:")
-    print(f"- {tokens_dir}")
-    print(f"- {lemmas_dir}")
+    if args.workers <= 1:
+        # В режиме пула у каждого процесса свой кэш, общая статистика здесь недоступна
+        stats = get_lemmatizer().stats()
+        print(f"Кэш лемм: попаданий {stats['hits'] + stats['disk_hits']}, промахов {stats['misses']} "
+              f"(доля попаданий {stats['hit_rate']:.1%})")
+    print(f"Счетчики и позиции токенов и лемм всех страниц: {COUNTS_PATH}")
+    if args.export_text:
+        print(f"Токены и леммы сохранены в директориях:")
+        print(f"- {tokens_dir}")
+        print(f"- {lemmas_dir}")
+    print(f"Манифест страниц: {MANIFEST_PATH}")
 
     # Создаем архив с результатами
     shutil.make_archive('lab2results', 'zip', output_dir)
@@ -1,25 +1,139 @@
 import os
 import re
-import pymorphy2
-from typing import Dict, List, Set, Union, Tuple
-from collections import defaultdict
+import json
+from collections.abc import Mapping
+from itertools import count
+from typing import Dict, List, Optional, Sequence, Set, Union, Tuple
+
+import numpy as np
+
+from index_segment import SegmentPostings, SegmentReader, encode_postings, write_segment
+from lab2 import STOP_WORDS, iter_word_positions
+from postings import ArrayPostings, compact, make_postings, materialize
+from query_planner import Node, QueryPlanner, canonical_key
+from query_cache import DEFAULT_CACHE_SIZE, QueryCache
+from lemmatizer import get_lemmatizer
+from manifest import MANIFEST_PATH, diff_hashes, document_sort_key, load_manifest, manifest_hashes
+from term_counts import COUNTS_PATH, CorpusCounts
+from term_dictionary import MAX_EXPANSIONS, TermDictionary
+from spelling import DEFAULT_BUDGET_MS, SpellingCorrector
+
 
 class InvertedIndex:
     """Класс для создания и работы с инвертированным индексом"""
     
-    def __init__(self):
-        self.index = defaultdict(set)
-        self.documents = set()
-        self.morph_analyzer = pymorphy2.MorphAnalyzer()
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE, cache_policy: str = 'tinylfu',
+                 max_expansions: int = MAX_EXPANSIONS, spelling_budget_ms: Optional[float] = None):
+        self.index = {}         # Термин -> номера документов (ArrayPostings или BitmapPostings)
+        self.positions = {}     # Термин -> {номер документа -> позиции слов, разности в varint}
+        self.positional = False # Есть ли позиции у всех документов (нужны для фраз и NEAR)
+        self._doc_table = []    # Номер документа -> идентификатор
+        self.doc_numbers = {}   # Идентификатор документа -> номер
+        self.deleted = set()    # Номера удаленных документов (убираются при сохранении)
+        self.source_hashes = {} # Хеши страниц, из которых построен индекс (из манифеста lab2)
+        self.lemmatizer = get_lemmatizer()
+        self.segment = None  # Открытый бинарный сегмент, если индекс загружен из него
+        self.planner = QueryPlanner(self)
+        self.version = 0     # Номер версии индекса, увеличивается при каждом изменении
+        self.cache = QueryCache(cache_size, cache_policy)  # Результаты запросов текущей версии
+        self.max_expansions = max_expansions  # Наибольшее число лемм, в которые раскрывается маска
+        self._dictionary = None  # (версия индекса, отсортированный словарь для масок)
+        self.spelling_budget_ms = spelling_budget_ms  # Бюджет исправления опечаток на запрос, мс (None - без исправления)
+        self._corrector = None  # Исправление опечаток по текущему словарю
+        self._spelling_deadline = None  # Момент, после которого слова выполняемого запроса не исправляются
+
+    @property
+    def doc_table(self) -> List[str]:
+        """Идентификаторы документов в порядке их номеров"""
+        return self.segment.doc_table if self.segment is not None else self._doc_table
+
+    @property
+    def n_docs(self) -> int:
+        """Количество документов в индексе"""
+        return self.segment.n_docs if self.segment is not None else len(self._doc_table)
+
+    @property
+    def documents(self) -> Set[str]:
+        """Множество идентификаторов всех документов"""
+        if not self.deleted:
+            return set(self.doc_table)
+        return {document_id for number, document_id in enumerate(self.doc_table) if number not in self.deleted}
         
-    def add_document(self, document_id: str, terms: Dict[str, Set[str]]) -> None:
-        """Добавляет документ в индекс"""
-        # Сохраняем идентификатор документа
-        self.documents.add(document_id)
+    def add_document(self, document_id: str, terms: Dict[str, Set[str]],
+                     positions: Optional[Dict[str, Sequence[int]]] = None) -> None:
+        """Добавляет документ в индекс (positions - позиции слов каждой леммы по возрастанию)"""
+        self._materialize()
+        self.version += 1
+        if positions is None:
+            # Документ без позиций: фразовые запросы к индексу больше невозможны
+            self.positional = False
+            self.positions = {}
+        elif not self._doc_table:
+            # Позиции хранятся, если они есть у документов с самого первого
+            self.positional = True
+
+        # Назначаем документу очередной номер
+        number = self.doc_numbers.get(document_id)
+        if number is None:
+            number = len(self._doc_table)
+            self._doc_table.append(document_id)
+            self.doc_numbers[document_id] = number
         
         # Добавляем каждую лемму в индекс
         for lemma in terms:
-            self.index[lemma].add(document_id)
+            postings = self.index.get(lemma)
+            if postings is None:
+                postings = self.index[lemma] = ArrayPostings()
+            postings.add(number)
+            if self.positional and positions is not None:
+                self.positions.setdefault(lemma, {})[number] = encode_postings(positions[lemma])
+
+    def remove_document(self, document_id: str) -> None:
+        """Удаляет документ из индекса.
+
+        Номер документа помечается удаленным и исключается из результатов поиска,
+        а списки документов очищаются при сохранении индекса (purge_deleted).
+        """
+        self._materialize()
+        self.version += 1
+        number = self.doc_numbers.pop(document_id, None)
+        if number is not None:
+            self.deleted.add(number)
+
+    def purge_deleted(self) -> None:
+        """Убирает удаленные документы из списков и перенумеровывает оставшиеся"""
+        if not self.deleted:
+            return
+        renumber = {}
+        doc_table = []
+        for number, document_id in enumerate(self._doc_table):
+            if number not in self.deleted:
+                renumber[number] = len(doc_table)
+                doc_table.append(document_id)
+
+        index = {}
+        for term, postings in self.index.items():
+            numbers = [renumber[number] for number in postings if number in renumber]
+            if numbers:
+                index[term] = make_postings(numbers, len(doc_table))
+
+        positions = {}
+        for term, documents in self.positions.items():
+            documents = {renumber[number]: data for number, data in documents.items() if number in renumber}
+            if documents:
+                positions[term] = documents
+
+        self.index = index
+        self.positions = positions
+        self._doc_table = doc_table
+        self.doc_numbers = {document_id: number for number, document_id in enumerate(doc_table)}
+        self.deleted = set()
+
+    def optimize(self) -> None:
+        """Выбирает для каждого термина более компактное представление списка документов"""
+        self._materialize()
+        for term, postings in self.index.items():
+            self.index[term] = compact(postings, self.n_docs)
     
     def create_from_directory(self, lemmas_directory: str) -> None:
         """Создает индекс из файлов с леммами в указанной директории"""
@@ -33,41 +147,163 @@ class InvertedIndex:
                 # Получаем идентификатор документа (убираем расширение)
                 document_id = os.path.splitext(filename)[0]
                 
-                # Считываем леммы из файла
-                terms = {}
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    for line in file:
-                        parts = line.strip().split()
-                        if parts:
-                            # Формат строки: <лемма> <токен1> <токен2> ... <токенN>
-                            lemma = parts[0]
-                            tokens = set(parts[1:]) if len(parts) > 1 else set()
-                            terms[lemma] = tokens
-                
-                # Добавляем документ в индекс
-                self.add_document(document_id, terms)
+                # Считываем леммы из файла и добавляем документ в индекс
+                self.add_document(document_id, self._read_lemmas_file(file_path))
                 file_count += 1
                 
                 if file_count % 10 == 0:
                     print(f"Обработано {file_count} файлов...")
+
+        self.optimize()
+        self.source_hashes = manifest_hashes(load_manifest())
         
-        print(f"Индекс создан. Всего документов: {len(self.documents)}")
+        print(f"Индекс создан. Всего документов: {self.n_docs}")
         print(f"Размер словаря индекса: {len(self.index)} терминов")
+
+    def create_from_counts(self, counts_path: str = COUNTS_PATH) -> None:
+        """Создает индекс из бинарного файла счетчиков задания 2 (без разбора текстовых файлов).
+
+        Вместе со списками документов сохраняются позиции слов, поэтому доступны фразы и NEAR.
+        """
+        counts = CorpusCounts(counts_path)
+        for row, document_id in enumerate(counts.doc_ids):
+            self.add_document(document_id, counts.lemma_tokens(row), counts.lemma_positions(row))
+
+        self.optimize()
+        self.source_hashes = manifest_hashes(load_manifest())
+
+        print(f"Индекс создан из {counts_path}. Всего документов: {self.n_docs}")
+        print(f"Размер словаря индекса: {len(self.index)} терминов")
+
+    @staticmethod
+    def _read_lemmas_file(file_path: str) -> Dict[str, Set[str]]:
+        """Считывает леммы документа из файла задания 2"""
+        terms = {}
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                parts = line.strip().split()
+                if parts:
+                    # Формат строки: <лемма> <токен1> <токен2> ... <токенN>
+                    lemma = parts[0]
+                    tokens = set(parts[1:]) if len(parts) > 1 else set()
+                    terms[lemma] = tokens
+        return terms
+
+    def update_from_directory(self, lemmas_directory: str, manifest_path: str = MANIFEST_PATH) -> bool:
+        """Применяет к индексу изменения страниц с момента его построения.
+
+        Новые и измененные страницы определяются сравнением хешей из манифеста lab2
+        с хешами, по которым строился индекс. Возвращает True, если индекс изменился.
+        """
+        return self._apply_changes(
+            lambda document_id: (self._read_lemmas_file(os.path.join(lemmas_directory, f"{document_id}.txt")),
+                                 None),
+            manifest_path)
+
+    def update_from_counts(self, counts_path: str = COUNTS_PATH, manifest_path: str = MANIFEST_PATH) -> bool:
+        """Как update_from_directory, но леммы страниц берутся из бинарного файла счетчиков"""
+        counts = CorpusCounts(counts_path)
+
+        def read_document(document_id: str):
+            row = counts.doc_numbers[document_id]
+            return counts.lemma_tokens(row), counts.lemma_positions(row)
+
+        return self._apply_changes(read_document, manifest_path)
+
+    def _apply_changes(self, read_document, manifest_path: str) -> bool:
+        """Удаляет измененные и исчезнувшие страницы и добавляет новые.
+
+        read_document возвращает леммы страницы и позиции их слов (или None).
+        """
+        current = manifest_hashes(load_manifest(manifest_path))
+        added, modified, removed = diff_hashes(current, self.source_hashes)
+        if not (added or modified or removed):
+            return False
+
+        for document_id in modified + removed:
+            self.remove_document(document_id)
+        for document_id in added + modified:
+            self.add_document(document_id, *read_document(document_id))
+        self.optimize()
+        self.source_hashes = current
+
+        print(f"Индекс обновлен: добавлено {len(added)}, изменено {len(modified)}, удалено {len(removed)} документов")
+        return True
     
     def save_index(self, file_path: str) -> None:
         """Сохраняет индекс в текстовый файл"""
+        self.purge_deleted()
+        doc_table = self.doc_table
         with open(file_path, 'w', encoding='utf-8') as file:
             for term in sorted(self.index.keys()):
-                doc_list = sorted(self.index[term])
+                doc_list = sorted(doc_table[number] for number in self.index[term])
                 # Записываем в формате: "термин: документ1, документ2, ..., документN"
                 file.write(f"{term}: {', '.join(doc_list)}\n")
                 
         print(f"Индекс сохранен в файл: {file_path}")
     
+    def save_segment(self, file_path: str) -> None:
+        """Сохраняет индекс в бинарный сегмент (хеши исходных страниц - в файле рядом)"""
+        self.purge_deleted()
+        write_segment(file_path, self.doc_table, self.index, self.positions if self.positional else None)
+        with open(file_path + '.hashes.json', 'w', encoding='utf-8') as file:
+            json.dump(self.source_hashes, file, sort_keys=True)
+        print(f"Индекс сохранен в сегмент: {file_path}")
+
+    def load_segment(self, file_path: str) -> None:
+        """Открывает бинарный сегмент через mmap; списки документов читаются по запросу"""
+        self._close_segment()
+        self.segment = SegmentReader(file_path)
+        self.index = SegmentPostings(self.segment)
+        self.positional = self.segment.has_positions
+        hashes_path = file_path + '.hashes.json'
+        if os.path.exists(hashes_path):
+            with open(hashes_path, 'r', encoding='utf-8') as file:
+                self.source_hashes = json.load(file)
+
+        print(f"Индекс открыт из сегмента: {file_path}")
+        print(f"Всего документов: {self.n_docs}")
+        print(f"Размер словаря индекса: {len(self.index)} терминов")
+
+    def _close_segment(self) -> None:
+        """Закрывает открытый сегмент и возвращает индекс к пустому состоянию в памяти"""
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+        self.version += 1
+        self.index = {}
+        self.positions = {}
+        self.positional = False
+        self._doc_table = []
+        self.doc_numbers = {}
+        self.deleted = set()
+        self.source_hashes = {}
+
+    def _materialize(self) -> None:
+        """Переносит данные сегмента в память, чтобы индекс можно было изменять"""
+        if self.segment is None:
+            return
+        index = {term: self.index[term] for term in self.index}
+        positions = {}
+        if self.segment.has_positions:
+            positions = {term: dict(self.segment.position_lists(position))
+                         for position, term in enumerate(self.segment.terms())}
+        positional = self.segment.has_positions
+        doc_table = list(self.segment.doc_table)
+        source_hashes = self.source_hashes
+        self._close_segment()
+        self.source_hashes = source_hashes
+        self.index = index
+        self.positions = positions
+        self.positional = positional
+        self._doc_table = doc_table
+        self.doc_numbers = {document_id: number for number, document_id in enumerate(doc_table)}
+
     def load_index(self, file_path: str) -> None:
         """Загружает индекс из текстового файла"""
-        self.index.clear()
-        self.documents.clear()
+        self._close_segment()
+        term_documents = {}
+        documents = set()
         
         with open(file_path, 'r', encoding='utf-8') as file:
             for line in file:
@@ -84,144 +320,128 @@ class InvertedIndex:
                 # Разбиваем список документов по запятой и удаляем пробелы
                 doc_list = [doc.strip() for doc in doc_list_str.split(',')]
                 
-                # Добавляем документы в индекс для данного термина
-                self.index[term] = set(doc_list)
+                term_documents[term] = doc_list
                 # Обновляем список всех документов
-                self.documents.update(doc_list)
+                documents.update(doc_list)
+
+        # Нумеруем документы и переводим списки в номера
+        self._doc_table = sorted(documents, key=document_sort_key)
+        self.doc_numbers = {document_id: number for number, document_id in enumerate(self._doc_table)}
+        for term, doc_list in term_documents.items():
+            numbers = sorted({self.doc_numbers[document_id] for document_id in doc_list})
+            self.index[term] = make_postings(numbers, self.n_docs)
         
         print(f"Индекс загружен из файла: {file_path}")
-        print(f"Всего документов: {len(self.documents)}")
+        print(f"Всего документов: {self.n_docs}")
         print(f"Размер словаря индекса: {len(self.index)} терминов")
     
     def get_lemma(self, word: str) -> str:
         """Приводит слово к лемме"""
-        parsed = self.morph_analyzer.parse(word.lower())
-        if parsed:
-            return parsed[0].normal_form
-        return word.lower()
+        word = word.lower()
+        return self.lemmatizer.lemmatize(word) or word
     
     def find_documents(self, term: str) -> Set[str]:
         """Находит документы, содержащие указанный термин"""
-        # Приводим поисковый термин к лемме
+        doc_table = self.doc_table
+        return {doc_table[number] for number in self._live(materialize(self._find_postings(term), self.n_docs)).tolist()}
+
+    def _live(self, numbers: np.ndarray) -> np.ndarray:
+        """Исключает удаленные документы из результата"""
+        if not self.deleted:
+            return numbers
+        return numbers[~np.isin(numbers, np.fromiter(self.deleted, dtype=np.uint32, count=len(self.deleted)))]
+
+    def _find_postings(self, term: str):
+        """Возвращает номера документов термина в виде, пригодном для вычисления запроса"""
+        # Приводим поисковый термин к лемме, а отсутствующую в индексе - к ближайшей по написанию
         lemma = self.get_lemma(term)
-        
-        return self.index.get(lemma, set())
+        if self.doc_freq(lemma) == 0:
+            lemma = self.correct_lemma(lemma) or lemma
+        return self.lemma_postings(lemma)
+
+    def lemma_postings(self, lemma: str):
+        """Возвращает номера документов леммы в виде, пригодном для вычисления запроса"""
+        postings = self.index.get(lemma)
+        if postings is None:
+            return ArrayPostings().value(self.n_docs)
+        return postings.value(self.n_docs)
+
+    def lemma_positions(self, lemma: str) -> Mapping:
+        """Сжатые позиции слов леммы по номерам документов (декодируются только для нужных документов)"""
+        if not self.positional:
+            raise ValueError("индекс построен без позиций слов, фразы и NEAR недоступны "
+                             "(постройте его из файла счетчиков lab2.py)")
+        if self.segment is not None:
+            position = self.segment.find_term(lemma)
+            return self.segment.position_lists(position) if position >= 0 else {}
+        return self.positions.get(lemma, {})
+
+    @staticmethod
+    def phrase_words(text: str) -> List[Tuple[int, str]]:
+        """Слова фразы с их номерами, по тем же правилам, что и при построении индекса"""
+        return list(iter_word_positions(text, count()))
+
+    def doc_freq(self, lemma: str) -> int:
+        """Количество документов, содержащих лемму (без декодирования списка из сегмента)"""
+        if self.segment is not None:
+            position = self.segment.find_term(lemma)
+            return self.segment.doc_freq(position) if position >= 0 else 0
+        postings = self.index.get(lemma)
+        return len(postings) if postings is not None else 0
     
+    def term_dictionary(self) -> TermDictionary:
+        """Отсортированный словарь лемм с числом документов (перестраивается после изменения индекса)"""
+        if self._dictionary is None or self._dictionary[0] != self.version:
+            if self.segment is not None:
+                dictionary = TermDictionary(self.segment.terms(), self.segment.doc_freqs())
+            else:
+                dictionary = TermDictionary(self.index, (len(postings) for postings in self.index.values()))
+            self._dictionary = (self.version, dictionary)
+        return self._dictionary[1]
+
+    def expand_wildcard(self, pattern: str) -> Tuple[List[str], int]:
+        """Леммы, подходящие под маску (не больше max_expansions самых частых), и число всех подходящих"""
+        return self.term_dictionary().expand(pattern.lower(), self.max_expansions)
+
+    def spelling_corrector(self) -> SpellingCorrector:
+        """Исправление опечаток по словарю лемм индекса (перестраивается вместе со словарем)"""
+        dictionary = self.term_dictionary()
+        if self._corrector is None or self._corrector.dictionary is not dictionary:
+            self._corrector = SpellingCorrector(dictionary, self.spelling_budget_ms)
+        return self._corrector
+
+    def correct_lemma(self, lemma: str) -> Optional[str]:
+        """Ближайшая по написанию лемма индекса для отсутствующей в нем (None - исправление выключено или не нашлось)"""
+        if self.spelling_budget_ms is None or lemma in STOP_WORDS:
+            return None
+        return self.spelling_corrector().correct(lemma, self._spelling_deadline)
+
     def _parse_expression(self, expression: str) -> List[str]:
         """Разбирает поисковое выражение на токены"""
-        # Заменяем скобки пробелами вокруг них для упрощения токенизации
-        expression = re.sub(r'\(', ' ( ', expression)
-        expression = re.sub(r'\)', ' ) ', expression)
-        
-        # Токенизируем выражение
-        tokens = expression.split()
+        # Скобки - отдельные токены, фраза в кавычках - один токен (незакрытая кавычка - до конца запроса)
+        tokens = re.findall(r'"[^"]*"?|[()]|[^\s()"]+', expression)
         return tokens
     
-    def _execute_search(self, tokens: List[str]) -> Set[str]:
+    def compile_query(self, tokens: List[str]) -> Optional[Node]:
+        """Строит оптимизированный план запроса по токенам (опечатки исправляются в пределах бюджета)"""
+        if self.spelling_budget_ms is not None:
+            self._spelling_deadline = self.spelling_corrector().deadline()
+        try:
+            return self.planner.compile(tokens)
+        finally:
+            self._spelling_deadline = None
+
+    def _execute_search(self, tokens: List[str]):
         """Выполняет поиск по токенам с учетом операторов AND, OR, NOT и скобок"""
-        operand_stack = []
-        operator_stack = []
-        priorities = {
-            'AND': 2,
-            'OR': 1,
-            'NOT': 3,
-            '(': 0
-        }
-        
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
-            
-            # Если это открывающая скобка, помещаем её в стек операторов
-            if token == '(':
-                operator_stack.append(token)
-            
-            # Если это закрывающая скобка, вычисляем выражение в скобках
-            elif token == ')':
-                # Выполняем все операции до открывающей скобки
-                while operator_stack and operator_stack[-1] != '(':
-                    self._execute_operation(operand_stack, operator_stack)
-                
-                # Удаляем открывающую скобку из стека
-                if operator_stack and operator_stack[-1] == '(':
-                    operator_stack.pop()
-            
-            # Если это оператор
-            elif token in ('AND', 'OR', 'NOT'):
-                # Если это NOT, то он унарный и следующий токен должен быть операндом
-                if token == 'NOT':
-                    # Пропускаем токен NOT и берем следующий токен
-                    i += 1
-                    if i < len(tokens):
-                        next_token = tokens[i]
-                        
-                        # Если следующий токен - скобка, обрабатываем выражение в скобках
-                        if next_token == '(':
-                            # Ищем соответствующую закрывающую скобку
-                            depth = 1
-                            j = i + 1
-                            while j < len(tokens) and depth > 0:
-                                if tokens[j] == '(':
-                                    depth += 1
-                                elif tokens[j] == ')':
-                                    depth -= 1
-                                j += 1
-                            
-                            # Рекурсивно обрабатываем выражение в скобках
-                            subresult = self._execute_search(tokens[i+1:j])
-                            
-                            # Применяем оператор NOT к результату
-                            result = self.documents - subresult
-                            operand_stack.append(result)
-                            
-                            # Переходим к следующему токену после закрывающей скобки
-                            i = j - 1
-                        else:
-                            # Получаем результат для операнда
-                            operand_result = self.find_documents(next_token)
-                            
-                            # Применяем оператор NOT
-                            result = self.documents - operand_result
-                            operand_stack.append(result)
-                    
-                else:
-                    # Выполняем все операции с более высоким или равным приоритетом
-                    while (operator_stack and operator_stack[-1] != '(' and
-                           priorities.get(operator_stack[-1], 0) >= priorities.get(token, 0)):
-                        self._execute_operation(operand_stack, operator_stack)
-                    
-                    # Добавляем текущий оператор в стек
-                    operator_stack.append(token)
-            
-            # Если это операнд
-            else:
-                result = self.find_documents(token)
-                operand_stack.append(result)
-            
-            i += 1
-        
-        # Выполняем все оставшиеся операции
-        while operator_stack:
-            self._execute_operation(operand_stack, operator_stack)
-        
-        # Результат находится в вершине стека операндов
-        return operand_stack[0] if operand_stack else set()
-    
-    def _execute_operation(self, operand_stack: List[Set[str]], operator_stack: List[str]) -> None:
-        """Выполняет операцию из вершины стека операторов над операндами из стека операндов"""
-        operator = operator_stack.pop()
-        
-        if operator == 'AND':
-            right_operand = operand_stack.pop()
-            left_operand = operand_stack.pop()
-            result = left_operand & right_operand
-            operand_stack.append(result)
-        
-        elif operator == 'OR':
-            right_operand = operand_stack.pop()
-            left_operand = operand_stack.pop()
-            result = left_operand | right_operand
-            operand_stack.append(result)
+        return self.planner.execute(self.compile_query(tokens))
+
+    def explain(self, query: str) -> str:
+        """Выполняет запрос и печатает его план с оценками и фактическим числом документов"""
+        plan = self.compile_query(self._parse_expression(query))
+        self.planner.execute(plan, collect=True)
+        text = self.planner.explain(plan)
+        print(text)
+        return text
     
     def search(self, query: str) -> List[str]:
         """Выполняет булев поиск по запросу"""
@@ -229,43 +449,73 @@ class InvertedIndex:
         if not query.strip():
             return []
         
-        # Разбираем запрос на токены
-        tokens = self._parse_expression(query)
-        
-        # Выполняем поиск
-        result = self._execute_search(tokens)
-        
-        # Возвращаем отсортированный список документов
-        return sorted(result)
+        # Разбираем запрос на токены и строим план
+        plan = self.compile_query(self._parse_expression(query))
+
+        # Равносильные запросы дают один и тот же канонический план и общий результат в кэше
+        result = self.cache.lookup(canonical_key(plan), self.version, lambda: self._run_plan(plan))
+        return list(result)
+
+    def _run_plan(self, plan: Optional[Node]) -> List[str]:
+        """Выполняет план и возвращает отсортированный список документов"""
+        result = self.planner.execute(plan)
+        doc_table = self.doc_table
+        return sorted(doc_table[number] for number in self._live(materialize(result, self.n_docs)).tolist())
+
+
+def build_index(index: InvertedIndex, lemmas_directory: str) -> None:
+    """Строит индекс из файла счетчиков задания 2, а если его нет - из текстовых файлов лемм"""
+    if os.path.exists(COUNTS_PATH):
+        index.create_from_counts(COUNTS_PATH)
+    else:
+        index.create_from_directory(lemmas_directory)
 
 
 def main():
-    # Путь к директории из задания 2
+    # Путь к директории из задания 2 (текстовые файлы читаются, только если нет файла счетчиков)
     lemmas_directory = 'lab2results/lemmas'
     
-    # Путь к файлу для сохранения индекса
-    index_file = 'inverted_index.txt'
+    # Путь к бинарному сегменту индекса и к его текстовой выгрузке
+    index_file = 'inverted_index.bin'
+    text_index_file = 'inverted_index.txt'
     
-    index = InvertedIndex()
+    index = InvertedIndex(spelling_budget_ms=DEFAULT_BUDGET_MS)
     
     # Проверяем, существует ли уже индекс
     if os.path.exists(index_file):
         choice = input(f"Файл индекса {index_file} уже существует. Загрузить его? (y/n): ")
         if choice.lower() == 'y':
-            index.load_index(index_file)
+            index.load_segment(index_file)
+            # Применяем изменения страниц, обработанные lab2.py --incremental
+            if os.path.exists(COUNTS_PATH):
+                updated = index.update_from_counts(COUNTS_PATH)
+            else:
+                updated = index.update_from_directory(lemmas_directory)
+            if updated:
+                index.save_segment(index_file)
+                index.save_index(text_index_file)
         else:
             print("Создание нового индекса...")
-            index.create_from_directory(lemmas_directory)
-            index.save_index(index_file)
+            build_index(index, lemmas_directory)
+            index.save_segment(index_file)
+            index.save_index(text_index_file)
     else:
         print("Создание нового индекса...")
-        index.create_from_directory(lemmas_directory)
-        index.save_index(index_file)
+        build_index(index, lemmas_directory)
+        index.save_segment(index_file)
+        index.save_index(text_index_file)
     
     # Интерактивный поиск
     print("\nНачинаем поиск...")
-    print("Поддерживаемые операторы: AND, OR, NOT, скобки () для группировки.")
+    print("Поддерживаемые операторы: AND, OR, NOT, скобки () для группировки,")
+    print("фразы в кавычках, NEAR/k (слова на расстоянии не больше k)")
+    print("и маски: * - любые символы, ? - один символ (сопоставляются с леммами).")
     print("Пример запроса: (слово1 AND слово2) OR NOT слово3")
+    print('Пример фразового запроса: "машинное обучение" OR алгоритм NEAR/3 поиска')
+    print("Пример запроса с маской: програм* AND NOT *граф?я")
+    print("Слова с опечатками заменяются ближайшими по написанию леммами индекса (видно в explain).")
+    print("Для просмотра плана запроса начните его с 'explain '.")
+    print("Для статистики кэша результатов введите 'cache'.")
     print("Для выхода введите 'exit'.")
     
     while True:
@@ -274,7 +524,19 @@ def main():
         if query.lower() == 'exit':
             break
         
-        results = index.search(query)
+        if query.lower() == 'cache':
+            for name, value in index.cache.stats().items():
+                print(f"{name}: {value}")
+            continue
+
+        try:
+            if query.startswith('explain '):
+                index.explain(query[len('explain '):])
+                continue
+            results = index.search(query)
+        except ValueError as e:
+            print(f"Ошибка в запросе: {e}")
+            continue
         
         if results:
             print(f"Найдено документов: {len(results)}")
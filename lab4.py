@@ -1,201 +1,283 @@
 import os
-import re
-import math
-from collections import Counter, defaultdict
-import pymorphy2
+import json
+import argparse
+from collections import Counter
+from multiprocessing import Pool
+
+from manifest import diff_hashes, load_manifest, manifest_hashes
+from tfidf_model import TermCounts, TfIdfModel
+from term_counts import COUNTS_PATH, CorpusCounts
 
 TOKENS_DIR_INPUT = 'lab2results/tokens'
 LEMMAS_DIR_INPUT = 'lab2results/lemmas'
 OUTPUT_DIR = 'lab4results'
 OUTPUT_TOKENS_DIR = os.path.join(OUTPUT_DIR, 'tf-idf-tokens')
 OUTPUT_LEMMAS_DIR = os.path.join(OUTPUT_DIR, 'tf-idf-lemmas')
+# Бинарные модели TF-IDF (словарь, IDF и веса CSR), которые читает search_engine.py
+TOKENS_MODEL_PATH = os.path.join(OUTPUT_DIR, 'tfidf-tokens.npz')
+LEMMAS_MODEL_PATH = os.path.join(OUTPUT_DIR, 'tfidf-lemmas.npz')
 TOTAL_DOCS = 100
+# Состояние для инкрементального пересчета: хеши обработанных страниц и DF
+STATE_PATH = os.path.join(OUTPUT_DIR, 'state.json')
+
+def read_token_counts(doc_id, tokens_dir=TOKENS_DIR_INPUT):
+    """Число вхождений каждого токена документа; None, если файл не прочитан"""
+    token_file_path = os.path.join(tokens_dir, f"{doc_id}.txt")
+    try:
+        with open(token_file_path, 'r', encoding='utf-8') as f:
+            tokens = f.read().splitlines()
+    except FileNotFoundError:
+        print(f"Предупреждение: Файл токенов {token_file_path} не найден. Пропуск.")
+        return None
+    except Exception as e:
+        print(f"Ошибка чтения файла токенов {token_file_path}: {e}. Пропуск.")
+        return None
+    if not tokens:
+        print(f"Предупреждение: Файл токенов {token_file_path} пуст.")
+    return Counter(tokens)
 
-def calculate_global_df(doc_ids):
-    """Рассчитывает Document Frequency (DF) для токенов и лемм по всем документам"""
-    token_df_counts = defaultdict(int)
-    lemma_df_counts = defaultdict(int)
-    actual_doc_count = 0
+def read_lemma_counts(doc_id, lemmas_dir=LEMMAS_DIR_INPUT):
+    """Число словоформ каждой леммы документа; None, если файл не прочитан"""
+    lemma_file_path = os.path.join(lemmas_dir, f"{doc_id}.txt")
+    lemma_counts = Counter()
+    try:
+        with open(lemma_file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.strip().split()
+                if parts:
+                    # Количество токенов для этой леммы = count
+                    lemma_counts[parts[0]] += len(parts) - 1
+    except FileNotFoundError:
+        print(f"Предупреждение: Файл лемм {lemma_file_path} не найден. Пропуск.")
+        return None
+    except Exception as e:
+        print(f"Ошибка чтения файла лемм {lemma_file_path}: {e}. Пропуск.")
+        return None
+    return lemma_counts
 
+def count_shard(task):
+    """Шаг map: счетчики токенов и лемм для части документов (выполняется в процессе пула)"""
+    doc_ids, tokens_dir, lemmas_dir = task
+    token_counts, lemma_counts = TermCounts(), TermCounts()
+    read_docs = 0
     for doc_id in doc_ids:
-        token_file_path = os.path.join(TOKENS_DIR_INPUT, f"{doc_id}.txt")
-        lemma_file_path = os.path.join(LEMMAS_DIR_INPUT, f"{doc_id}.txt")
+        tokens = read_token_counts(doc_id, tokens_dir)
+        lemmas = read_lemma_counts(doc_id, lemmas_dir)
+        # Документ учитывается, если прочитан хотя бы один из его файлов
+        if tokens is None and lemmas is None:
+            continue
+        token_counts.add_document(doc_id, tokens or {})
+        lemma_counts.add_document(doc_id, lemmas or {})
+        read_docs += 1
+    return token_counts, lemma_counts, read_docs
 
-        doc_processed = False
-        # Обработка токенов для DF
-        try:
-            with open(token_file_path, 'r', encoding='utf-8') as f:
-                tokens = f.read().splitlines()
-            unique_tokens_in_doc = set(tokens)
-            for token in unique_tokens_in_doc:
-                token_df_counts[token] += 1
-            doc_processed = True # Хотя бы один файл обработан
-        except FileNotFoundError:
-            print(f"Предупреждение: Файл токенов {token_file_path} не найден. Пропуск для DF.")
-        except Exception as e:
-            print(f"Ошибка чтения файла токенов {token_file_path}: {e}. Пропуск для DF.")
+def collect_sharded(doc_ids, workers, tokens_dir=TOKENS_DIR_INPUT, lemmas_dir=LEMMAS_DIR_INPUT):
+    """Параллельный подсчет: документы делятся на непрерывные части по процессам,
+    а частичные счетчики сливаются по порядку частей (шаг reduce).
 
-        # Обработка лемм для DF
-        try:
-            unique_lemmas_in_doc = set()
-            with open(lemma_file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if parts:
-                        unique_lemmas_in_doc.add(parts[0])
-            for lemma in unique_lemmas_in_doc:
-                lemma_df_counts[lemma] += 1
-            doc_processed = True # Хотя бы один файл обработан
-        except FileNotFoundError:
-            print(f"Предупреждение: Файл лемм {lemma_file_path} не найден. Пропуск для DF.")
-        except Exception as e:
-            print(f"Ошибка чтения файла лемм {lemma_file_path}: {e}. Пропуск для DF.")
+    Порядок документов и, значит, итоговые модели совпадают с последовательным подсчетом.
+    """
+    # Частей больше, чем процессов, чтобы медленные части не задерживали остальные
+    shard_size = max(1, -(-len(doc_ids) // (workers * 4)))
+    tasks = [(doc_ids[start:start + shard_size], tokens_dir, lemmas_dir)
+             for start in range(0, len(doc_ids), shard_size)]
 
-        if doc_processed:
-            actual_doc_count += 1
+    token_counts, lemma_counts = TermCounts(), TermCounts()
+    read_docs = 0
+    with Pool(processes=workers) as pool:
+        for shard_tokens, shard_lemmas, shard_read in pool.imap(count_shard, tasks):
+            token_counts.extend(shard_tokens)
+            lemma_counts.extend(shard_lemmas)
+            read_docs += shard_read
+    return token_counts, lemma_counts, read_docs
 
-    print(f"Расчет DF завершен. Обработано документов: {actual_doc_count}. Найдено уникальных токенов: {len(token_df_counts)}, уникальных лемм: {len(lemma_df_counts)}.")
-    return token_df_counts, lemma_df_counts, actual_doc_count
+def collect_term_counts(doc_ids, previous=None, changed=(), workers=1, corpus=None):
+    """Один проход по документам: счетчики токенов и лемм в компактных массивах.
 
-def calculate_idf_from_df(df_counts, total_docs):
-    """Рассчитывает IDF на основе DF"""
-    if total_docs == 0:
-        return {}
-    idfs = {term: math.log(total_docs / df) for term, df in df_counts.items() if df > 0}
-    return idfs
+    corpus - бинарные счетчики из lab2.py (CorpusCounts): с ними текстовые файлы не читаются,
+    а число вхождений - настоящее. Без них previous - пара прежних моделей (токены, леммы):
+    неизмененные документы берутся из них, а файлы читаются только для документов из changed
+    и отсутствующих в моделях. При workers > 1 полный подсчет текстовых файлов распределяется
+    по процессам; счетчики из corpus читаются одним процессом.
+    """
+    if corpus is not None:
+        if workers > 1:
+            print(f"--workers не используется: счетчики читаются из {corpus.file_path} без разбора текстовых файлов.")
+        token_counts, lemma_counts = corpus.term_counts(), corpus.term_counts(lemmas=True)
+        print(f"Прочитано документов: {corpus.n_docs} из {corpus.file_path}, уникальных токенов: "
+              f"{len(token_counts.vocabulary)}, уникальных лемм: {len(lemma_counts.vocabulary)}.")
+        return token_counts, lemma_counts
 
-def process_documents_tf_idf(doc_ids, token_idfs, lemma_idfs):
-    """Обрабатывает каждый документ для расчета TF и TF-IDF, читая файлы токенов/лемм"""
-    os.makedirs(OUTPUT_TOKENS_DIR, exist_ok=True)
-    os.makedirs(OUTPUT_LEMMAS_DIR, exist_ok=True)
+    if previous is None:
+        if workers > 1:
+            token_counts, lemma_counts, read_docs = collect_sharded(doc_ids, workers)
+        else:
+            token_counts, lemma_counts, read_docs = count_shard((doc_ids, TOKENS_DIR_INPUT, LEMMAS_DIR_INPUT))
+        print(f"Прочитано документов: {read_docs}, уникальных токенов: {len(token_counts.vocabulary)}, "
+              f"уникальных лемм: {len(lemma_counts.vocabulary)}.")
+        return token_counts, lemma_counts
 
-    processed_count = 0
-    for doc_id in doc_ids:
-        token_file_path = os.path.join(TOKENS_DIR_INPUT, f"{doc_id}.txt")
-        lemma_file_path = os.path.join(LEMMAS_DIR_INPUT, f"{doc_id}.txt")
-        token_output_path = os.path.join(OUTPUT_TOKENS_DIR, f"{doc_id}.txt")
-        lemma_output_path = os.path.join(OUTPUT_LEMMAS_DIR, f"{doc_id}.txt")
+    token_counts, lemma_counts = TermCounts(), TermCounts()
+    changed = set(changed)
+    previous_rows = {doc_id: row for row, doc_id in enumerate(previous[0].doc_ids)}
 
-        # Обработка токенов      
-        try:
-            with open(token_file_path, 'r', encoding='utf-8') as f:
-                all_doc_tokens = f.read().splitlines()
-            
-            total_tokens_in_doc = len(all_doc_tokens)
-            token_tf_idf_results = []
-
-            if total_tokens_in_doc > 0:
-                token_counts = Counter(all_doc_tokens)
-                for token, count in token_counts.items():
-                    tf = count / total_tokens_in_doc
-                    idf = token_idfs.get(token, 0) # Используем посчитанный IDF
-                    tf_idf = tf * idf
-                    token_tf_idf_results.append((token, idf, tf_idf))
-            else:
-                print(f"Предупреждение: Файл токенов {token_file_path} пуст.")
-
-            token_tf_idf_results.sort()
-            with open(token_output_path, 'w', encoding='utf-8') as f:
-                for token, idf, tf_idf in token_tf_idf_results:
-                    f.write(f"{token} {idf:.6f} {tf_idf:.6f}\n")
-        
-        except FileNotFoundError:
-            print(f"Ошибка: Файл токенов {token_file_path} не найден при расчете TF-IDF. Пропуск.")
-            open(token_output_path, 'w').close()
-            open(lemma_output_path, 'w').close() 
-            continue 
-        except Exception as e:
-            print(f"Ошибка обработки токенов для TF-IDF в файле {token_file_path}: {e}. Пропуск.")
-            open(token_output_path, 'w').close()
-            open(lemma_output_path, 'w').close()
+    read_docs = 0
+    for doc_id in doc_ids:
+        row = previous_rows.get(doc_id)
+        if row is not None and doc_id not in changed:
+            token_counts.add_document(doc_id, previous[0].row_counts(row))
+            lemma_counts.add_document(doc_id, previous[1].row_counts(row))
             continue
-        
-        # Обработка лемм    
-        try:
-            lemma_counts = Counter()
-            total_lemma_occurrences = 0
-            
-            with open(lemma_file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if parts:
-                        lemma = parts[0]
-                        # Количество токенов для этой леммы = count
-                        count = len(parts) - 1 
-                        lemma_counts[lemma] += count
-                        total_lemma_occurrences += count
-            
-            lemma_tf_idf_results = []
-            if total_lemma_occurrences > 0:
-                for lemma, count in lemma_counts.items():
-                    tf = count / total_lemma_occurrences
-                    idf = lemma_idfs.get(lemma, 0)
-                    tf_idf = tf * idf
-                    lemma_tf_idf_results.append((lemma, idf, tf_idf))
-            else:
-                 print(f"Предупреждение: Файл лемм {lemma_file_path} не содержит данных для расчета TF.")
-            
-            # Сортировка и запись
-            lemma_tf_idf_results.sort()
-            with open(lemma_output_path, 'w', encoding='utf-8') as f:
-                for lemma, idf, tf_idf in lemma_tf_idf_results:
-                    f.write(f"{lemma} {idf:.6f} {tf_idf:.6f}\n")
 
-        except FileNotFoundError:
-            print(f"Ошибка: Файл лемм {lemma_file_path} не найден при расчете TF-IDF. Пропуск.")
-            open(lemma_output_path, 'w').close()
-        except Exception as e:
-            print(f"Ошибка обработки лемм для TF-IDF в файле {lemma_file_path}: {e}. Пропуск.")
-            open(lemma_output_path, 'w').close()
-            
-        processed_count += 1
+        shard_tokens, shard_lemmas, shard_read = count_shard(([doc_id], TOKENS_DIR_INPUT, LEMMAS_DIR_INPUT))
+        token_counts.extend(shard_tokens)
+        lemma_counts.extend(shard_lemmas)
+        read_docs += shard_read
 
-    print(f"Результаты сохранены в директориях: {OUTPUT_TOKENS_DIR} и {OUTPUT_LEMMAS_DIR}")
+    print(f"Прочитано документов: {read_docs}. В модели документов: {len(token_counts.doc_ids)}, "
+          f"уникальных токенов: {len(token_counts.vocabulary)}, уникальных лемм: {len(lemma_counts.vocabulary)}.")
+    return token_counts, lemma_counts
 
-def main():    
-    # Получаем список ID документов
-    try:
-        filenames = os.listdir(TOKENS_DIR_INPUT)
-        doc_ids_str = []
-        for f in filenames:
-            if f.endswith('.txt'):
-                doc_id_part = os.path.splitext(f)[0]
-                if doc_id_part.isdigit():
-                    doc_ids_str.append(doc_id_part)
-
-        doc_ids = sorted(doc_ids_str, key=int)
-        
-        if len(doc_ids) != TOTAL_DOCS:
-             print(f"Предупреждение: Найдено {len(doc_ids)} файлов вида N.txt, ожидалось {TOTAL_DOCS}.")
+def changed_documents(old_model, new_model):
+    """Документы новой модели, веса которых могли измениться из-за изменения IDF"""
+    if old_model.n_docs != new_model.n_docs:
+        return list(new_model.doc_ids)
+    old_df = dict(zip(old_model.terms, old_model.df.tolist()))
+    changed_terms = [term_id for term_id, (term, df) in enumerate(zip(new_model.terms, new_model.df.tolist()))
+                     if old_df.get(term) != df]
+    rows = new_model.rows_with_terms(changed_terms)
+    return [new_model.doc_ids[row] for row in rows.tolist()]
+
+def load_state():
+    """Загружает состояние прошлого запуска; None, если его нет"""
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(doc_hashes):
+    """Сохраняет хеши обработанных страниц для следующего инкрементального запуска"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    tmp_path = STATE_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'doc_hashes': doc_hashes}, f, ensure_ascii=False)
+    os.replace(tmp_path, STATE_PATH)
+
+def process_incremental(doc_ids, state, doc_hashes, export_text, corpus=None):
+    """Пересобирает модели, читая файлы только новых и измененных документов.
+
+    Счетчики неизмененных документов берутся из прежних моделей, после чего DF, IDF
+    и веса пересчитываются целиком. Текстовые файлы переписываются только для документов,
+    веса которых могли измениться: новых, измененных и содержащих термин с изменившимся DF
+    (если изменилось число документов, меняется IDF всех терминов).
+    """
+    added, modified, removed = diff_hashes(doc_hashes, state['doc_hashes'])
+    previous = (TfIdfModel.load(TOKENS_MODEL_PATH), TfIdfModel.load(LEMMAS_MODEL_PATH))
+    print(f"Изменения: добавлено {len(added)}, изменено {len(modified)}, удалено {len(removed)} документов.")
+
+    token_counts, lemma_counts = collect_term_counts(doc_ids, previous, added + modified, corpus=corpus)
+    token_model = TfIdfModel.from_counts(token_counts)
+    lemma_model = TfIdfModel.from_counts(lemma_counts)
+    token_model.save(TOKENS_MODEL_PATH)
+    lemma_model.save(LEMMAS_MODEL_PATH)
+    print(f"Модели сохранены: {TOKENS_MODEL_PATH}, {LEMMAS_MODEL_PATH}")
+
+    if export_text:
+        for old_model, model, output_dir in ((previous[0], token_model, OUTPUT_TOKENS_DIR),
+                                              (previous[1], lemma_model, OUTPUT_LEMMAS_DIR)):
+            rewrite = set(added + modified) | set(changed_documents(old_model, model))
+            model.export_text(output_dir, rewrite)
+            for doc_id in removed:
+                file_path = os.path.join(output_dir, f"{doc_id}.txt")
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            print(f"В {output_dir} перезаписано {len(rewrite)} из {model.n_docs} файлов")
+    save_state(doc_hashes)
+
+def main():
+    parser = argparse.ArgumentParser(description='Расчет TF-IDF для токенов и лемм')
+    parser.add_argument('--incremental', action='store_true',
+                        help='перечитать только новые и измененные документы (по манифесту lab2.py)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='число процессов для подсчета терминов по текстовым файлам при полном пересчете '
+                             f'(не действует, если есть {COUNTS_PATH})')
+    parser.add_argument('--export-text', action='store_true',
+                        help=f'выгрузить также текстовые файлы N.txt в {OUTPUT_TOKENS_DIR} и {OUTPUT_LEMMAS_DIR}')
+    args = parser.parse_args()
+
+    # Счетчики из lab2.py читаются из бинарного файла; текстовые файлы - только если его нет
+    corpus = CorpusCounts(COUNTS_PATH) if os.path.exists(COUNTS_PATH) else None
+    if corpus is not None:
+        doc_ids = corpus.doc_ids
         actual_total_docs = len(doc_ids)
+        if actual_total_docs != TOTAL_DOCS:
+            print(f"Предупреждение: В {COUNTS_PATH} {actual_total_docs} документов, ожидалось {TOTAL_DOCS}.")
+    else:
+        # Получаем список ID документов
+        try:
+            filenames = os.listdir(TOKENS_DIR_INPUT)
+            doc_ids_str = []
+            for f in filenames:
+                if f.endswith('.txt'):
+                    doc_id_part = os.path.splitext(f)[0]
+                    if doc_id_part.isdigit():
+                        doc_ids_str.append(doc_id_part)
 
-    except FileNotFoundError:
-        print(f"Ошибка: Директория {TOKENS_DIR_INPUT} не найдена. Невозможно получить список документов.")
-        return
-    except Exception as e:
-        print(f"Ошибка при чтении директории {TOKENS_DIR_INPUT}: {e}")
-        return
+            doc_ids = sorted(doc_ids_str, key=int)
+        
+            if len(doc_ids) != TOTAL_DOCS:
+                 print(f"Предупреждение: Найдено {len(doc_ids)} файлов вида N.txt, ожидалось {TOTAL_DOCS}.")
+            actual_total_docs = len(doc_ids)
 
-    if not doc_ids:
-        print(f"Ошибка: В директории {TOKENS_DIR_INPUT} не найдено файлов вида N.txt. Убедитесь, что Задание 2 выполнено корректно.")
-        return
+        except FileNotFoundError:
+            print(f"Ошибка: Директория {TOKENS_DIR_INPUT} не найдена. Невозможно получить список документов.")
+            return
+        except Exception as e:
+            print(f"Ошибка при чтении директории {TOKENS_DIR_INPUT}: {e}")
+            return
+
+        if not doc_ids:
+            print(f"Ошибка: В директории {TOKENS_DIR_INPUT} не найдено файлов вида N.txt. Убедитесь, что Задание 2 выполнено корректно.")
+            return
 
     print(f"Найдено {actual_total_docs} документов для обработки.")
 
-    # Рассчитываем DF  
-    token_df_counts, lemma_df_counts, processed_docs_for_df = calculate_global_df(doc_ids)
+    doc_hashes = None
+    if args.incremental:
+        manifest = manifest_hashes(load_manifest())
+        doc_hashes = {doc_id: manifest[doc_id] for doc_id in doc_ids if doc_id in manifest}
+        if len(doc_hashes) != len(doc_ids):
+            print("Предупреждение: манифест lab2.py не покрывает все документы, выполняется полный пересчет.")
+            doc_hashes = None
+        else:
+            state = load_state()
+            if state is not None and os.path.exists(TOKENS_MODEL_PATH) and os.path.exists(LEMMAS_MODEL_PATH):
+                process_incremental(doc_ids, state, doc_hashes, args.export_text, corpus)
+                return
 
-    if processed_docs_for_df == 0:
+    # Один проход по файлам: счетчики терминов и DF
+    token_counts, lemma_counts = collect_term_counts(doc_ids, workers=args.workers, corpus=corpus)
+
+    if not token_counts.doc_ids:
         print("Ошибка: Не удалось обработать ни одного документа для расчета DF. Завершение работы.")
         return
     
-    # Рассчитываем IDF
-    token_idfs = calculate_idf_from_df(token_df_counts, processed_docs_for_df) 
-    lemma_idfs = calculate_idf_from_df(lemma_df_counts, processed_docs_for_df)
-    print(f"Рассчитан IDF для {len(token_idfs)} токенов и {len(lemma_idfs)} лемм.")
+    # Рассчитываем IDF и TF-IDF для всех документов
+    token_model = TfIdfModel.from_counts(token_counts)
+    lemma_model = TfIdfModel.from_counts(lemma_counts)
+    print(f"Рассчитан IDF для {len(token_model.terms)} токенов и {len(lemma_model.terms)} лемм.")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    token_model.save(TOKENS_MODEL_PATH)
+    lemma_model.save(LEMMAS_MODEL_PATH)
+    print(f"Модели сохранены: {TOKENS_MODEL_PATH}, {LEMMAS_MODEL_PATH}")
 
-    # Рассчитываем TF-IDF для каждого документа 
-    process_documents_tf_idf(doc_ids, token_idfs, lemma_idfs)
+    if args.export_text:
+        token_model.export_text(OUTPUT_TOKENS_DIR)
+        lemma_model.export_text(OUTPUT_LEMMAS_DIR)
+        print(f"Результаты сохранены в директориях: {OUTPUT_TOKENS_DIR} и {OUTPUT_LEMMAS_DIR}")
+    if doc_hashes is not None:
+        save_state(doc_hashes)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import atexit
+import argparse
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pymorphy2
+
+# Путь к постоянному кэшу лемм по умолчанию берется из переменной окружения,
+# чтобы его видели и процессы пула, и поисковые системы
+CACHE_PATH_ENV = 'LEMMA_CACHE'
+DEFAULT_MAX_SIZE = 100_000
+FLUSH_EVERY = 1000
+
+
+class Lemmatizer:
+    """Лемматизация через pymorphy2 с ограниченным LRU-кэшем и необязательным кэшем на диске"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, cache_path: Optional[str] = None):
+        self.max_size = max_size
+        self.cache_path = cache_path
+        self._cache: 'OrderedDict[str, Optional[str]]' = OrderedDict()
+        self._morph = None
+        self._db = None
+        self._pending: Dict[str, str] = {}  # Новые леммы, еще не записанные на диск
+
+        self.hits = 0        # Найдено в памяти
+        self.disk_hits = 0   # Найдено в кэше на диске
+        self.misses = 0      # Потребовался разбор pymorphy2
+
+        if cache_path:
+            self._db = sqlite3.connect(cache_path, timeout=30)
+            self._db.execute('CREATE TABLE IF NOT EXISTS lemmas (word TEXT PRIMARY KEY, lemma TEXT NOT NULL)')
+            self._db.commit()
+            atexit.register(self.flush)
+
+    @property
+    def morph(self) -> pymorphy2.MorphAnalyzer:
+        """Анализатор pymorphy2; словари загружаются только при первом промахе кэша"""
+        if self._morph is None:
+            self._morph = pymorphy2.MorphAnalyzer()
+        return self._morph
+
+    def lemmatize(self, word: str) -> Optional[str]:
+        """Возвращает нормальную форму слова или None, если pymorphy2 не дал разборов"""
+        cache = self._cache
+        if word in cache:
+            cache.move_to_end(word)
+            self.hits += 1
+            return cache[word]
+
+        lemma = self._load(word)
+        if lemma is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            parsed = self.morph.parse(word)
+            lemma = parsed[0].normal_form if parsed else None
+            if lemma is not None:
+                self._store(word, lemma)
+
+        self._remember(word, lemma)
+        return lemma
+
+    def _remember(self, word: str, lemma: Optional[str]) -> None:
+        """Кладет результат в LRU-кэш, вытесняя давно не использованные слова"""
+        self._cache[word] = lemma
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, word: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        if word in self._pending:
+            return self._pending[word]
+        row = self._db.execute('SELECT lemma FROM lemmas WHERE word = ?', (word,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, word: str, lemma: str) -> None:
+        if self._db is None:
+            return
+        self._pending[word] = lemma
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записывает накопленные леммы в кэш на диске"""
+        if self._db is None or not self._pending:
+            return
+        self._db.executemany('INSERT OR REPLACE INTO lemmas (word, lemma) VALUES (?, ?)', self._pending.items())
+        self._db.commit()
+        self._pending.clear()
+
+    def warm_from_directory(self, lemmas_directory: str) -> int:
+        """Заполняет кэш по файлам лемм из задания 2 (строки вида <лемма> <токен1> ... <токенN>)"""
+        count = 0
+        for filename in sorted(os.listdir(lemmas_directory)):
+            if not filename.endswith('.txt'):
+                continue
+            with open(os.path.join(lemmas_directory, filename), 'r', encoding='utf-8') as file:
+                for line in file:
+                    parts = line.split()
+                    for token in parts[1:]:
+                        if self._db is not None:
+                            self._store(token, parts[0])
+                        else:
+                            self._remember(token, parts[0])
+                        count += 1
+        self.flush()
+        return count
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики попаданий и промахов кэша"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+_shared_lemmatizer: Optional[Lemmatizer] = None
+
+
+def get_lemmatizer() -> Lemmatizer:
+    """Общий для всех компонентов процесса экземпляр лемматизатора"""
+    global _shared_lemmatizer
+    if _shared_lemmatizer is None:
+        _shared_lemmatizer = Lemmatizer(cache_path=os.environ.get(CACHE_PATH_ENV) or None)
+    return _shared_lemmatizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Подготовка кэша лемм на диске')
+    parser.add_argument('--cache', required=True, help='путь к файлу кэша (sqlite)')
+    parser.add_argument('--warm', default='lab2results/lemmas', help='директория с файлами лемм')
+    args = parser.parse_args()
+
+    lemmatizer = Lemmatizer(cache_path=args.cache)
+    count = lemmatizer.warm_from_directory(args.warm)
+    print(f"В кэш {args.cache} добавлено {count} словоформ из {args.warm}")
+    print(f"Для использования кэша задайте переменную окружения {CACHE_PATH_ENV}={args.cache}")
+
+
+if __name__ == '__main__':
+    main()
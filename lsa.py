@@ -0,0 +1,129 @@
+import os
+import time
+import argparse
+from typing import List, Tuple
+
+import numpy as np
+
+from sparse_matrix import CSRMatrix
+from snapshot import pack_strings, unpack_strings
+from tfidf_model import TfIdfModel
+
+# Латентно-семантический анализ (LSA): усеченное SVD нормированной матрицы TF-IDF
+# документ-термин A ~ U_k S_k V_k^T. Документ представлен вектором A V_k = U_k S_k
+# размерности k, запрос - вектором q V_k; сходство - косинус в k-мерном пространстве.
+# Файл модели (несжатый .npz):
+#   terms_blob/terms_offsets, doc_ids_blob/doc_ids_offsets - словарь и документы модели TF-IDF
+#   projection      - V_k (термины x k, float32)
+#   singular_values - S_k
+#   embeddings      - нормированные векторы документов (документы x k, float32)
+FORMAT_VERSION = 1
+LSA_MODEL_PATH = 'lab4results/lsa-lemmas.npz'
+DEFAULT_RANK = 200
+OVERSAMPLING = 10
+POWER_ITERATIONS = 2
+
+
+def normalized_rows(model: TfIdfModel) -> CSRMatrix:
+    """Матрица TF-IDF с единичной нормой строк (как векторы документов поисковой системы)"""
+    n_docs = len(model.doc_ids)
+    rows = np.repeat(np.arange(n_docs), np.diff(model.indptr))
+    norms = np.sqrt(np.bincount(rows, weights=model.weights * model.weights, minlength=n_docs))[rows]
+    values = np.divide(model.weights, norms, out=np.zeros(len(model.weights)), where=norms > 0)
+    return CSRMatrix(model.indptr, model.indices, values, len(model.terms))
+
+
+def randomized_svd(matrix: CSRMatrix, rank: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Усеченное SVD случайной проекцией со степенными итерациями (Halko, Martinsson, Tropp).
+
+    Возвращает U (строки x k), S (k) и V (столбцы x k).
+    """
+    rng = np.random.default_rng(seed)
+    size = min(rank + OVERSAMPLING, matrix.n_rows, matrix.n_cols)
+    # Базис пространства столбцов A по ее произведению на случайную матрицу
+    basis, _ = np.linalg.qr(matrix.dot_dense(rng.standard_normal((matrix.n_cols, size))))
+    for _ in range(POWER_ITERATIONS):
+        # Степенные итерации (A A^T)^q усиливают старшие сингулярные числа
+        right, _ = np.linalg.qr(matrix.transpose_dot_dense(basis))
+        basis, _ = np.linalg.qr(matrix.dot_dense(right))
+
+    # SVD малой матрицы B = Q^T A (size x столбцы)
+    small_u, singular_values, vt = np.linalg.svd(matrix.transpose_dot_dense(basis).T, full_matrices=False)
+    rank = min(rank, size)
+    return basis @ small_u[:, :rank], singular_values[:rank], vt[:rank].T
+
+
+class LsaModel:
+    """Векторы документов и проекция терминов в пространство LSA"""
+
+    def __init__(self, terms: List[str], doc_ids: List[str], projection: np.ndarray,
+                 singular_values: np.ndarray, embeddings: np.ndarray):
+        self.terms = terms
+        self.doc_ids = doc_ids
+        self.projection = projection
+        self.singular_values = singular_values
+        self.embeddings = embeddings
+
+    @property
+    def rank(self) -> int:
+        return self.projection.shape[1]
+
+    @classmethod
+    def fit(cls, model: TfIdfModel, rank: int = DEFAULT_RANK, seed: int = 0) -> 'LsaModel':
+        """Строит LSA по модели TF-IDF"""
+        u, singular_values, v = randomized_svd(normalized_rows(model), rank, seed)
+        embeddings = (u * singular_values).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        return cls(model.terms, model.doc_ids, v.astype(np.float32), singular_values, embeddings)
+
+    def project_query(self, term_ids: List[int], weights: List[float]) -> np.ndarray:
+        """Нормированный вектор запроса в пространстве LSA"""
+        vector = np.asarray(weights, dtype=np.float32) @ self.projection[term_ids] if term_ids \
+            else np.zeros(self.rank, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def save(self, file_path: str) -> None:
+        """Сохраняет модель в бинарный файл (атомарной заменой)"""
+        terms_blob, terms_offsets = pack_strings(self.terms)
+        doc_ids_blob, doc_ids_offsets = pack_strings(self.doc_ids)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, format_version=np.array(FORMAT_VERSION),
+                     terms_blob=terms_blob, terms_offsets=terms_offsets,
+                     doc_ids_blob=doc_ids_blob, doc_ids_offsets=doc_ids_offsets,
+                     projection=self.projection, singular_values=self.singular_values,
+                     embeddings=self.embeddings)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'LsaModel':
+        """Загружает модель из бинарного файла"""
+        with np.load(file_path, allow_pickle=False) as data:
+            version = int(data['format_version'])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{file_path}: неподдерживаемая версия формата {version}")
+            return cls(unpack_strings(data['terms_blob'], data['terms_offsets']),
+                       unpack_strings(data['doc_ids_blob'], data['doc_ids_offsets']),
+                       data['projection'], data['singular_values'], data['embeddings'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Построение LSA (усеченное SVD) по бинарной модели TF-IDF')
+    parser.add_argument('--model', default='lab4results/tfidf-lemmas.npz', help='модель TF-IDF из lab4.py')
+    parser.add_argument('--output', default=LSA_MODEL_PATH)
+    parser.add_argument('--rank', type=int, default=DEFAULT_RANK, help='размерность пространства LSA')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = TfIdfModel.load(args.model)
+    lsa = LsaModel.fit(model, args.rank)
+    lsa.save(args.output)
+    print(f"LSA ранга {lsa.rank} построен за {time.perf_counter() - start:.1f} с: документов {len(lsa.doc_ids)}, "
+          f"терминов {len(lsa.terms)}; на документ {lsa.embeddings.shape[1] * lsa.embeddings.itemsize} байт")
+    print(f"Модель сохранена в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
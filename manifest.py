@@ -0,0 +1,78 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+# Манифест страниц: для каждого документа хранится имя файла, время изменения,
+# размер и хеш содержимого. Его пишет lab2.py, а lab3.py и lab4.py сравнивают
+# хеши из манифеста с хешами документов, которые они уже обработали.
+MANIFEST_PATH = os.path.join('lab2results', 'manifest.json')
+
+
+def file_hash(file_path: str) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, dict]:
+    """Загружает манифест; если файла нет, возвращает пустой"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, dict], path: str = MANIFEST_PATH) -> None:
+    """Сохраняет манифест атомарной заменой файла"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def scan_pages(input_dir: str, previous: Dict[str, dict]) -> Dict[str, dict]:
+    """Строит манифест директории со страницами.
+
+    Хеш пересчитывается, только если у файла изменились время изменения или размер.
+    """
+    manifest = {}
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.endswith('.html'):
+            continue
+        document_id = os.path.splitext(filename)[0]
+        file_path = os.path.join(input_dir, filename)
+        stat = os.stat(file_path)
+
+        entry = previous.get(document_id)
+        if entry and entry['file'] == filename and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            manifest[document_id] = entry
+            continue
+        manifest[document_id] = {
+            'file': filename,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'sha256': file_hash(file_path),
+        }
+    return manifest
+
+
+def manifest_hashes(manifest: Dict[str, dict]) -> Dict[str, str]:
+    """Хеши содержимого документов манифеста"""
+    return {document_id: entry['sha256'] for document_id, entry in manifest.items()}
+
+
+def diff_hashes(current: Dict[str, str], processed: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    """Сравнивает текущие хеши с обработанными: новые, измененные и удаленные документы"""
+    added = sorted((doc for doc in current if doc not in processed), key=document_sort_key)
+    modified = sorted((doc for doc in current if doc in processed and current[doc] != processed[doc]), key=document_sort_key)
+    removed = sorted((doc for doc in processed if doc not in current), key=document_sort_key)
+    return added, modified, removed
+
+
+def document_sort_key(document_id: str):
+    """Ключ сортировки идентификаторов: числовые - по значению, остальные - как строки"""
+    return (0, int(document_id), '') if document_id.isdigit() else (1, 0, document_id)
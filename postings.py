@@ -0,0 +1,310 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Sequence, Union
+
+import numpy as np
+
+# Хранение списков документов булева индекса. Документы пронумерованы подряд с нуля.
+# Для каждого термина выбирается более компактное представление: отсортированный
+# массив номеров (4 байта на документ) или битовая карта (1 бит на каждый документ коллекции).
+# Промежуточные результаты запроса - отсортированные массивы numpy, битовые карты
+# (Bitmap) и отложенные отрицания (Complement), которые не раскрываются без необходимости.
+
+
+class ArrayPostings:
+    """Отсортированный массив номеров документов"""
+
+    __slots__ = ('docs',)
+
+    def __init__(self, docs: Iterable[int] = ()):
+        self.docs = array('I', docs)
+
+    def add(self, number: int) -> None:
+        """Добавляет номер документа, сохраняя порядок"""
+        docs = self.docs
+        if not docs or docs[-1] < number:
+            docs.append(number)
+            return
+        position = bisect_left(docs, number)
+        if docs[position] != number:
+            docs.insert(position, number)
+
+    def discard(self, number: int) -> None:
+        """Удаляет номер документа, если он есть"""
+        position = bisect_left(self.docs, number)
+        if position < len(self.docs) and self.docs[position] == number:
+            del self.docs[position]
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def value(self, n_docs: int) -> np.ndarray:
+        """Представление для вычисления запроса"""
+        if not self.docs:
+            return np.zeros(0, dtype=np.uint32)
+        return np.frombuffer(self.docs, dtype=np.uint32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.docs.itemsize * len(self.docs)
+
+
+class BitmapPostings:
+    """Битовая карта документов: бит i установлен, если документ i содержит термин"""
+
+    __slots__ = ('bits', 'count')
+
+    def __init__(self, docs: Iterable[int] = (), n_docs: int = 0):
+        self.bits = bytearray((n_docs + 7) // 8)
+        self.count = 0
+        for number in docs:
+            self.add(number)
+
+    def add(self, number: int) -> None:
+        byte, bit = number >> 3, 1 << (number & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if not self.bits[byte] & bit:
+            self.bits[byte] |= bit
+            self.count += 1
+
+    def discard(self, number: int) -> None:
+        byte, bit = number >> 3, 1 << (number & 7)
+        if byte < len(self.bits) and self.bits[byte] & bit:
+            self.bits[byte] &= ~bit & 0xFF
+            self.count -= 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self):
+        return iter(bitmap_to_array(np.frombuffer(self.bits, dtype=np.uint8)).tolist())
+
+    def value(self, n_docs: int) -> 'Bitmap':
+        return Bitmap(_pad_bits(np.frombuffer(self.bits, dtype=np.uint8), n_docs))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+Postings = Union[ArrayPostings, BitmapPostings]
+
+
+def make_postings(numbers: Sequence[int], n_docs: int) -> Postings:
+    """Создает список документов в более компактном из двух представлений"""
+    if len(numbers) * 4 > (n_docs + 7) // 8:
+        return BitmapPostings(numbers, n_docs)
+    return ArrayPostings(numbers)
+
+
+def compact(postings: Postings, n_docs: int) -> Postings:
+    """Переводит список в более компактное представление, если оно изменилось"""
+    prefer_bitmap = len(postings) * 4 > (n_docs + 7) // 8
+    if prefer_bitmap == isinstance(postings, BitmapPostings):
+        return postings
+    return make_postings(list(postings), n_docs)
+
+
+class Bitmap:
+    """Битовая карта как промежуточный результат запроса"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, bits: np.ndarray):
+        self.bits = bits
+
+
+class Complement:
+    """Отложенное отрицание: все документы, кроме входящих в inner"""
+
+    __slots__ = ('inner',)
+
+    def __init__(self, inner):
+        self.inner = inner
+
+
+def _pad_bits(bits: np.ndarray, n_docs: int) -> np.ndarray:
+    """Дополняет битовую карту нулями до размера коллекции"""
+    size = (n_docs + 7) // 8
+    if len(bits) >= size:
+        return bits[:size]
+    padded = np.zeros(size, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    return padded
+
+
+def bitmap_to_array(bits: np.ndarray) -> np.ndarray:
+    """Номера установленных битов по возрастанию"""
+    return np.flatnonzero(np.unpackbits(bits, bitorder='little').view(bool)).astype(np.uint32)
+
+
+def array_to_bitmap(numbers: np.ndarray, n_docs: int) -> np.ndarray:
+    """Битовая карта по отсортированному массиву номеров"""
+    flags = np.zeros(((n_docs + 7) // 8) * 8, dtype=bool)
+    flags[numbers] = True
+    return np.packbits(flags, bitorder='little')
+
+
+def _test_bits(bits: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    """Для каждого номера проверяет, установлен ли его бит"""
+    return ((bits[numbers >> 3] >> (numbers & 7).astype(np.uint8)) & 1).astype(bool)
+
+
+def _contains_sorted(haystack: np.ndarray, needles: np.ndarray) -> np.ndarray:
+    """Для каждого элемента needles проверяет наличие в отсортированном haystack.
+
+    Поиск ведется только в окне haystack между первым и последним элементом needles,
+    поэтому короткий список пересекается с длинным за O(m log n).
+    """
+    if len(haystack) == 0 or len(needles) == 0:
+        return np.zeros(len(needles), dtype=bool)
+    low = np.searchsorted(haystack, needles[0])
+    high = np.searchsorted(haystack, needles[-1], side='right')
+    window = haystack[low:high]
+    if len(window) == 0:
+        return np.zeros(len(needles), dtype=bool)
+    positions = np.searchsorted(window, needles)
+    found = positions < len(window)
+    found[found] = window[positions[found]] == needles[found]
+    return found
+
+
+def cardinality(value) -> int:
+    """Число документов в промежуточном результате (для отрицания - в исключаемой части)"""
+    if isinstance(value, Complement):
+        return cardinality(value.inner)
+    if isinstance(value, Bitmap):
+        return int(np.unpackbits(value.bits).sum())
+    return len(value)
+
+
+def is_empty(value) -> bool:
+    """Проверяет, что результат пуст (отрицание считается непустым)"""
+    if isinstance(value, Complement):
+        return False
+    if isinstance(value, Bitmap):
+        return not value.bits.any()
+    return len(value) == 0
+
+
+def intersect(left, right, n_docs: int):
+    """Пересечение (AND); отрицание внутри AND вычисляется как разность"""
+    if isinstance(left, Complement) and isinstance(right, Complement):
+        return Complement(union([left.inner, right.inner], n_docs))
+    if isinstance(left, Complement):
+        return difference(right, left.inner, n_docs)
+    if isinstance(right, Complement):
+        return difference(left, right.inner, n_docs)
+
+    if isinstance(left, Bitmap) and isinstance(right, Bitmap):
+        return Bitmap(left.bits & right.bits)
+    if isinstance(left, Bitmap):
+        return right[_test_bits(left.bits, right)]
+    if isinstance(right, Bitmap):
+        return left[_test_bits(right.bits, left)]
+
+    # Ищем элементы короткого списка в длинном
+    if len(left) > len(right):
+        left, right = right, left
+    return left[_contains_sorted(right, left)]
+
+
+def difference(left, right, n_docs: int):
+    """Разность (left AND NOT right) без построения дополнения"""
+    if isinstance(right, Complement):
+        return intersect(left, right.inner, n_docs)
+    if isinstance(left, Complement):
+        return Complement(union([left.inner, right], n_docs))
+
+    if isinstance(left, Bitmap):
+        right_bits = right.bits if isinstance(right, Bitmap) else array_to_bitmap(right, n_docs)
+        return Bitmap(left.bits & ~right_bits)
+    if isinstance(right, Bitmap):
+        return left[~_test_bits(right.bits, left)]
+    return left[~_contains_sorted(right, left)]
+
+
+def union(values: List, n_docs: int):
+    """Объединение (OR) нескольких результатов за один проход"""
+    negated = [value.inner for value in values if isinstance(value, Complement)]
+    positive = [value for value in values if not isinstance(value, Complement)]
+    if negated:
+        # a OR NOT b OR NOT c = NOT ((b AND c) AND NOT a)
+        excluded = negated[0]
+        for value in negated[1:]:
+            excluded = intersect(excluded, value, n_docs)
+        for value in positive:
+            excluded = difference(excluded, value, n_docs)
+        return Complement(excluded)
+
+    if not positive:
+        return np.zeros(0, dtype=np.uint32)
+    if len(positive) == 1:
+        return positive[0]
+
+    total = sum(len(value) for value in positive if not isinstance(value, Bitmap))
+    if any(isinstance(value, Bitmap) for value in positive) or total * 4 > (n_docs + 7) // 8:
+        # Плотный результат удобнее собрать в битовой карте
+        bits = np.zeros((n_docs + 7) // 8, dtype=np.uint8)
+        for value in positive:
+            if isinstance(value, Bitmap):
+                bits |= value.bits
+            else:
+                np.bitwise_or.at(bits, value >> 3, np.left_shift(1, value & 7).astype(np.uint8))
+        return Bitmap(bits)
+
+    # Слияние k отсортированных списков с удалением повторов
+    return np.unique(np.concatenate(positive))
+
+
+def materialize(value, n_docs: int) -> np.ndarray:
+    """Превращает промежуточный результат в отсортированный массив номеров документов"""
+    if isinstance(value, Complement):
+        inner = value.inner
+        if isinstance(inner, Complement):
+            return materialize(inner.inner, n_docs)
+        inner_bits = inner.bits if isinstance(inner, Bitmap) else array_to_bitmap(inner, n_docs)
+        numbers = bitmap_to_array(~inner_bits)
+        return numbers[numbers < n_docs]
+    if isinstance(value, Bitmap):
+        return bitmap_to_array(value.bits)
+    return value
+
+
+# Позиции слов - отсортированные массивы номеров слов. Чтобы проверить сразу все документы,
+# позиция записывается ключом (номер документа << 32) | номер слова: ключи разных документов
+# не смешиваются. Проверки ниже сливают такие массивы двоичным поиском по окну, без перебора
+# всех пар позиций.
+
+
+def phrase_starts(positions: List[np.ndarray], offsets: List[int]) -> np.ndarray:
+    """Позиции начала фразы: слово i фразы стоит на позиции начало + offsets[i].
+
+    Проверка начинается с самого короткого списка, каждый следующий список
+    отсеивает оставшихся кандидатов.
+    """
+    order = sorted(range(len(positions)), key=lambda i: len(positions[i]))
+    starts = positions[order[0]] - offsets[order[0]]
+    for i in order[1:]:
+        if not len(starts):
+            break
+        starts = starts[_contains_sorted(positions[i] - offsets[i], starts)]
+    return starts
+
+
+def near_starts(left: np.ndarray, left_span: int, right: np.ndarray, right_span: int, distance: int) -> np.ndarray:
+    """Вхождения left, рядом с которыми есть вхождение right: между их краями не больше distance слов
+    (в любом порядке).
+
+    left и right - отсортированные позиции начала вхождений, span - расстояние от начала до последнего слова.
+    """
+    if not len(left) or not len(right):
+        return left[:0]
+    # Для каждого вхождения left подходящие начала right лежат в окне [низ, верх]
+    low = np.searchsorted(right, left - distance - right_span)
+    high = np.searchsorted(right, left + left_span + distance, side='right')
+    return left[low < high]
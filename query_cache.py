@@ -0,0 +1,177 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Кэш результатов поиска. Ключ - нормализованный запрос (его строят сами поисковые
+# системы), к ключу привязана версия индекса: при изменении индекса кэш очищается.
+# Вытеснение - LRU; в режиме 'tinylfu' новый ключ при заполненном кэше принимается,
+# только если по приблизительной частоте обращений он популярнее вытесняемого.
+
+CACHE_POLICIES = ('lru', 'tinylfu')
+DEFAULT_CACHE_SIZE = 10_000
+SKETCH_DEPTH = 4  # Число строк счетчиков (позиции вычисляются в _positions)
+SKETCH_MAX_COUNT = 15
+SAMPLE_FACTOR = 10
+
+
+class FrequencySketch:
+    """Приблизительные частоты ключей (count-min sketch) со старением"""
+
+    def __init__(self, width: int):
+        self.width = max(16, width)
+        self.table = [0] * (SKETCH_DEPTH * self.width)  # SKETCH_DEPTH строк счетчиков подряд
+        self.additions = 0
+        # После sample_size обращений все счетчики делятся пополам,
+        # чтобы давно популярные ключи не мешали новым
+        self.sample_size = SAMPLE_FACTOR * self.width
+
+    def _positions(self, key: Hashable) -> List[int]:
+        # Позиции в строках - двойное хеширование по двум половинам хеша ключа
+        h = hash(key)
+        h1 = h & 0xFFFFFFFF
+        h2 = ((h >> 32) & 0xFFFFFFFF) | 1
+        width = self.width
+        return [h1 % width, width + (h1 + h2) % width,
+                2 * width + (h1 + 2 * h2) % width, 3 * width + (h1 + 3 * h2) % width]
+
+    def increment(self, key: Hashable) -> None:
+        table = self.table
+        for position in self._positions(key):
+            if table[position] < SKETCH_MAX_COUNT:
+                table[position] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        table = self.table
+        return min([table[position] for position in self._positions(key)])
+
+    def _age(self) -> None:
+        self.table = [count >> 1 for count in self.table]
+        self.additions //= 2
+
+
+class QueryCache:
+    """Ограниченный кэш результатов запросов с привязкой к версии индекса"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, policy: str = 'tinylfu'):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Неизвестная политика кэша: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.version = None
+        self._entries: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._sketch = FrequencySketch(max_size) if policy == 'tinylfu' else None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0       # Вытеснено старых записей
+        self.rejections = 0      # Новых записей не принято (TinyLFU)
+        self.invalidations = 0   # Очисток из-за смены версии индекса
+        self.hit_time = 0.0      # Суммарное время ответов из кэша, с
+        self.miss_time = 0.0     # Суммарное время вычисления результатов, с
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[object]:
+        """Результат из кэша или None; обращение учитывается в частотах"""
+        with self._lock:
+            self._check_version(version)
+            if self._sketch is not None:
+                self._sketch.increment(key)
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, version: Hashable, value: object) -> None:
+        """Сохраняет результат, вытесняя давно не использованную запись"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                return
+            if len(self._entries) >= self.max_size:
+                victim = next(iter(self._entries))
+                if self._sketch is not None and self._sketch.estimate(key) <= self._sketch.estimate(victim):
+                    self.rejections += 1
+                    return
+                del self._entries[victim]
+                self.evictions += 1
+            self._entries[key] = value
+
+    def lookup(self, key: Hashable, version: Hashable, compute: Callable[[], object]) -> object:
+        """Возвращает результат из кэша или вычисляет и запоминает его, учитывая время"""
+        start = time.perf_counter()
+        value = self.get(key, version)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+                self.hit_time += time.perf_counter() - start
+            return value
+        value = compute()
+        self.put(key, version, value)
+        with self._lock:
+            self.misses += 1
+            self.miss_time += time.perf_counter() - start
+        return value
+
+    def lookup_many(self, keys: List[Hashable], version: Hashable,
+                    compute_many: Callable[[List[int]], List[object]]) -> List[object]:
+        """Пакетный lookup: результаты, которых нет в кэше, вычисляются одним вызовом
+        compute_many(номера ключей) и запоминаются"""
+        start = time.perf_counter()
+        values = [self.get(key, version) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            if len(keys) > len(missing):
+                # Время поиска в кэше делится между запросами пакета поровну
+                self.hit_time += (time.perf_counter() - start) * (len(keys) - len(missing)) / len(keys)
+        if not missing:
+            return values
+
+        start = time.perf_counter()
+        for i, value in zip(missing, compute_many(missing)):
+            values[i] = value
+            self.put(keys[i], version, value)
+        with self._lock:
+            self.misses += len(missing)
+            self.miss_time += time.perf_counter() - start
+        return values
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Попадания, промахи, вытеснения и среднее время ответа"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'policy': self.policy,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejections': self.rejections,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'hit_latency_ms': self.hit_time / self.hits * 1000 if self.hits else 0.0,
+                'miss_latency_ms': self.miss_time / self.misses * 1000 if self.misses else 0.0,
+            }
@@ -0,0 +1,444 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from postings import (Complement, cardinality, difference, intersect, is_empty, materialize, near_starts,
+                      phrase_starts, union)
+from term_counts import decode_varints, group_cumsum
+from term_dictionary import is_wildcard
+
+# Булев запрос разбирается в дерево (AST), которое затем оптимизируется:
+# вложенные AND/OR сливаются, операнды AND упорядочиваются от редких к частым,
+# а отрицания внутри AND вычисляются как разность после пересечения.
+# Приоритеты операторов: NEAR > NOT > AND > OR. Соседние операнды без оператора
+# соединяются через AND. Фраза в кавычках ("машинное обучение") - слова подряд,
+# a NEAR/k b - слова или фразы на расстоянии не больше k слов в любом порядке.
+# Слово с * или ? (програм*, *грамм?) - маска: объединение (OR) подходящих лемм словаря.
+
+OPERATORS = ('AND', 'OR', 'NOT')
+NEAR_PATTERN = re.compile(r'NEAR(?:/(\d+))?')
+DEFAULT_NEAR_DISTANCE = 5
+
+
+def near_distance(token: Optional[str]) -> Optional[int]:
+    """Расстояние оператора NEAR/k (NEAR без числа - DEFAULT_NEAR_DISTANCE) или None для других токенов"""
+    match = NEAR_PATTERN.fullmatch(token) if token is not None else None
+    if match is None:
+        return None
+    return int(match.group(1)) if match.group(1) is not None else DEFAULT_NEAR_DISTANCE
+
+
+class Node:
+    """Узел плана запроса"""
+
+    def __init__(self):
+        self.estimate = 0          # Оценка числа документов до выполнения
+        self.actual = None         # Фактическое число документов (заполняется при explain)
+
+    def children(self) -> List['Node']:
+        return []
+
+
+class Term(Node):
+    def __init__(self, word: str):
+        super().__init__()
+        self.word = word
+        self.lemma = word
+
+    def label(self) -> str:
+        return f"TERM {self.word}" if self.word == self.lemma else f"TERM {self.word} -> {self.lemma}"
+
+
+class Phrase(Node):
+    def __init__(self, text: str):
+        super().__init__()
+        self.text = text
+        self.terms: List[Tuple[int, str]] = []  # (смещение слова от начала фразы, лемма)
+
+    @property
+    def span(self) -> int:
+        """Расстояние от первого до последнего слова фразы"""
+        return self.terms[-1][0] if self.terms else 0
+
+    def label(self) -> str:
+        lemmas = ' '.join(lemma for _, lemma in self.terms)
+        return f'PHRASE "{self.text}" -> {lemmas}'
+
+
+class Wildcard(Node):
+    def __init__(self, pattern: str):
+        super().__init__()
+        self.pattern = pattern
+        self.terms: List[str] = []  # Леммы словаря, подходящие под маску (не больше предела)
+        self.matched = 0            # Сколько лемм подошло всего
+
+    def label(self) -> str:
+        terms = ', '.join(self.terms) if len(self.terms) <= 5 else f"{len(self.terms)} лемм"
+        limited = f" (самые частые из {self.matched})" if self.matched > len(self.terms) else ''
+        return f"WILDCARD {self.pattern} -> {terms or '(нет)'}{limited}"
+
+
+class Near(Node):
+    def __init__(self, left: Node, right: Node, distance: int):
+        super().__init__()
+        self.operands = [left, right]
+        self.distance = distance
+
+    def children(self) -> List[Node]:
+        return self.operands
+
+    def label(self) -> str:
+        return f'NEAR/{self.distance}'
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        super().__init__()
+        self.child = child
+
+    def children(self) -> List[Node]:
+        return [self.child]
+
+    def label(self) -> str:
+        return 'NOT'
+
+
+class And(Node):
+    def __init__(self, operands: List[Node]):
+        super().__init__()
+        self.operands = operands
+
+    def children(self) -> List[Node]:
+        return self.operands
+
+    def label(self) -> str:
+        return 'AND'
+
+
+class Or(Node):
+    def __init__(self, operands: List[Node]):
+        super().__init__()
+        self.operands = operands
+
+    def children(self) -> List[Node]:
+        return self.operands
+
+    def label(self) -> str:
+        return 'OR'
+
+
+def canonical_key(node: Optional[Node]) -> Tuple:
+    """Каноническая форма оптимизированного плана: одинакова для равносильных записей запроса.
+
+    Термины представлены леммами, операнды AND/OR упорядочены и без повторов.
+    """
+    if node is None:
+        return ()
+    if isinstance(node, Term):
+        return ('TERM', node.lemma)
+    if isinstance(node, Not):
+        return ('NOT', canonical_key(node.child))
+    if isinstance(node, Phrase):
+        return ('PHRASE', tuple(node.terms))
+    if isinstance(node, Wildcard):
+        # Как OR терминов, в которые раскрылась маска
+        operands = tuple(('TERM', term) for term in node.terms)
+        return operands[0] if len(operands) == 1 else ('OR', operands)
+    if isinstance(node, Near):
+        return ('NEAR', node.distance, tuple(sorted(canonical_key(operand) for operand in node.operands)))
+    operands = tuple(sorted({canonical_key(operand) for operand in node.operands}))
+    if len(operands) == 1:
+        return operands[0]
+    return (node.label(), operands)
+
+
+class QueryParser:
+    """Разбор последовательности токенов запроса методом рекурсивного спуска"""
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.position = 0
+
+    def parse(self) -> Optional[Node]:
+        if not self.tokens:
+            return None
+        node = self._parse_or()
+        if self._peek() is not None:
+            raise ValueError(f"Лишняя закрывающая скобка на позиции {self.position + 1}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _parse_or(self) -> Node:
+        operands = [self._parse_and()]
+        while self._peek() == 'OR':
+            self.position += 1
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def _parse_and(self) -> Node:
+        operands = [self._parse_not()]
+        while True:
+            token = self._peek()
+            if token == 'AND':
+                self.position += 1
+            elif token is None or token in (')', 'OR'):
+                break
+            operands.append(self._parse_not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def _parse_not(self) -> Node:
+        if self._peek() == 'NOT':
+            self.position += 1
+            return Not(self._parse_not())
+        return self._parse_near()
+
+    def _parse_near(self) -> Node:
+        node = self._parse_primary()
+        distance = near_distance(self._peek())
+        while distance is not None:
+            self.position += 1
+            right = self._parse_primary()
+            for operand in (node, right):
+                if not isinstance(operand, (Term, Phrase)):
+                    raise ValueError(f"Операнды NEAR - слова или фразы в кавычках (позиция {self.position})")
+            node = Near(node, right, distance)
+            distance = near_distance(self._peek())
+        return node
+
+    def _parse_primary(self) -> Node:
+        token = self._peek()
+        if token is None or token in OPERATORS or token == ')' or near_distance(token) is not None:
+            raise ValueError(f"Ожидался термин или '(' на позиции {self.position + 1}")
+        self.position += 1
+        if token.startswith('"'):
+            return Phrase(token.strip('"'))
+        if is_wildcard(token):
+            return Wildcard(token.lower())
+        if token == '(':
+            node = self._parse_or()
+            # Незакрытая скобка считается закрытой в конце запроса
+            if self._peek() == ')':
+                self.position += 1
+            return node
+        return Term(token)
+
+
+class QueryPlanner:
+    """Компилирует запрос в оптимизированный план и выполняет его над индексом.
+
+    От индекса требуются: n_docs, get_lemma(word), doc_freq(lemma) и lemma_postings(lemma),
+    для фраз и NEAR - phrase_words(text) и lemma_positions(lemma), для масок - expand_wildcard(pattern),
+    для исправления опечаток - correct_lemma(lemma) (None, если исправления нет).
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def compile(self, tokens: List[str]) -> Optional[Node]:
+        """Строит оптимизированный план запроса"""
+        node = QueryParser(tokens).parse()
+        if node is None:
+            return None
+        return self.optimize(node)
+
+    def optimize(self, node: Node) -> Node:
+        """Упрощает дерево и упорядочивает операнды по оценке числа документов"""
+        if isinstance(node, Term):
+            node.lemma = self.index.get_lemma(node.word)
+            node.estimate = self.index.doc_freq(node.lemma)
+            if node.estimate == 0:
+                # Леммы нет в индексе - возможно, опечатка: берется ближайшая по написанию
+                corrected = self.index.correct_lemma(node.lemma)
+                if corrected is not None:
+                    node.lemma = corrected
+                    node.estimate = self.index.doc_freq(corrected)
+            return node
+
+        if isinstance(node, Phrase):
+            words = self.index.phrase_words(node.text)
+            if len(words) == 1:
+                # Фраза из одного слова - обычный термин
+                return self.optimize(Term(words[0][1]))
+            first = words[0][0] if words else 0
+            node.terms = [(offset - first, self.index.get_lemma(word)) for offset, word in words]
+            node.estimate = min((self.index.doc_freq(lemma) for _, lemma in node.terms), default=0)
+            return node
+
+        if isinstance(node, Wildcard):
+            node.terms, node.matched = self.index.expand_wildcard(node.pattern)
+            node.estimate = min(self.index.n_docs, sum(self.index.doc_freq(term) for term in node.terms))
+            return node
+
+        if isinstance(node, Near):
+            node.operands = [self.optimize(operand) for operand in node.operands]
+            node.estimate = min(operand.estimate for operand in node.operands)
+            return node
+
+        if isinstance(node, Not):
+            child = self.optimize(node.child)
+            # NOT NOT x = x
+            if isinstance(child, Not):
+                return child.child
+            node.child = child
+            node.estimate = self.index.n_docs - child.estimate
+            return node
+
+        # Вложенные операторы того же типа сливаются в один
+        operands = []
+        for operand in (self.optimize(operand) for operand in node.operands):
+            if type(operand) is type(node):
+                operands.extend(operand.operands)
+            else:
+                operands.append(operand)
+
+        if isinstance(node, Or):
+            node.operands = operands
+            node.estimate = min(self.index.n_docs, sum(operand.estimate for operand in operands))
+            return node
+
+        # В AND сначала пересекаются самые редкие операнды, отрицания вычитаются в конце
+        positive = sorted((operand for operand in operands if not isinstance(operand, Not)),
+                          key=lambda operand: operand.estimate)
+        negative = sorted((operand for operand in operands if isinstance(operand, Not)),
+                          key=lambda operand: operand.child.estimate, reverse=True)
+        node.operands = positive + negative
+        if positive:
+            node.estimate = positive[0].estimate
+        else:
+            node.estimate = max(0, self.index.n_docs - sum(operand.child.estimate for operand in negative))
+        return node
+
+    def execute(self, node: Optional[Node], collect: bool = False):
+        """Выполняет план; при collect=True запоминает фактическое число документов в узлах"""
+        if node is None:
+            return union([], self.index.n_docs)
+
+        if isinstance(node, Term):
+            result = self.index.lemma_postings(node.lemma)
+        elif isinstance(node, Not):
+            result = Complement(self.execute(node.child, collect))
+        elif isinstance(node, Or):
+            result = union([self.execute(operand, collect) for operand in node.operands], self.index.n_docs)
+        elif isinstance(node, Wildcard):
+            result = union([self.index.lemma_postings(term) for term in node.terms], self.index.n_docs)
+        elif isinstance(node, (Phrase, Near)):
+            result = self._execute_positional(node)
+        else:
+            result = self._execute_and(node, collect)
+
+        if collect:
+            node.actual = self._count(result)
+        return result
+
+    def _execute_and(self, node: And, collect: bool):
+        n_docs = self.index.n_docs
+        positive = [operand for operand in node.operands if not isinstance(operand, Not)]
+        negative = [operand for operand in node.operands if isinstance(operand, Not)]
+
+        if not positive:
+            # NOT a AND NOT b = NOT (a OR b)
+            excluded = union([self.execute(operand.child, collect) for operand in negative], n_docs)
+            if collect:
+                for operand in negative:
+                    operand.actual = n_docs - operand.child.actual
+            return Complement(excluded)
+
+        result = None
+        for operand in positive:
+            value = self.execute(operand, collect)
+            result = value if result is None else intersect(result, value, n_docs)
+            # Пустой промежуточный результат: остальные операнды не вычисляются
+            if is_empty(result):
+                return result
+
+        for operand in negative:
+            # a AND NOT b вычисляется как разность, без дополнения b
+            excluded = self.execute(operand.child, collect)
+            if collect:
+                operand.actual = n_docs - operand.child.actual
+            result = difference(result, excluded, n_docs)
+            if is_empty(result):
+                return result
+        return result
+
+    def _execute_positional(self, node: Node) -> np.ndarray:
+        """Фраза или NEAR: сначала пересекаются документы всех слов, затем у оставшихся
+        кандидатов проверяются позиции (декодируются только позиции кандидатов)"""
+        n_docs = self.index.n_docs
+        lemmas = sorted(set(self._lemmas(node)), key=self.index.doc_freq)
+        positions = {lemma: self.index.lemma_positions(lemma) for lemma in lemmas}
+        if node.estimate == 0:
+            # Одного из слов нет в индексе (или фраза состоит только из стоп-слов)
+            return np.zeros(0, dtype=np.uint32)
+
+        candidates = None
+        for lemma in lemmas:
+            value = self.index.lemma_postings(lemma)
+            candidates = value if candidates is None else intersect(candidates, value, n_docs)
+            if is_empty(candidates):
+                return np.zeros(0, dtype=np.uint32)
+        numbers = materialize(candidates, n_docs)
+
+        # Позиции всех кандидатов проверяются одним слиянием по ключам (кандидат << 32) | позиция
+        keys = {}
+        if isinstance(node, Phrase):
+            starts = self._occurrences(node, numbers, positions, keys)
+        else:
+            left, right = node.operands
+            starts = near_starts(self._occurrences(left, numbers, positions, keys), self._span(left),
+                                 self._occurrences(right, numbers, positions, keys), self._span(right),
+                                 node.distance)
+        return numbers[np.unique(starts >> 32)]
+
+    def _lemmas(self, node: Node) -> List[str]:
+        if isinstance(node, Term):
+            return [node.lemma]
+        if isinstance(node, Phrase):
+            return [lemma for _, lemma in node.terms]
+        return [lemma for operand in node.operands for lemma in self._lemmas(operand)]
+
+    @staticmethod
+    def _span(node: Node) -> int:
+        return node.span if isinstance(node, Phrase) else 0
+
+    @staticmethod
+    def _occurrences(node: Node, numbers: np.ndarray, positions: Dict, keys: Dict[str, np.ndarray]) -> np.ndarray:
+        """Ключи начала вхождений слова или фразы во всех документах-кандидатах"""
+        def lemma_keys(lemma: str) -> np.ndarray:
+            if lemma not in keys:
+                lists = positions[lemma]
+                blobs = [lists[number] for number in numbers.tolist()]
+                data = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+                # Число позиций документа - число последних байтов varint в его части
+                value_ends = np.concatenate(([0], np.cumsum(data < 0x80)))
+                sizes = np.diff(value_ends[np.cumsum([0] + [len(blob) for blob in blobs])])
+                deltas = decode_varints(data)
+                offsets = group_cumsum(deltas, sizes) if len(deltas) else deltas
+                keys[lemma] = (np.repeat(np.arange(len(blobs), dtype=np.int64), sizes) << 32) | offsets
+            return keys[lemma]
+
+        if isinstance(node, Term):
+            return lemma_keys(node.lemma)
+        return phrase_starts([lemma_keys(lemma) for _, lemma in node.terms], [offset for offset, _ in node.terms])
+
+    def _count(self, value) -> int:
+        if isinstance(value, Complement):
+            return self.index.n_docs - self._count(value.inner)
+        return cardinality(value)
+
+    def explain(self, node: Optional[Node]) -> str:
+        """Текстовое представление плана с оценками и фактическим числом документов"""
+        if node is None:
+            return '(пустой запрос)'
+        lines = []
+        self._explain_node(node, 0, lines)
+        return '\n'.join(lines)
+
+    def _explain_node(self, node: Node, depth: int, lines: List[str]) -> None:
+        actual = 'не вычислялось' if node.actual is None else node.actual
+        lines.append(f"{'  ' * depth}{node.label()}  оценка={node.estimate} факт={actual}")
+        for child in node.children():
+            self._explain_node(child, depth + 1, lines)
@@ -0,0 +1,152 @@
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from sparse_matrix import CSRMatrix, top_k_indices
+
+
+class PostingsList:
+    """Список документов термина с весами TF-IDF, упорядоченный по номеру документа"""
+
+    __slots__ = ('docs', 'weights', 'max_weight')
+
+    def __init__(self, docs: List[int], weights: List[float]):
+        self.docs = docs
+        self.weights = weights
+        self.max_weight = max(weights) if weights else 0.0  # Верхняя граница вклада термина
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+class PostingsIndex:
+    """Инвертированный индекс с весами для ранжированного поиска по спискам документов"""
+
+    def __init__(self, n_docs: int):
+        self.n_docs = n_docs
+        self.postings: Dict[int, PostingsList] = {}
+
+    @classmethod
+    def from_csr(cls, matrix: CSRMatrix) -> 'PostingsIndex':
+        """Строит индекс по столбцам разреженной матрицы документ-термин"""
+        index = cls(matrix.n_rows)
+        for term_id in range(matrix.n_cols):
+            rows, values = matrix.column(term_id)
+            if len(rows):
+                index.postings[term_id] = PostingsList(rows.tolist(), values.tolist())
+        return index
+
+    @classmethod
+    def from_dense(cls, vectors: Sequence[np.ndarray]) -> 'PostingsIndex':
+        """Строит индекс по плотным векторам документов"""
+        docs = defaultdict(list)
+        weights = defaultdict(list)
+        for doc, vector in enumerate(vectors):
+            for term_id in np.flatnonzero(vector).tolist():
+                docs[term_id].append(doc)
+                weights[term_id].append(float(vector[term_id]))
+
+        index = cls(len(vectors))
+        for term_id in docs:
+            index.postings[term_id] = PostingsList(docs[term_id], weights[term_id])
+        return index
+
+    def _query_postings(self, term_ids: Sequence[int], weights: Sequence[float]) -> List[Tuple[float, PostingsList]]:
+        """Возвращает пары (вес в запросе, список документов) для терминов запроса"""
+        return [(weight, self.postings[term_id])
+                for term_id, weight in zip(term_ids, weights)
+                if weight > 0 and term_id in self.postings]
+
+    def term_at_a_time(self, term_ids: Sequence[int], weights: Sequence[float],
+                       top_k: int) -> Tuple[List[Tuple[int, float]], Dict[str, int]]:
+        """Поиск термин-за-термином: накапливает оценки по каждому списку целиком"""
+        scores = np.zeros(self.n_docs)
+        total = 0
+        for weight, postings in self._query_postings(term_ids, weights):
+            scores[postings.docs] += weight * np.asarray(postings.weights)
+            total += len(postings)
+
+        # Документы без совпадений не попадают в результат
+        top = [doc for doc in top_k_indices(scores, top_k).tolist() if scores[doc] > 0]
+        stats = {'postings_total': total, 'postings_evaluated': total, 'postings_skipped': 0}
+        return [(doc, float(scores[doc])) for doc in top], stats
+
+    def max_score(self, term_ids: Sequence[int], weights: Sequence[float],
+                  top_k: int) -> Tuple[List[Tuple[int, float]], Dict[str, int]]:
+        """Поиск документ-за-документом с отсечением MaxScore.
+
+        Термины упорядочиваются по верхней границе вклада. Термины, суммарная граница
+        которых не превышает порог top_k, становятся необязательными: документы,
+        встречающиеся только в них, не рассматриваются, а их списки читаются
+        лишь пока документ еще может попасть в top_k.
+        """
+        lists = sorted(((weight * postings.max_weight, weight, postings)
+                        for weight, postings in self._query_postings(term_ids, weights)),
+                       key=lambda item: item[0])
+        total = sum(len(postings) for _, _, postings in lists)
+        if top_k <= 0 or not lists:
+            return [], {'postings_total': total, 'postings_evaluated': 0, 'postings_skipped': total}
+
+        # prefix_bounds[i] - суммарная верхняя граница терминов 0..i
+        prefix_bounds = []
+        bound_sum = 0.0
+        for upper_bound, _, _ in lists:
+            bound_sum += upper_bound
+            prefix_bounds.append(bound_sum)
+
+        cursors = [0] * len(lists)
+        heap: List[Tuple[float, int]] = []  # (оценка, -документ): при равенстве выигрывает меньший номер
+        threshold = -1.0
+        first_essential = 0
+        evaluated = 0
+
+        while first_essential < len(lists):
+            # Следующий кандидат - минимальный документ среди обязательных списков
+            candidate = self.n_docs
+            for i in range(first_essential, len(lists)):
+                docs = lists[i][2].docs
+                if cursors[i] < len(docs) and docs[cursors[i]] < candidate:
+                    candidate = docs[cursors[i]]
+            if candidate == self.n_docs:
+                break
+
+            score = 0.0
+            for i in range(first_essential, len(lists)):
+                postings = lists[i][2]
+                cursor = cursors[i]
+                if cursor < len(postings.docs) and postings.docs[cursor] == candidate:
+                    score += lists[i][1] * postings.weights[cursor]
+                    cursors[i] = cursor + 1
+                    evaluated += 1
+
+            # Необязательные списки проверяем, пока документ может обойти порог
+            for i in range(first_essential - 1, -1, -1):
+                if score + prefix_bounds[i] <= threshold:
+                    break
+                postings = lists[i][2]
+                cursor = bisect_left(postings.docs, candidate, cursors[i])
+                cursors[i] = cursor
+                if cursor < len(postings.docs) and postings.docs[cursor] == candidate:
+                    score += lists[i][1] * postings.weights[cursor]
+                    evaluated += 1
+
+            entry = (score, -candidate)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+                while first_essential < len(lists) and prefix_bounds[first_essential] <= threshold:
+                    first_essential += 1
+
+        results = sorted(((-neg_doc, score) for score, neg_doc in heap), key=lambda item: (-item[1], item[0]))
+        stats = {'postings_total': total, 'postings_evaluated': evaluated, 'postings_skipped': total - evaluated}
+        return results, stats
+
@@ -1,75 +1,423 @@
 import os
+import time
+import argparse
 import numpy as np
-from flask import Flask, render_template, request, jsonify
-from collections import defaultdict
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify
 import math
-from typing import List, Dict, Tuple
-import json
+from typing import List, Dict, NamedTuple, Tuple, Iterable, Optional
 
-app = Flask(__name__)
+from sparse_matrix import PRECISIONS, SCALE_AXES, CSRMatrix, top_k_indices, top_k_rows, top_k_sparse_rows
+from ranked_retrieval import PostingsIndex
+from ann_index import IVFIndex
+from lsa import LsaModel
+from bm25 import ImpactIndex
+from tfidf_model import TfIdfModel
+from term_counts import COUNTS_PATH, CorpusCounts, is_counts_file
+from term_dictionary import TermDictionary
+from spelling import DEFAULT_BUDGET_MS, SpellingCorrector
+from snapshot import pack_strings, read_snapshot, source_fingerprint, unpack_strings, write_snapshot
+from query_cache import CACHE_POLICIES, DEFAULT_CACHE_SIZE, QueryCache
+from lemmatizer import get_lemmatizer
+from lab2 import iter_words
+
+STORAGE_BACKENDS = ('dense', 'csr')
+SEARCH_MODES = ('exhaustive', 'taat', 'maxscore', 'ann', 'lsa', 'bm25')
+MODEL_PATH = 'lab4results/tfidf-lemmas.npz'
+TFIDF_DIR = 'lab4results/tf-idf-lemmas'
+SNAPSHOT_PATH = 'lab4results/search_snapshot.bin'
+DEFAULT_ANN_PROBES = 8
+MAX_BATCH_SIZE = 10000
+MAX_SUGGESTIONS = 100
+# Размер блока пакетного поиска: запросов для 'csr', элементов плотной матрицы оценок для 'dense'
+BATCH_QUERY_BLOCK = 1024
+BATCH_BLOCK_SCORES = 4_000_000
+
+class SearchResult(NamedTuple):
+    """Результат одного запроса: документы со сходством, статистика поиска по спискам документов
+    и исправленные опечатки (слово запроса -> термин словаря)"""
+    results: List[Tuple[str, float]]
+    stats: Dict
+    corrections: Dict[str, str]
 
 class VectorSearchEngine:
-    def __init__(self):
+    def __init__(self, storage: str = 'dense', cache_size: int = DEFAULT_CACHE_SIZE, cache_policy: str = 'tinylfu',
+                 precision: str = 'float64', scale_axis: str = 'row', spelling_budget_ms: Optional[float] = None):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Неизвестный тип хранилища: {storage}")
+        if precision not in PRECISIONS or scale_axis not in SCALE_AXES:
+            raise ValueError(f"Неизвестная точность весов: {precision} ({scale_axis})")
+        if storage == 'dense' and precision not in ('float64', 'float32'):
+            raise ValueError("Квантованные веса поддерживаются только хранилищем 'csr'")
+        self.storage = storage  # Способ хранения векторов: 'dense' или 'csr'
+        self.precision = precision    # Точность весов документов
+        self.scale_axis = scale_axis  # Множители квантованных весов: на документ ('row') или термин ('column')
         self.doc_vectors = {}  # Векторы документов
+        self.doc_matrix = None  # Разреженная матрица документ-термин (для 'csr')
+        self.dense_matrix = None  # Векторы документов одной матрицей (для 'dense', строки - doc_vectors)
         self.term_to_id = {}  # Словарь термин -> id
         self.id_to_term = {}  # Словарь id -> термин
         self.doc_ids = []     # Список id документов
         self.vector_dim = 0   # Размерность векторов
+        self.idf = np.zeros(0)  # IDF терминов по id (веса запроса - TF x IDF)
+        self.lemmatizer = get_lemmatizer()  # Приводит слова запроса к леммам словаря
+        self.postings = None  # Списки документов с весами (строятся при первом поиске по ним)
+        self.ann = None       # Индекс приближенного поиска (строится при первом поиске в режиме 'ann')
+        self.ann_probes = DEFAULT_ANN_PROBES  # Число просматриваемых кластеров по умолчанию
+        self.lsa = None       # Модель LSA для режима 'lsa' (загружается load_lsa)
+        self.bm25 = None      # Индекс BM25 для режима 'bm25' (строится по числу вхождений модели)
+        self.dictionary = None  # Отсортированный словарь терминов для подсказок (строится при первом обращении)
+        self.spelling_budget_ms = spelling_budget_ms  # Бюджет исправления опечаток на запрос, мс (None - без исправления)
+        self.corrector = None   # Исправление опечаток по словарю (строится при первом обращении)
+        self.version = 0      # Номер версии данных, увеличивается при каждой загрузке
+        self.cache = QueryCache(cache_size, cache_policy)  # Результаты запросов текущей версии
         
     def load_tfidf_data(self, tfidf_dir: str):
         """Загружает TF-IDF данные из директории"""
-        # Сначала собираем все уникальные термины
-        all_terms = set()
+        # Сначала собираем все уникальные термины и их IDF
+        all_terms = {}
         for filename in os.listdir(tfidf_dir):
             if filename.endswith('.txt'):
                 with open(os.path.join(tfidf_dir, filename), 'r', encoding='utf-8') as f:
                     for line in f:
-                        term = line.split()[0]
-                        all_terms.add(term)
+                        term, idf, _ = line.split()
+                        all_terms[term] = float(idf)
         
+        # Загружаем векторы документов
+        documents = (
+            (filename[:-4], self._read_tfidf_file(os.path.join(tfidf_dir, filename)))
+            for filename in os.listdir(tfidf_dir)
+            if filename.endswith('.txt')
+        )
+        terms = sorted(all_terms)
+        self.build_index(terms, documents, np.array([all_terms[term] for term in terms]))
+
+    def load(self, source: str, snapshot_path: Optional[str] = None) -> bool:
+        """Загружает данные из модели .npz, файла счетчиков задания 2 или директории с текстовыми файлами TF-IDF.
+
+        Если снимок существует и построен из того же состояния источника, данные
+        отображаются из него в память без разбора; иначе источник читается заново
+        и снимок перезаписывается. Возвращает True, если использован снимок.
+        """
+        # Снимок хранит веса в точности поисковой системы
+        fingerprint = f"{source_fingerprint(source)}:{self.precision}:{self.scale_axis}"
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                snapshot_fingerprint, arrays = read_snapshot(snapshot_path)
+            except ValueError as e:
+                print(f"Снимок не используется: {e}")
+            else:
+                # Снимки без IDF или индекса BM25 (прежнего формата) пересобираются
+                if snapshot_fingerprint == fingerprint and 'idf' in arrays \
+                        and ('bm25_docs' in arrays or os.path.isdir(source)):
+                    self._load_snapshot_arrays(arrays)
+                    return True
+
+        if os.path.isdir(source):
+            self.load_tfidf_data(source)
+        elif is_counts_file(source):
+            self.load_counts(source)
+        else:
+            self.load_model(source)
+        if snapshot_path:
+            self.save_snapshot(snapshot_path, fingerprint)
+        return False
+
+    def _csr_matrix(self) -> CSRMatrix:
+        """Нормализованные векторы документов в виде разреженной матрицы (для любого хранилища)"""
+        if self.storage == 'csr':
+            return self.doc_matrix
+        rows = []
+        for doc_id in self.doc_ids:
+            doc_vector = self.doc_vectors[doc_id]
+            cols = np.flatnonzero(doc_vector)
+            rows.append((cols, doc_vector[cols]))
+        return CSRMatrix.from_rows(rows, self.vector_dim)
+
+    def save_snapshot(self, snapshot_path: str, fingerprint: str):
+        """Сохраняет словарь, нормализованные веса, таблицу документов и индекс BM25 в файл снимка"""
+        matrix = self._csr_matrix()
+        scales = {name: scale for name, scale in (('row_scale', matrix.row_scale), ('col_scale', matrix.col_scale))
+                  if scale is not None}
+        terms_blob, terms_offsets = pack_strings([self.id_to_term[idx] for idx in range(self.vector_dim)])
+        doc_ids_blob, doc_ids_offsets = pack_strings(self.doc_ids)
+        write_snapshot(snapshot_path, fingerprint, {
+            'terms_blob': terms_blob, 'terms_offsets': terms_offsets,
+            'doc_ids_blob': doc_ids_blob, 'doc_ids_offsets': doc_ids_offsets,
+            'indptr': matrix.indptr, 'indices': matrix.indices, 'data': matrix.data,
+            'col_order': matrix.col_order, 'col_ptr': matrix.col_ptr, 'idf': self.idf, **scales,
+            **(self.bm25.arrays() if self.bm25 is not None else {}),
+        })
+
+    def _load_snapshot_arrays(self, arrays: Dict[str, np.ndarray]):
+        terms = unpack_strings(arrays['terms_blob'], arrays['terms_offsets'])
+        doc_ids = unpack_strings(arrays['doc_ids_blob'], arrays['doc_ids_offsets'])
+        self._set_vectors(terms, doc_ids, arrays['indptr'], arrays['indices'], arrays['data'], arrays['idf'],
+                          arrays['col_order'], arrays['col_ptr'], arrays.get('row_scale'), arrays.get('col_scale'))
+        self.bm25 = ImpactIndex.from_arrays(arrays)
+
+    def load_lsa(self, lsa_path: str):
+        """Загружает модель LSA (lsa.py), построенную по той же модели TF-IDF"""
+        lsa = LsaModel.load(lsa_path)
+        if lsa.doc_ids != self.doc_ids or lsa.terms != [self.id_to_term[idx] for idx in range(self.vector_dim)]:
+            raise ValueError(f"{lsa_path}: модель LSA построена по другой модели TF-IDF")
+        self.lsa = lsa
+        self.version += 1
+
+    def load_model(self, model_path: str):
+        """Загружает бинарную модель TF-IDF, построенную lab4.py (без разбора текстовых файлов)"""
+        model = TfIdfModel.load(model_path)
+        self.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights, model.idf,
+                            model.counts)
+
+    def load_counts(self, counts_path: str):
+        """Строит модель TF-IDF лемм по бинарным счетчикам lab2.py (если lab4.py не запускался)"""
+        model = TfIdfModel.from_counts(CorpusCounts(counts_path).term_counts(lemmas=True))
+        self.build_from_csr(model.terms, model.doc_ids, model.indptr, model.indices, model.weights, model.idf,
+                            model.counts)
+
+    @staticmethod
+    def _read_tfidf_file(file_path: str) -> List[Tuple[str, float]]:
+        """Читает пары (термин, tf-idf) из файла формата <термин> <idf> <tf-idf>"""
+        weights = []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                term, _, tfidf = line.strip().split()
+                weights.append((term, float(tfidf)))
+        return weights
+
+    def build_index(self, terms: List[str], documents: Iterable[Tuple[str, List[Tuple[str, float]]]],
+                    idf: Optional[np.ndarray] = None):
+        """Строит нормализованные векторы документов по словарю и весам TF-IDF.
+
+        Без idf он вычисляется как log(N / DF) по документам с ненулевыми весами.
+        """
         # Создаем словари для маппинга терминов
-        self.term_to_id = {term: idx for idx, term in enumerate(sorted(all_terms))}
+        self.term_to_id = {term: idx for idx, term in enumerate(terms)}
         self.id_to_term = {idx: term for term, idx in self.term_to_id.items()}
         self.vector_dim = len(self.term_to_id)
-        
-        # Загружаем векторы документов
-        for filename in os.listdir(tfidf_dir):
-            if filename.endswith('.txt'):
-                doc_id = filename[:-4]  # Убираем расширение .txt
-                self.doc_ids.append(doc_id)
-                
-                # Создаем вектор документа
-                doc_vector = np.zeros(self.vector_dim)
-                with open(os.path.join(tfidf_dir, filename), 'r', encoding='utf-8') as f:
-                    for line in f:
-                        term, _, tfidf = line.strip().split()
-                        term_id = self.term_to_id[term]
-                        doc_vector[term_id] = float(tfidf)
-                
-                # Нормализуем вектор
-                norm = np.linalg.norm(doc_vector)
-                if norm > 0:
-                    doc_vector = doc_vector / norm
-                
-                self.doc_vectors[doc_id] = doc_vector
-    
-    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
-        """Выполняет векторный поиск по запросу"""
-        # Создаем вектор запроса
+        self.doc_vectors = {}
+        self.doc_ids = []
+        self.postings = None
+        self.ann = None
+        self.bm25 = None
+        self.dictionary = None
+        self.corrector = None
+        self.version += 1
+
+        if self.storage == 'csr':
+            self.doc_matrix = CSRMatrix.from_rows(self._sparse_rows(documents), self.vector_dim) \
+                .with_precision(self.precision, self.scale_axis)
+            self.idf = self._inverse_frequencies(idf)
+            return
+
+        for doc_id, weights in documents:
+            self.doc_ids.append(doc_id)
+            
+            # Создаем вектор документа
+            doc_vector = np.zeros(self.vector_dim)
+            for term, tfidf in weights:
+                doc_vector[self.term_to_id[term]] = tfidf
+            
+            # Нормализуем вектор
+            norm = np.linalg.norm(doc_vector)
+            if norm > 0:
+                doc_vector = doc_vector / norm
+            
+            self.doc_vectors[doc_id] = doc_vector
+
+        # Собираем векторы в одну матрицу; словарь ссылается на ее строки
+        self.dense_matrix = np.stack([self.doc_vectors[doc_id] for doc_id in self.doc_ids]).astype(self.precision) \
+            if self.doc_ids else np.zeros((0, self.vector_dim), dtype=self.precision)
+        for row, doc_id in enumerate(self.doc_ids):
+            self.doc_vectors[doc_id] = self.dense_matrix[row]
+        self.idf = self._inverse_frequencies(idf)
+
+    def build_from_csr(self, terms: List[str], doc_ids: List[str], indptr: np.ndarray,
+                       indices: np.ndarray, weights: np.ndarray, idf: Optional[np.ndarray] = None,
+                       counts: Optional[np.ndarray] = None):
+        """Строит нормализованные векторы документов по матрице весов TF-IDF в формате CSR.
+
+        По числу вхождений counts (в той же структуре CSR) строится индекс BM25 для режима 'bm25'.
+        """
+        # Нормализация всех строк сразу
+        n_docs = len(doc_ids)
+        rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_docs))[rows]
+        values = np.divide(weights, norms, out=np.zeros(len(weights)), where=norms > 0)
+
+        # Нулевые веса (термины, встречающиеся во всех документах) не хранятся
+        keep = values != 0.0
+        kept_indptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[keep], minlength=n_docs), out=kept_indptr[1:])
+        self._set_vectors(terms, doc_ids, kept_indptr, indices[keep].astype(np.int32), values[keep], idf)
+        if counts is not None:
+            self.bm25 = ImpactIndex.build(indptr, indices, counts, len(terms))
+
+    def _set_vectors(self, terms: List[str], doc_ids: List[str], indptr: np.ndarray, indices: np.ndarray,
+                     values: np.ndarray, idf: Optional[np.ndarray] = None,
+                     col_order: Optional[np.ndarray] = None, col_ptr: Optional[np.ndarray] = None,
+                     row_scale: Optional[np.ndarray] = None, col_scale: Optional[np.ndarray] = None):
+        """Устанавливает словарь и уже нормализованные векторы документов (веса из снимка - в точности системы)"""
+        self.term_to_id = {term: idx for idx, term in enumerate(terms)}
+        self.id_to_term = dict(enumerate(terms))
+        self.vector_dim = len(terms)
+        self.doc_ids = list(doc_ids)
+        self.doc_vectors = {}
+        self.postings = None
+        self.ann = None
+        self.bm25 = None
+        self.dictionary = None
+        self.corrector = None
+        self.version += 1
+
+        if self.storage == 'csr':
+            self.doc_matrix = CSRMatrix(indptr, indices, values, self.vector_dim, col_order, col_ptr,
+                                        row_scale, col_scale).with_precision(self.precision, self.scale_axis)
+            self.idf = self._inverse_frequencies(idf)
+            return
+
+        # Векторы - строки одной матрицы: после fork ее страницы остаются общими для процессов
+        dense = np.zeros((len(self.doc_ids), self.vector_dim), dtype=self.precision)
+        for row, doc_id in enumerate(self.doc_ids):
+            start, end = indptr[row], indptr[row + 1]
+            dense[row, indices[start:end]] = values[start:end]
+            self.doc_vectors[doc_id] = dense[row]
+        self.dense_matrix = dense
+        self.idf = self._inverse_frequencies(idf)
+
+    def _inverse_frequencies(self, idf: Optional[np.ndarray]) -> np.ndarray:
+        """IDF терминов по id; без idf модели - log(N / DF) по ненулевым весам документов"""
+        if idf is not None:
+            return np.asarray(idf, dtype=np.float64)
+        if self.storage == 'csr':
+            df = np.bincount(self.doc_matrix.indices, minlength=self.vector_dim)
+        else:
+            df = np.count_nonzero(self.dense_matrix, axis=0)
+        return np.log(len(self.doc_ids) / np.maximum(df, 1)) * (df > 0)
+
+    def _sparse_rows(self, documents: Iterable[Tuple[str, List[Tuple[str, float]]]]):
+        """Выдает нормализованные строки разреженной матрицы, запоминая порядок документов"""
+        for doc_id, weights in documents:
+            self.doc_ids.append(doc_id)
+
+            # Оставляем только ненулевые веса, упорядоченные по id термина
+            row = {self.term_to_id[term]: tfidf for term, tfidf in weights if tfidf != 0.0}
+            cols = np.fromiter(sorted(row), dtype=np.int32, count=len(row))
+            values = np.fromiter((row[col] for col in cols), dtype=np.float64, count=len(row))
+
+            norm = np.linalg.norm(values)
+            if norm > 0:
+                values = values / norm
+            yield cols, values
+
+    def query_terms(self, query: str, corrections: Optional[Dict[str, str]] = None) -> Dict[int, int]:
+        """Число вхождений (TF) терминов запроса из словаря: id термина -> TF.
+
+        Слова выделяются по правилам токенизации задания 2 (lab2.iter_words); слово,
+        которого нет в словаре, заменяется леммой через общий кэширующий лемматизатор.
+        Если нет и леммы, при включенном исправлении опечаток берется ближайший по написанию
+        термин (исправленные слова записываются в corrections); остальные слова отбрасываются.
+        """
+        term_to_id = self.term_to_id
+        counts = {}
+        deadline = None
+        for word in iter_words(query):
+            term_id = term_to_id.get(word)
+            if term_id is None:
+                lemma = self.lemmatizer.lemmatize(word)
+                term_id = term_to_id.get(lemma)
+                if term_id is None and self.spelling_budget_ms is not None:
+                    # Бюджет времени общий для всех слов запроса
+                    corrector = self.spelling_corrector()
+                    deadline = deadline or corrector.deadline()
+                    corrected = corrector.correct(lemma or word, deadline)
+                    if corrected is not None:
+                        term_id = term_to_id[corrected]
+                        if corrections is not None:
+                            corrections[word] = corrected
+                if term_id is None:
+                    continue
+            counts[term_id] = counts.get(term_id, 0) + 1
+        return counts
+
+    def query_vector(self, terms: Dict[int, int]) -> Tuple[List[int], List[float]]:
+        """Разреженный вектор запроса: id терминов и нормированные веса TF x IDF.
+
+        Термины с нулевым IDF (встречающиеся во всех документах) не влияют на оценки и не включаются.
+        """
+        idf = self.idf
+        term_ids, weights = [], []
+        for term_id, count in terms.items():
+            weight = count * float(idf[term_id])
+            if weight > 0:
+                term_ids.append(term_id)
+                weights.append(weight)
+        norm = math.sqrt(sum(weight * weight for weight in weights))
+        return term_ids, [weight / norm for weight in weights]
+
+    def query_key(self, query: str, top_k: int = 10, mode: str = 'exhaustive', n_probe: Optional[int] = None) -> Tuple:
+        """Ключ кэша: отсортированные пары (id термина, TF) запроса.
+
+        Вектор запроса зависит только от них, поэтому запросы с другим порядком слов,
+        другими формами тех же слов или словами вне словаря получают тот же результат.
+        """
+        return self._query_key(self.query_terms(query), top_k, mode, n_probe)
+
+    @staticmethod
+    def _query_key(terms: Dict[int, int], top_k: int, mode: str, n_probe: Optional[int]) -> Tuple:
+        return (mode, top_k, n_probe, tuple(sorted(terms.items())))
+
+    def search(self, query: str, top_k: int = 10, mode: str = 'exhaustive',
+               n_probe: Optional[int] = None) -> SearchResult:
+        """Выполняет векторный поиск по запросу (повторные запросы берутся из кэша).
+
+        В режиме 'ann' n_probe - число просматриваемых кластеров (по умолчанию ann_probes):
+        больше кластеров - выше полнота и дольше поиск. Статистика и исправления опечаток
+        возвращаются вместе с результатом, а не сохраняются в объекте: его одновременно
+        используют потоки сервера.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Неизвестный режим поиска: {mode}")
+        if mode == 'lsa' and self.lsa is None:
+            raise ValueError("Модель LSA не загружена")
+        if mode == 'bm25' and self.bm25 is None:
+            raise ValueError("Индекс BM25 не построен: нужен источник с числом вхождений (модель или счетчики)")
+        if mode == 'ann':
+            n_probe = n_probe or self.ann_probes
+        else:
+            n_probe = None
+        corrections = {}
+        terms = self.query_terms(query, corrections)
+        results, stats = self.cache.lookup(self._query_key(terms, top_k, mode, n_probe), self.version,
+                                           lambda: self._search_uncached(terms, top_k, mode, n_probe))
+        return SearchResult(list(results), dict(stats), corrections)
+
+    def _search_uncached(self, terms: Dict[int, int], top_k: int, mode: str,
+                         n_probe: Optional[int] = None) -> Tuple[List[Tuple[str, float]], Dict]:
+        """Вычисляет результат запроса и статистику поиска по спискам документов"""
+        if mode == 'bm25':
+            return self._search_bm25(terms, top_k)
+        term_ids, weights = self.query_vector(terms)
+        if mode == 'ann':
+            return self._search_ann(term_ids, weights, top_k, n_probe)
+        if mode == 'lsa':
+            return self._search_lsa(term_ids, weights, top_k), {}
+        if mode != 'exhaustive':
+            return self._search_postings(term_ids, weights, top_k, mode)
+        if self.storage == 'csr':
+            return self._search_csr(term_ids, weights, top_k), {}
+        return self._search_dense(term_ids, weights, top_k), {}
+
+    def _search_dense(self, term_ids: List[int], weights: List[float], top_k: int) -> List[Tuple[str, float]]:
+        """Векторный поиск перебором плотных векторов документов"""
+        # Без терминов из словаря сходство со всеми документами нулевое
+        if not term_ids:
+            return [(doc_id, 0.0) for doc_id in self.doc_ids[:top_k]]
+
+        # Создаем нормированный вектор запроса
         query_vector = np.zeros(self.vector_dim)
-        query_terms = query.lower().split()
-        
-        # Заполняем вектор запроса
-        for term in query_terms:
-            if term in self.term_to_id:
-                term_id = self.term_to_id[term]
-                query_vector[term_id] = 1.0
-        
-        # Нормализуем вектор запроса
-        norm = np.linalg.norm(query_vector)
-        if norm > 0:
-            query_vector = query_vector / norm
-        
+        query_vector[term_ids] = weights
+
         # Вычисляем косинусное сходство для каждого документа
         similarities = []
         for doc_id, doc_vector in self.doc_vectors.items():
@@ -80,28 +428,295 @@ class VectorSearchEngine:
         similarities.sort(key=lambda x: x[1], reverse=True)
         return similarities[:top_k]
 
-# Создаем экземпляр поисковой системы
-search_engine = VectorSearchEngine()
+    def search_many(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Векторный поиск для пакета запросов (как search с mode='exhaustive').
+
+        Запросы, которых нет в кэше, собираются в разреженную матрицу, оценки вычисляются
+        одним матричным произведением на блок запросов, а top_k выбирается по строкам.
+        """
+        terms = [self.query_terms(query) for query in queries]
+        keys = [self._query_key(query_terms, top_k, 'exhaustive', None) for query_terms in terms]
+        cached = self.cache.lookup_many(keys, self.version, lambda missing: [
+            (results, {}) for results in self._search_many_uncached([terms[i] for i in missing], top_k)])
+        return [list(results) for results, _ in cached]
+
+    def _search_many_uncached(self, queries: List[Dict[int, int]], top_k: int) -> List[List[Tuple[str, float]]]:
+        n_docs = len(self.doc_ids)
+        # Блок ограничивает объем матрицы оценок (для 'dense' она плотная)
+        block = BATCH_QUERY_BLOCK if self.storage == 'csr' else max(1, BATCH_BLOCK_SCORES // max(1, n_docs))
+        results = []
+        for start in range(0, len(queries), block):
+            chunk = queries[start:start + block]
+            query_rows, term_ids, weights = self._query_matrix(chunk)
+            if self.storage == 'csr':
+                scores = self.doc_matrix.dot_columns_many(query_rows, term_ids, weights, len(chunk))
+                tops = top_k_sparse_rows(*scores, len(chunk), n_docs, top_k)
+            else:
+                # Произведение по столбцам терминов, встречающихся в пакете
+                batch_terms, columns = np.unique(term_ids, return_inverse=True)
+                query_matrix = np.zeros((len(chunk), len(batch_terms)))
+                np.add.at(query_matrix, (query_rows, columns), weights)
+                tops = zip(*top_k_rows(query_matrix @ self.dense_matrix[:, batch_terms].T, top_k))
+            for docs, values in tops:
+                results.append([(self.doc_ids[doc], score) for doc, score in zip(docs.tolist(), values.tolist())])
+        return results
+
+    def _query_matrix(self, queries: List[Dict[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Разреженная матрица запросов: номер запроса, id термина и нормированный вес"""
+        query_rows, term_ids, weights = [], [], []
+        for row, terms in enumerate(queries):
+            ids, values = self.query_vector(terms)
+            query_rows.extend([row] * len(ids))
+            term_ids.extend(ids)
+            weights.extend(values)
+        return (np.asarray(query_rows, dtype=np.int64), np.asarray(term_ids, dtype=np.int64),
+                np.asarray(weights, dtype=np.float64))
+
+    def _search_csr(self, term_ids: List[int], weights: List[float], top_k: int) -> List[Tuple[str, float]]:
+        """Векторный поиск по разреженной матрице: учитываются только столбцы терминов запроса"""
+        scores = self.doc_matrix.dot_columns(term_ids, weights)
+
+        # Частичный выбор top_k вместо сортировки всех документов
+        top = top_k_indices(scores, top_k)
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    def warm_up(self, ann: bool = False):
+        """Заранее строит структуры, которые иначе создаются при первом запросе"""
+        self._get_postings()
+        self.term_dictionary()
+        if self.spelling_budget_ms is not None:
+            self.spelling_corrector()
+        # Словари pymorphy2 для лемматизации запросов (до fork - общие для процессов)
+        self.lemmatizer.morph
+        if ann:
+            self._get_ann()
+
+    def term_dictionary(self) -> TermDictionary:
+        """Словарь терминов с числом документов, строится при первом обращении"""
+        if self.dictionary is None:
+            # Число документов восстанавливается из IDF = log(N / DF)
+            frequencies = np.rint(len(self.doc_ids) * np.exp(-self.idf)).astype(np.int64)
+            self.dictionary = TermDictionary([self.id_to_term[idx] for idx in range(self.vector_dim)], frequencies)
+        return self.dictionary
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Подсказки: самые частые термины словаря с началом prefix и число их документов"""
+        return self.term_dictionary().complete(prefix.lower(), limit)
+
+    def spelling_corrector(self) -> SpellingCorrector:
+        """Исправление опечаток по словарю терминов, строится при первом обращении"""
+        if self.corrector is None:
+            self.corrector = SpellingCorrector(self.term_dictionary(), self.spelling_budget_ms)
+        return self.corrector
+
+    def _get_postings(self) -> PostingsIndex:
+        """Возвращает списки документов с весами, строя их при первом обращении"""
+        if self.postings is None:
+            if self.storage == 'csr':
+                self.postings = PostingsIndex.from_csr(self.doc_matrix)
+            else:
+                self.postings = PostingsIndex.from_dense([self.doc_vectors[doc_id] for doc_id in self.doc_ids])
+        return self.postings
+
+    def _search_postings(self, term_ids: List[int], weights: List[float], top_k: int,
+                         mode: str) -> Tuple[List[Tuple[str, float]], Dict]:
+        """Ранжированный поиск по спискам документов терминов запроса: результат и статистика"""
+        postings = self._get_postings()
+        if mode == 'maxscore':
+            ranked, stats = postings.max_score(term_ids, weights, top_k)
+        else:
+            ranked, stats = postings.term_at_a_time(term_ids, weights, top_k)
+        return self._with_zero_scores(ranked, top_k), dict(stats, mode=mode)
 
-@app.route('/')
+    def _get_ann(self) -> IVFIndex:
+        """Возвращает индекс приближенного поиска, строя его при первом обращении"""
+        if self.ann is None:
+            self.ann = IVFIndex.build(self._csr_matrix().dequantized())
+        return self.ann
+
+    def _search_ann(self, term_ids: List[int], weights: List[float], top_k: int,
+                    n_probe: int) -> Tuple[List[Tuple[str, float]], Dict]:
+        """Приближенный поиск: точные оценки только для документов n_probe ближайших кластеров"""
+        ranked, stats = self._get_ann().search(term_ids, weights, top_k, n_probe)
+        return self._with_zero_scores(ranked, top_k), dict(stats, mode='ann')
+
+    def _search_lsa(self, term_ids: List[int], weights: List[float], top_k: int) -> List[Tuple[str, float]]:
+        """Поиск в пространстве LSA: косинус между проекцией запроса и векторами документов"""
+        scores = self.lsa.embeddings @ self.lsa.project_query(term_ids, weights)
+        return [(self.doc_ids[i], float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    def _search_bm25(self, terms: Dict[int, int], top_k: int) -> Tuple[List[Tuple[str, float]], Dict]:
+        """Поиск BM25 по спискам с вкладами по убыванию, с досрочной остановкой"""
+        ranked, stats = self.bm25.search(terms, top_k)
+        return self._with_zero_scores(ranked, top_k), dict(stats, mode='bm25')
+
+    def _with_zero_scores(self, ranked: List[Tuple[int, float]], top_k: int) -> List[Tuple[str, float]]:
+        """Дополняет результат документами с нулевым сходством, как при полном переборе"""
+        found = {doc for doc, _ in ranked}
+        for doc in range(len(self.doc_ids)):
+            if len(ranked) >= top_k:
+                break
+            if doc not in found:
+                ranked.append((doc, 0.0))
+
+        return [(self.doc_ids[doc], score) for doc, score in ranked]
+
+routes = Blueprint('search', __name__)
+
+def get_engine() -> VectorSearchEngine:
+    """Поисковая система текущего приложения"""
+    return current_app.config['SEARCH_ENGINE']
+
+@routes.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/search')
+@routes.route('/ready')
+def ready():
+    """Готовность к приему запросов: индекс загружен"""
+    engine = current_app.config.get('SEARCH_ENGINE')
+    if engine is None or not engine.doc_ids:
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True, 'pid': os.getpid(), 'documents': len(engine.doc_ids),
+                    'terms': engine.vector_dim, 'storage': engine.storage})
+
+@routes.route('/cache')
+def cache_stats():
+    """Метрики кэша результатов процесса: доля попаданий и среднее время ответа"""
+    search_engine = get_engine()
+    return jsonify(dict(search_engine.cache.stats(), pid=os.getpid(), version=search_engine.version))
+
+@routes.route('/search')
 def search():
     query = request.args.get('q', '')
     if not query:
         return jsonify({'results': []})
+
+    mode = request.args.get('mode', 'exhaustive')
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f"Неизвестный режим поиска: {mode}"}), 400
+    n_probe = request.args.get('probes', type=int)
+    if n_probe is not None and n_probe < 1:
+        return jsonify({'error': 'probes должно быть положительным целым числом'}), 400
     
-    results = search_engine.search(query)
-    return jsonify({'results': results})
+    search_engine = get_engine()
+    if mode == 'lsa' and search_engine.lsa is None:
+        return jsonify({'error': 'Модель LSA не загружена (параметр --lsa)'}), 400
+    if mode == 'bm25' and search_engine.bm25 is None:
+        return jsonify({'error': 'Индекс BM25 строится только по модели или файлу счетчиков'}), 400
+    results, stats, corrections = search_engine.search(query, mode=mode, n_probe=n_probe)
+    response = {'results': results}
+    if corrections:
+        response['corrections'] = corrections
+    if mode != 'exhaustive':
+        response['stats'] = stats
+    return jsonify(response)
+
+@routes.route('/suggest')
+def suggest():
+    """Автодополнение последнего слова запроса: /suggest?q=машинное обу&limit=10"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify({'error': f"limit должно быть целым числом от 1 до {MAX_SUGGESTIONS}"}), 400
+
+    # После пробела слово закончено, подсказывать нечего
+    words = query.split()
+    prefix = words[-1] if words and not query[-1].isspace() else ''
+    return jsonify({'prefix': prefix, 'suggestions': get_engine().suggest(prefix, limit)})
+
+@routes.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Пакетный поиск: {"queries": [...], "top_k": 10} -> {"results": [[...], ...]}"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Ожидается JSON-объект с полем queries'}), 400
+    queries = payload.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({'error': 'Поле queries должно быть списком строк'}), 400
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({'error': f"Не больше {MAX_BATCH_SIZE} запросов в пакете"}), 400
+    top_k = payload.get('top_k', 10)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1:
+        return jsonify({'error': 'top_k должно быть положительным целым числом'}), 400
+
+    return jsonify({'results': get_engine().search_many(queries, top_k)})
+
+def load_engine(storage: str = 'dense', model: str = MODEL_PATH, snapshot: Optional[str] = SNAPSHOT_PATH,
+                cache_size: int = DEFAULT_CACHE_SIZE, cache_policy: str = 'tinylfu',
+                lsa: Optional[str] = None, precision: str = 'float64', scale_axis: str = 'row',
+                spelling_budget_ms: Optional[float] = None) -> VectorSearchEngine:
+    """Создает поисковую систему и загружает данные TF-IDF, печатая время загрузки"""
+    search_engine = VectorSearchEngine(storage=storage, cache_size=cache_size, cache_policy=cache_policy,
+                                       precision=precision, scale_axis=scale_axis,
+                                       spelling_budget_ms=spelling_budget_ms)
+    # Без модели lab4.py веса считаются по счетчикам lab2.py, без них - читаются текстовые файлы
+    if os.path.exists(model):
+        source = model
+    else:
+        source = COUNTS_PATH if os.path.exists(COUNTS_PATH) else TFIDF_DIR
+    start = time.perf_counter()
+    from_snapshot = search_engine.load(source, snapshot or None)
+    elapsed = time.perf_counter() - start
+    print(f"Данные загружены за {elapsed * 1000:.0f} мс "
+          f"({'из снимка ' + snapshot if from_snapshot else 'из ' + source}), документов: {len(search_engine.doc_ids)}")
+    if lsa:
+        search_engine.load_lsa(lsa)
+        print(f"Модель LSA загружена из {lsa}, ранг {search_engine.lsa.rank}")
+    return search_engine
+
+def create_app(search_engine: Optional[VectorSearchEngine] = None) -> Flask:
+    """Фабрика приложения: индекс загружается один раз при создании.
+
+    Без аргумента параметры берутся из переменных окружения SEARCH_STORAGE, SEARCH_MODEL,
+    SEARCH_SNAPSHOT, SEARCH_CACHE_SIZE, SEARCH_CACHE_POLICY, SEARCH_LSA, SEARCH_PRECISION,
+    SEARCH_SCALE и SEARCH_SPELLING (бюджет исправления опечаток в мс), например для WSGI-сервера:
+    'search_engine:create_app()'.
+    """
+    if search_engine is None:
+        search_engine = load_engine(os.environ.get('SEARCH_STORAGE', 'dense'),
+                                    os.environ.get('SEARCH_MODEL', MODEL_PATH),
+                                    os.environ.get('SEARCH_SNAPSHOT', SNAPSHOT_PATH),
+                                    int(os.environ.get('SEARCH_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+                                    os.environ.get('SEARCH_CACHE_POLICY', 'tinylfu'),
+                                    os.environ.get('SEARCH_LSA') or None,
+                                    os.environ.get('SEARCH_PRECISION', 'float64'),
+                                    os.environ.get('SEARCH_SCALE', 'row'),
+                                    float(os.environ['SEARCH_SPELLING']) if os.environ.get('SEARCH_SPELLING') else None)
+    app = Flask(__name__)
+    app.config['SEARCH_ENGINE'] = search_engine
+    app.register_blueprint(routes)
+    return app
 
 def main():
+    parser = argparse.ArgumentParser(description='Векторная поисковая система')
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='dense',
+                        help='способ хранения векторов документов')
+    parser.add_argument('--model', default=MODEL_PATH,
+                        help=f'бинарная модель TF-IDF из lab4.py (если ее нет, читается {COUNTS_PATH} или {TFIDF_DIR})')
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                        help='файл снимка для быстрого запуска (пустая строка - не использовать)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='число запросов в кэше результатов (0 - без кэша)')
+    parser.add_argument('--cache-policy', choices=CACHE_POLICIES, default='tinylfu',
+                        help='политика вытеснения кэша результатов')
+    parser.add_argument('--lsa', default='', help='модель LSA из lsa.py для режима mode=lsa')
+    parser.add_argument('--precision', choices=PRECISIONS, default='float64',
+                        help="точность весов документов (uint16/uint8 - квантование, только для --storage csr)")
+    parser.add_argument('--scale', choices=SCALE_AXES, default='row',
+                        help='множитель квантованных весов: на документ (row) или на термин (column)')
+    parser.add_argument('--spelling', type=float, nargs='?', const=DEFAULT_BUDGET_MS, default=None, metavar='MS',
+                        help=f'исправлять опечатки в словах запроса, не дольше MS мс на запрос (по умолчанию {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--debug', action='store_true',
+                        help='режим отладки Flask (перезапуск при изменении кода и отладчик в браузере)')
+    args = parser.parse_args()
+
     # Загружаем данные TF-IDF
-    search_engine.load_tfidf_data('lab4results/tf-idf-lemmas')
+    app = create_app(load_engine(args.storage, args.model, args.snapshot, args.cache_size, args.cache_policy,
+                                 args.lsa or None, args.precision, args.scale, args.spelling))
     
-    # Запускаем веб-сервер
-    app.run(debug=True)
+    # Запускаем веб-сервер (для нескольких процессов - serve.py)
+    app.run(debug=args.debug)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,122 @@
+import gc
+import os
+import signal
+import socket
+import argparse
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from query_cache import CACHE_POLICIES, DEFAULT_CACHE_SIZE
+from sparse_matrix import PRECISIONS, SCALE_AXES
+from search_engine import MODEL_PATH, SNAPSHOT_PATH, STORAGE_BACKENDS, create_app, load_engine
+from spelling import DEFAULT_BUDGET_MS
+
+# Многопроцессный режим (pre-fork): индекс загружается один раз в главном процессе,
+# затем процессы-обработчики создаются через fork и принимают соединения с общего сокета.
+# Массивы из снимка отображены через mmap, а остальные данные созданы до fork,
+# поэтому страницы с векторами остаются общими (copy-on-write) и память не растет
+# пропорционально числу процессов.
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Обработчик запросов без журнала каждого запроса"""
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+def run_worker(app, host: str, port: int, fd: int, access_log: bool) -> None:
+    """Цикл обработки запросов в процессе-обработчике"""
+    # Ctrl+C получает вся группа процессов; обработчики останавливает главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    handler = WSGIRequestHandler if access_log else QuietRequestHandler
+    server = make_server(host, port, app, request_handler=handler, fd=fd)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Многопроцессный сервер векторного поиска')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='число процессов-обработчиков')
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='csr',
+                        help='способ хранения векторов документов')
+    parser.add_argument('--model', default=MODEL_PATH, help='бинарная модель TF-IDF из lab4.py')
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                        help='файл снимка, отображаемый в память всеми процессами')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='число запросов в кэше результатов каждого процесса (0 - без кэша)')
+    parser.add_argument('--cache-policy', choices=CACHE_POLICIES, default='tinylfu',
+                        help='политика вытеснения кэша результатов')
+    parser.add_argument('--precision', choices=PRECISIONS, default='float64',
+                        help='точность весов документов (uint16/uint8 - квантование, только для --storage csr)')
+    parser.add_argument('--scale', choices=SCALE_AXES, default='row',
+                        help='множитель квантованных весов: на документ (row) или на термин (column)')
+    parser.add_argument('--lsa', default='', help='модель LSA из lsa.py для режима mode=lsa')
+    parser.add_argument('--spelling', type=float, nargs='?', const=DEFAULT_BUDGET_MS, default=None, metavar='MS',
+                        help=f'исправлять опечатки в словах запроса, не дольше MS мс на запрос (по умолчанию {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--ann', action='store_true',
+                        help='построить индекс приближенного поиска (mode=ann) до запуска процессов')
+    parser.add_argument('--access-log', action='store_true', help='печатать каждый запрос')
+    args = parser.parse_args()
+
+    search_engine = load_engine(args.storage, args.model, args.snapshot, args.cache_size, args.cache_policy,
+                                args.lsa or None, args.precision, args.scale, args.spelling)
+    # Ленивые структуры строятся до fork, чтобы процессы пользовались одной копией
+    search_engine.warm_up(ann=args.ann)
+    app = create_app(search_engine)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+
+    # Объекты, созданные до fork, не трогаются сборщиком мусора в обработчиках
+    # (иначе запись в заголовки объектов копировала бы страницы памяти)
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, args.host, args.port, sock.fileno(), args.access_log)
+            finally:
+                os._exit(0)
+        workers.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        spawn()
+    print(f"Сервер слушает http://{args.host}:{args.port}, процессов: {args.workers}, главный процесс: {os.getpid()}",
+          flush=True)
+
+    # Главный процесс следит за обработчиками и перезапускает упавшие
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Процесс {pid} завершился (статус {status}), запускается новый", flush=True)
+            spawn()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
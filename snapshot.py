@@ -0,0 +1,93 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Снимок - один файл с набором массивов NumPy, который открывается через mmap без разбора:
+#   заголовок - MAGIC, версия и длина описания (u32);
+#   описание  - JSON: отпечаток источника и для каждого массива тип, форма и смещение;
+#   массивы   - сырые данные, каждый выровнен на 64 байта.
+MAGIC = b'OIPSNAP\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+
+def source_fingerprint(path: str) -> str:
+    """Отпечаток файла или директории: имена, размеры и время изменения файлов"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    else:
+        entries = [path]
+    for entry in entries:
+        stat = os.stat(entry)
+        name = entry.name if isinstance(entry, os.DirEntry) else os.path.abspath(entry)
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def write_snapshot(file_path: str, fingerprint: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Записывает массивы в файл снимка (через временный файл и замену)"""
+    descriptors = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        descriptors[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    description = json.dumps({'fingerprint': fingerprint, 'arrays': descriptors}).encode('utf-8')
+    data_start = -(-(HEADER.size + len(description)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(description)))
+        f.write(description)
+        for name, array in arrays.items():
+            f.seek(data_start + descriptors[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, file_path)
+
+
+def read_snapshot(file_path: str) -> Tuple[str, Dict[str, np.ndarray]]:
+    """Открывает снимок через mmap; массивы только для чтения ссылаются на отображенный файл"""
+    with open(file_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, description_size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{file_path}: не является файлом снимка")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{file_path}: неподдерживаемая версия формата {version}")
+    description = json.loads(data[HEADER.size:HEADER.size + description_size].decode('utf-8'))
+    data_start = -(-(HEADER.size + description_size) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for name, descriptor in description['arrays'].items():
+        dtype = np.dtype(descriptor['dtype'])
+        shape = tuple(descriptor['shape'])
+        count = int(np.prod(shape)) if shape else 1
+        if count == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+            continue
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=data_start + descriptor['offset'])
+        arrays[name] = array.reshape(shape)
+    return description['fingerprint'], arrays
+
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Упаковывает строки в общий буфер utf-8 и массив смещений"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Восстанавливает список строк из буфера utf-8 и смещений"""
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
@@ -0,0 +1,300 @@
+import numpy as np
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Точность хранения значений: числа с плавающей точкой или скалярное квантование
+# беззнаковыми целыми (веса TF-IDF неотрицательны) с множителем на строку или столбец
+PRECISIONS = ('float64', 'float32', 'uint16', 'uint8')
+SCALE_AXES = ('row', 'column')
+
+
+class CSRMatrix:
+    """Разреженная матрица документ-термин в формате CSR с индексом по столбцам"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_cols: int,
+                 col_order: Optional[np.ndarray] = None, col_ptr: Optional[np.ndarray] = None,
+                 row_scale: Optional[np.ndarray] = None, col_scale: Optional[np.ndarray] = None):
+        self.indptr = indptr      # Границы строк: строка i занимает [indptr[i], indptr[i+1])
+        self.indices = indices    # Номера столбцов (терминов) для каждого ненулевого элемента
+        self.data = data          # Значения ненулевых элементов (для квантованной матрицы - целые)
+        self.n_rows = len(indptr) - 1
+        self.n_cols = n_cols
+        # Множители квантованных значений: значение = data * row_scale[строка] (или col_scale[столбец])
+        self.row_scale = row_scale
+        self.col_scale = col_scale
+
+        # Индекс по столбцам: позиции элементов, упорядоченные по номеру столбца.
+        # Внутри столбца позиции возрастают, поэтому строки идут по порядку.
+        # Готовый индекс (например, из снимка) передается параметрами.
+        if col_order is None or col_ptr is None:
+            position_type = np.int32 if len(indices) < 2**31 else np.int64
+            col_order = np.argsort(indices, kind='stable').astype(position_type)
+            col_ptr = np.zeros(n_cols + 1, dtype=np.int64)
+            np.cumsum(np.bincount(indices, minlength=n_cols), out=col_ptr[1:])
+        self.col_order = col_order
+        self.col_ptr = col_ptr
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[np.ndarray, np.ndarray]], n_cols: int,
+                  dtype=np.float64) -> 'CSRMatrix':
+        """Собирает матрицу из последовательности строк (номера столбцов, значения)"""
+        indptr = [0]
+        indices_parts = []
+        data_parts = []
+        for cols, values in rows:
+            indices_parts.append(np.asarray(cols, dtype=np.int32))
+            data_parts.append(np.asarray(values, dtype=dtype))
+            indptr.append(indptr[-1] + len(cols))
+
+        indices = np.concatenate(indices_parts) if indices_parts else np.zeros(0, dtype=np.int32)
+        data = np.concatenate(data_parts) if data_parts else np.zeros(0, dtype=dtype)
+        return cls(np.asarray(indptr, dtype=np.int64), indices, data, n_cols)
+
+    @property
+    def quantized(self) -> bool:
+        return self.row_scale is not None or self.col_scale is not None
+
+    def row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Возвращает номера столбцов и значения строки"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        cols, values = self.indices[start:end], self.data[start:end]
+        if self.row_scale is not None:
+            values = values * self.row_scale[i]
+        elif self.col_scale is not None:
+            values = values * self.col_scale[cols]
+        return cols, values
+
+    def _raw_column(self, j: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Номера строк и хранимые (возможно, квантованные) значения столбца"""
+        positions = self.col_order[self.col_ptr[j]:self.col_ptr[j + 1]]
+        rows = np.searchsorted(self.indptr, positions, side='right') - 1
+        return rows, self.data[positions]
+
+    def column(self, j: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Возвращает номера строк и значения столбца"""
+        rows, values = self._raw_column(j)
+        if self.row_scale is not None:
+            values = values * self.row_scale[rows]
+        elif self.col_scale is not None:
+            values = values * self.col_scale[j]
+        return rows, values
+
+    def dot_columns(self, cols: Sequence[int], weights: Sequence[float]) -> np.ndarray:
+        """Умножает матрицу на разреженный вектор, затрагивая только указанные столбцы.
+
+        Квантованные значения не восстанавливаются: множитель столбца входит в вес
+        запроса, а множители строк применяются к итоговым оценкам.
+        """
+        scores = np.zeros(self.n_rows)
+        for col, weight in zip(cols, weights):
+            rows, values = self._raw_column(col)
+            if self.col_scale is not None:
+                weight = weight * self.col_scale[col]
+            scores[rows] += weight * values
+        if self.row_scale is not None:
+            scores *= self.row_scale
+        return scores
+
+    def dot_columns_many(self, query_rows: np.ndarray, cols: np.ndarray, weights: np.ndarray,
+                         n_queries: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Умножает матрицу на пакет разреженных векторов запросов.
+
+        Запрос query_rows[i] имеет вес weights[i] в столбце cols[i]. Все элементы затронутых
+        столбцов собираются одним проходом; результат - ненулевые оценки в разреженном виде:
+        (номер запроса, номер строки, оценка), упорядоченные по запросу и строке.
+        """
+        cols = np.asarray(cols, dtype=np.int64)
+        starts = self.col_ptr[cols]
+        lengths = self.col_ptr[cols + 1] - starts
+        pair = np.repeat(np.arange(len(cols)), lengths)
+        # Позиции элементов выбранных столбцов: начало столбца + номер внутри столбца
+        within = np.arange(len(pair)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = self.col_order[starts[pair] + within]
+        rows = np.searchsorted(self.indptr, positions, side='right') - 1
+
+        # Суммируем вклады терминов для каждой пары (запрос, строка)
+        keys = np.asarray(query_rows, dtype=np.int64)[pair] * self.n_rows + rows
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        pair_weights = np.asarray(weights)[pair]
+        if self.col_scale is not None:
+            pair_weights = pair_weights * self.col_scale[cols[pair]]
+        scores = np.bincount(inverse, weights=pair_weights * self.data[positions], minlength=len(unique_keys))
+        score_rows = unique_keys % self.n_rows
+        if self.row_scale is not None:
+            scores *= self.row_scale[score_rows]
+        return unique_keys // self.n_rows, score_rows, scores
+
+    def with_precision(self, precision: str, scale_axis: str = 'row') -> 'CSRMatrix':
+        """Матрица с теми же элементами в заданной точности (структура и индекс по столбцам общие).
+
+        Для 'uint8' и 'uint16' значения делятся на множитель строки или столбца
+        (максимум по ней / наибольшее целое) и округляются.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Неизвестная точность: {precision}")
+        if scale_axis not in SCALE_AXES:
+            raise ValueError(f"Неизвестная ось множителей: {scale_axis}")
+        if self.data.dtype == precision and self._scale_axis() == (None if precision.startswith('float') else scale_axis):
+            return self
+        data = self.dequantized().data
+        if precision in ('float64', 'float32'):
+            return CSRMatrix(self.indptr, self.indices, data.astype(precision), self.n_cols,
+                             self.col_order, self.col_ptr)
+
+        levels = np.iinfo(precision).max
+        if scale_axis == 'row':
+            maxima = np.zeros(self.n_rows)
+            _reduce_segments(np.maximum, data, self.indptr, maxima)
+            scale = maxima / levels
+            divisors = np.repeat(scale, np.diff(self.indptr))
+        else:
+            maxima = np.zeros(self.n_cols)
+            _reduce_segments(np.maximum, data[self.col_order], self.col_ptr, maxima)
+            scale = maxima / levels
+            divisors = scale[self.indices]
+        quantized = np.rint(np.divide(data, divisors, out=np.zeros(len(data)), where=divisors > 0))
+        return CSRMatrix(self.indptr, self.indices, quantized.astype(precision), self.n_cols,
+                         self.col_order, self.col_ptr,
+                         row_scale=scale if scale_axis == 'row' else None,
+                         col_scale=scale if scale_axis == 'column' else None)
+
+    def _scale_axis(self) -> Optional[str]:
+        if self.row_scale is not None:
+            return 'row'
+        return 'column' if self.col_scale is not None else None
+
+    def dequantized(self) -> 'CSRMatrix':
+        """Матрица со значениями float64 (для неквантованной - она сама)"""
+        if not self.quantized:
+            return self
+        if self.row_scale is not None:
+            data = self.data * np.repeat(self.row_scale, np.diff(self.indptr))
+        else:
+            data = self.data * self.col_scale[self.indices]
+        return CSRMatrix(self.indptr, self.indices, data, self.n_cols, self.col_order, self.col_ptr)
+
+    def dot_dense(self, dense: np.ndarray) -> np.ndarray:
+        """Произведение на плотную матрицу (n_cols x r) блоками элементов строк"""
+        if self.quantized:
+            return self.dequantized().dot_dense(dense)
+        out = np.zeros((self.n_rows, dense.shape[1]), dtype=dense.dtype)
+        for start, end in _blocks(self.indptr):
+            lo, hi = self.indptr[start], self.indptr[end]
+            contributions = dense[self.indices[lo:hi]] * self.data[lo:hi, None].astype(dense.dtype)
+            _reduce_segments(np.add, contributions, self.indptr[start:end + 1] - lo, out[start:end])
+        return out
+
+    def transpose_dot_dense(self, dense: np.ndarray) -> np.ndarray:
+        """Произведение транспонированной матрицы на плотную (n_rows x r) по индексу столбцов"""
+        if self.quantized:
+            return self.dequantized().transpose_dot_dense(dense)
+        out = np.zeros((self.n_cols, dense.shape[1]), dtype=dense.dtype)
+        for start, end in _blocks(self.col_ptr):
+            positions = self.col_order[self.col_ptr[start]:self.col_ptr[end]]
+            rows = np.searchsorted(self.indptr, positions, side='right') - 1
+            contributions = dense[rows] * self.data[positions, None].astype(dense.dtype)
+            _reduce_segments(np.add, contributions, self.col_ptr[start:end + 1] - self.col_ptr[start], out[start:end])
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти, занимаемый массивами матрицы"""
+        scales = sum(scale.nbytes for scale in (self.row_scale, self.col_scale) if scale is not None)
+        return (self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+                + self.col_order.nbytes + self.col_ptr.nbytes + scales)
+
+
+def _blocks(ptr: np.ndarray, elements: int = 1 << 18):
+    """Делит строки (или столбцы) с границами ptr на отрезки примерно по elements элементов"""
+    n = len(ptr) - 1
+    start = 0
+    while start < n:
+        end = int(np.searchsorted(ptr, ptr[start] + elements, side='right')) - 1
+        end = min(n, max(start + 1, end))
+        yield start, end
+        start = end
+
+
+def _reduce_segments(ufunc: np.ufunc, values: np.ndarray, bounds: np.ndarray, out: np.ndarray) -> None:
+    """Сворачивает values по отрезкам [bounds[i], bounds[i+1]) в out[i]; пустые отрезки не меняются"""
+    nonempty = np.flatnonzero(np.diff(bounds) > 0)
+    if len(nonempty):
+        out[nonempty] = ufunc.reduceat(values, bounds[nonempty], axis=0)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Возвращает индексы k наибольших значений по убыванию.
+
+    При равных значениях первым идет меньший индекс, как при устойчивой сортировке.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+
+    # Частичный выбор: находим k-е по величине значение без полной сортировки
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    threshold = scores[candidates].min()
+
+    # Элементы на границе берем в порядке индексов, чтобы совпасть с полной сортировкой
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, -scores[selected]))]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """top_k_indices для каждой строки матрицы оценок: частичный выбор по строкам.
+
+    Возвращает индексы и значения размера n x min(k, число столбцов); порядок при равных
+    значениях тот же, что у top_k_indices (меньший индекс раньше).
+    """
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0 or n_rows == 0:
+        return np.zeros((n_rows, 0), dtype=np.int64), np.zeros((n_rows, 0))
+
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    threshold = np.take_along_axis(scores, candidates, axis=1).min(axis=1, keepdims=True)
+    # Если равных порогу больше, чем мест, argpartition выбирает среди них произвольно:
+    # такие строки пересчитываются с выбором меньших индексов
+    for row in np.flatnonzero((scores >= threshold).sum(axis=1) > k).tolist():
+        candidates[row] = top_k_indices(scores[row], k)
+
+    values = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -values), axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def top_k_sparse_rows(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, n_rows: int,
+                      n_cols: int, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """top_k_indices для строк разреженной матрицы неотрицательных оценок.
+
+    Ненулевые оценки сортируются внутри строк, а недостающие до k места занимают
+    столбцы с нулевой оценкой в порядке индексов, как при выборе по плотной строке.
+    Возвращает для каждой строки индексы и значения.
+    """
+    positive = values > 0
+    rows, cols, values = rows[positive], cols[positive], values[positive]
+    order = np.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+
+    # Место элемента внутри своей строки; оставляем первые k
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < k
+    rows, cols, values = rows[keep], cols[keep], values[keep]
+    bounds = np.searchsorted(rows, np.arange(n_rows + 1))
+
+    k = min(k, n_cols)
+    result = []
+    for row in range(n_rows):
+        top_cols = cols[bounds[row]:bounds[row + 1]]
+        top_values = values[bounds[row]:bounds[row + 1]]
+        missing = k - len(top_cols)
+        if missing > 0:
+            taken = set(top_cols.tolist())
+            padding = [col for col in range(min(n_cols, k + len(taken))) if col not in taken][:missing]
+            top_cols = np.concatenate([top_cols, np.asarray(padding, dtype=top_cols.dtype)])
+            top_values = np.concatenate([top_values, np.zeros(len(padding))])
+        result.append((top_cols, top_values))
+    return result
@@ -0,0 +1,132 @@
+import time
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from term_dictionary import BOUNDARY, KGRAM_SIZE, TermDictionary
+
+# Исправление опечаток в словах, которых нет в словаре терминов:
+#   1. Кандидаты - термины с достаточным числом общих 3-грамм с записью слова ($слово$): одна
+#      правка затрагивает не больше 3 из них, поэтому при d правках общих остается не меньше
+#      (число 3-грамм слова - 3d), но хотя бы одна. Списки терминов всех 3-грамм слова
+#      склеиваются, термины с длиной, отличающейся больше чем на d, отбрасываются, а число общих
+#      3-грамм остальных - число их повторов (считается одной сортировкой).
+#   2. Не больше MAX_CANDIDATES кандидатов с наибольшим числом общих 3-грамм проверяются
+#      расстоянием Левенштейна. Таблица динамического программирования считается сразу для всех
+#      кандидатов: каждая строка - несколько операций NumPy, вычисление прекращается, как только
+#      во всех строках таблицы значения больше d.
+#   3. Выбирается термин с наименьшим расстоянием, при равенстве - самый частый. Расстояния
+#      перебираются от 1 до d: у большинства опечаток исправление находится уже при строгом
+#      фильтре для одной правки, а слабый фильтр для двух правок (много кандидатов) не нужен.
+# Допустимое число правок зависит от длины слова (allowed_edits), слова короче 3 букв не исправляются.
+# На запрос отводится бюджет времени: слова, до которых очередь дошла после него, остаются как есть.
+MAX_EDITS = 2
+MAX_CANDIDATES = 256
+DEFAULT_BUDGET_MS = 5.0
+CACHE_SIZE = 10000
+# Отличает отсутствие слова в кэше от сохраненного None (исправления нет)
+_MISSING = object()
+
+
+def allowed_edits(length: int, max_edits: int = MAX_EDITS) -> int:
+    """Допустимое число правок слова: 0 для слов короче 3 букв, 1 - для слов до 5 букв"""
+    if length < 3:
+        return 0
+    return min(1, max_edits) if length < 6 else max_edits
+
+
+def bounded_levenshtein(word: str, candidates: List[str], max_distance: int) -> np.ndarray:
+    """Расстояния Левенштейна от слова до каждого кандидата (больше max_distance - max_distance + 1)"""
+    n = len(candidates)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    lengths = np.fromiter(map(len, candidates), dtype=np.int64, count=n)
+    width = int(lengths.max())
+    # Символы кандидатов - строки матрицы, хвосты заполнены кодом, которого нет в словах
+    chars = np.full((n, width), -1, dtype=np.int64)
+    codes = np.frombuffer(''.join(candidates).encode('utf-32-le'), dtype=np.uint32)
+    chars[np.repeat(np.arange(n), lengths),
+          np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)] = codes
+
+    columns = np.arange(width + 1)
+    previous = np.broadcast_to(columns, (n, width + 1))
+    for i, char in enumerate(word, 1):
+        # Замена (совпадение) или удаление символа слова
+        current = np.empty((n, width + 1), dtype=np.int64)
+        current[:, 0] = i
+        current[:, 1:] = np.minimum(previous[:, :-1] + (chars != ord(char)), previous[:, 1:] + 1)
+        # Вставки: D[i][j] = min по m <= j (D[i][m] + j - m) - накопленный минимум по строке
+        previous = np.minimum.accumulate(current - columns, axis=1) + columns
+        # Минимум строки таблицы не убывает: если он больше d, не подходит ни один кандидат
+        if previous.min() > max_distance:
+            break
+    return np.minimum(previous[np.arange(n), lengths], max_distance + 1)
+
+
+class SpellingCorrector:
+    """Исправление слов по словарю терминов через индекс 3-грамм и ограниченное расстояние Левенштейна"""
+
+    def __init__(self, dictionary: TermDictionary, budget_ms: float = DEFAULT_BUDGET_MS,
+                 max_edits: int = MAX_EDITS):
+        self.dictionary = dictionary
+        self.budget_ms = budget_ms  # Время на исправление слов одного запроса
+        self.max_edits = max_edits
+        self.kgrams = dictionary.kgrams
+        self.lengths = np.fromiter(map(len, dictionary.terms), dtype=np.int64, count=len(dictionary))
+        self._cache: Dict[str, Optional[str]] = {}  # Слово -> исправление (исправления нет - None)
+        self._lock = threading.Lock()  # Кэш общий для потоков сервера
+
+    def deadline(self) -> float:
+        """Момент (по time.perf_counter), после которого слова запроса больше не исправляются"""
+        return time.perf_counter() + self.budget_ms / 1000
+
+    def clear_cache(self) -> None:
+        """Забывает найденные исправления"""
+        with self._lock:
+            self._cache.clear()
+
+    def correct(self, word: str, deadline: Optional[float] = None) -> Optional[str]:
+        """Ближайший по написанию термин словаря или None (исправления нет или бюджет исчерпан)"""
+        with self._lock:
+            cached = self._cache.get(word, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        if deadline is None:
+            deadline = self.deadline()
+
+        # Сначала ищутся термины на расстоянии 1 (строгий фильтр 3-грамм, мало кандидатов),
+        # большее расстояние - только если ближе ничего нет
+        correction = None
+        for max_edits in range(1, allowed_edits(len(word), self.max_edits) + 1):
+            if time.perf_counter() > deadline:
+                return None
+            candidates = self.candidates(word, max_edits)
+            if time.perf_counter() > deadline:
+                return None
+            distances = bounded_levenshtein(word, [self.dictionary.terms[i] for i in candidates.tolist()], max_edits)
+            if len(distances) and distances.min() <= max_edits:
+                best = candidates[distances == distances.min()]
+                correction = self.dictionary.terms[int(best[np.argmax(self.dictionary.frequencies[best])])]
+                break
+
+        # Сюда доходит только полностью полученный результат: при исчерпании бюджета
+        # выше возвращается None, который не кэшируется
+        with self._lock:
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[word] = correction
+        return correction
+
+    def candidates(self, word: str, max_edits: int) -> np.ndarray:
+        """Номера терминов с достаточным числом общих 3-грамм, от большего числа общих к меньшему"""
+        padded = BOUNDARY + word + BOUNDARY
+        grams = list(dict.fromkeys(padded[i:i + KGRAM_SIZE] for i in range(len(padded) - KGRAM_SIZE + 1)))
+        needed = max(1, len(grams) - KGRAM_SIZE * max_edits)
+        terms = np.concatenate([self.kgrams.postings(gram) for gram in grams])
+        terms = terms[np.abs(self.lengths[terms] - len(word)) <= max_edits]
+        candidates, shared = np.unique(terms, return_counts=True)
+        keep = shared >= needed
+        candidates, shared = candidates[keep], shared[keep]
+        order = np.lexsort((candidates, -shared))[:MAX_CANDIDATES]
+        return candidates[order].astype(np.int64)
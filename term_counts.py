@@ -0,0 +1,331 @@
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from snapshot import pack_strings, unpack_strings
+from tfidf_model import TermCounts
+
+# Счетчики терминов корпуса - один файл, который пишет lab2.py, а читают lab3.py, lab4.py
+# и search_engine.py вместо текстовых файлов токенов и лемм (все числа little-endian):
+#   заголовок - MAGIC, версия, флаги, число документов, токенов и лемм, смещения разделов;
+#   документы - u64-смещения (n_docs + 1) и строки идентификаторов в UTF-8;
+#   словарь   - u64-смещения токенов (n_tokens + 1) и лемм (n_lemmas + 1), i32 id леммы
+#               каждого токена (-1, если лемма не определена), строки токенов и лемм в UTF-8;
+#               токены и леммы отсортированы, их номера - id терминов;
+#   строки    - u64-смещения строк документов (n_docs + 1), u32 длина документа (число
+#               вхождений токенов), затем для каждого документа пары (разность id токена,
+#               число вхождений) в varint, по возрастанию id токена;
+#   позиции   - u64-смещения позиций документов (n_docs + 1), затем для каждого документа
+#               позиции вхождений его токенов в порядке пар строки: первая позиция токена
+#               как есть, остальные - разностью с предыдущей, в varint. Позиция - номер
+#               слова в тексте страницы с учетом стоп-слов и коротких слов.
+# Разделы и части раздела строк выровнены на 8 байт.
+COUNTS_PATH = os.path.join('lab2results', 'term_counts.bin')
+MAGIC = b'OIPCNT\x00\x00'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIIQQQQQQ')
+HEADER_SIZE = 64
+NO_LEMMA = -1
+
+
+def encode_varints(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Кодирует неотрицательные числа в varint (по 7 бит в байте) без цикла по числам.
+
+    Возвращает байты и длину кода каждого числа.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for byte in range(int(lengths.max(initial=0))):
+        selected = lengths > byte
+        chunk = (values[selected] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        # Старший бит - признак продолжения: у всех байтов, кроме последнего
+        chunk |= np.where(lengths[selected] > byte + 1, 0x80, 0).astype(np.uint64)
+        out[starts[selected] + byte] = chunk
+    return out, lengths
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Декодирует последовательность чисел varint без цикла по байтам"""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(parts, starts).astype(np.int64)
+
+
+def _aligned(blob: bytes) -> bytes:
+    return blob + b'\x00' * (-len(blob) % 8)
+
+
+def group_cumsum(deltas: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Накопленные суммы внутри идущих подряд групп заданных размеров"""
+    totals = np.cumsum(deltas)
+    starts = np.cumsum(sizes) - sizes
+    return totals - np.repeat(totals[starts] - deltas[starts], sizes)
+
+
+def write_counts(file_path: str, token_counts: TermCounts, token_lemmas: Dict[str, Optional[str]],
+                 positions: np.ndarray) -> None:
+    """Записывает счетчики и позиции токенов документов и леммы токенов в бинарный файл.
+
+    token_lemmas - лемма каждого токена словаря token_counts (None, если не определена);
+    positions - позиции вхождений подряд для каждой пары token_counts, по возрастанию внутри пары.
+    """
+    tokens = sorted(token_counts.vocabulary)
+    lemmas = sorted({lemma for lemma in (token_lemmas[token] for token in tokens) if lemma is not None})
+    lemma_ids = {lemma: idx for idx, lemma in enumerate(lemmas)}
+    token_lemma = np.array([lemma_ids.get(token_lemmas[token], NO_LEMMA) for token in tokens], dtype=np.int32)
+
+    # id в порядке появления -> id в алфавитном порядке, внутри строки - по возрастанию id
+    remap = np.empty(len(tokens), dtype=np.int64)
+    remap[[token_counts.vocabulary[token] for token in tokens]] = np.arange(len(tokens))
+    indptr = np.frombuffer(token_counts.indptr, dtype=np.int64)
+    n_docs = len(token_counts.doc_ids)
+    rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+    ids = remap[np.frombuffer(token_counts.indices, dtype=np.int32)] if len(rows) else np.zeros(0, dtype=np.int64)
+    counts = np.frombuffer(token_counts.counts, dtype=np.uint32).astype(np.int64) if len(rows) \
+        else np.zeros(0, dtype=np.int64)
+    order = np.lexsort((ids, rows))
+    group_starts = (np.cumsum(counts) - counts)[order]
+    ids, counts = ids[order], counts[order]
+
+    # Позиции каждой пары переставляются вместе с парой
+    value_ends = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=value_ends[1:])
+    gather = np.repeat(group_starts - value_ends[:-1], counts) + np.arange(value_ends[-1])
+    positions = np.asarray(positions, dtype=np.int64)[gather]
+    # Первая позиция пары хранится как есть, остальные - разностью с предыдущей
+    position_deltas = positions.copy()
+    position_deltas[1:] -= positions[:-1]
+    group_firsts = value_ends[:-1][counts > 0]
+    position_deltas[group_firsts] = positions[group_firsts]
+    position_data, position_lengths = encode_varints(position_deltas)
+    position_ends = np.zeros(len(positions) + 1, dtype=np.int64)
+    np.cumsum(position_lengths, out=position_ends[1:])
+    position_offsets = position_ends[value_ends[indptr]]
+
+    # Первый id строки хранится как есть, остальные - разностью с предыдущим
+    deltas = ids.copy()
+    deltas[1:] -= ids[:-1]
+    row_starts = indptr[:-1][np.diff(indptr) > 0]
+    deltas[row_starts] = ids[row_starts]
+    pairs = np.empty(2 * len(ids), dtype=np.int64)
+    pairs[0::2] = deltas
+    pairs[1::2] = counts
+    data, lengths = encode_varints(pairs)
+    byte_ends = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=byte_ends[1:])
+    row_offsets = byte_ends[2 * indptr]
+    doc_lengths = np.bincount(rows, weights=counts, minlength=n_docs).astype(np.uint32)
+
+    doc_blob, doc_offsets = pack_strings(token_counts.doc_ids)
+    token_blob, token_offsets = pack_strings(tokens)
+    lemma_blob, lemma_offsets = pack_strings(lemmas)
+    docs_section = _aligned(doc_offsets.astype('<u8').tobytes() + doc_blob.tobytes())
+    vocab_section = _aligned(token_offsets.astype('<u8').tobytes() + lemma_offsets.astype('<u8').tobytes()
+                             + token_lemma.astype('<i4').tobytes() + token_blob.tobytes() + lemma_blob.tobytes())
+    rows_section = (_aligned(row_offsets.astype('<u8').tobytes() + doc_lengths.astype('<u4').tobytes())
+                    + _aligned(data.tobytes())
+                    + position_offsets.astype('<u8').tobytes() + position_data.tobytes())
+
+    docs_offset = HEADER_SIZE
+    vocab_offset = docs_offset + len(docs_section)
+    rows_offset = vocab_offset + len(vocab_section)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, n_docs, len(tokens), len(lemmas),
+                         docs_offset, vocab_offset, rows_offset)
+
+    # Пишем во временный файл и заменяем, чтобы читатели не увидели половину файла
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\x00'))
+        file.write(docs_section)
+        file.write(vocab_section)
+        file.write(rows_section)
+    os.replace(tmp_path, file_path)
+
+
+class CountsBuilder:
+    """Накопитель позиций токенов документов для записи в файл счетчиков"""
+
+    def __init__(self, token_lemmas: Optional[Dict[str, Optional[str]]] = None):
+        self.term_counts = TermCounts()
+        self.positions = array('I')
+        self.token_lemmas: Dict[str, Optional[str]] = dict(token_lemmas or {})
+
+    def add_document(self, document_id: str, token_positions: Dict[str, List[int]],
+                     token_lemmas: Optional[Dict[str, Optional[str]]] = None) -> None:
+        """Добавляет документ: позиции вхождений каждого токена (по возрастанию) и леммы новых токенов"""
+        self.term_counts.add_document(document_id, {token: len(positions)
+                                                    for token, positions in token_positions.items()})
+        for positions in token_positions.values():
+            self.positions.extend(positions)
+        if token_lemmas:
+            self.token_lemmas.update(token_lemmas)
+
+    def save(self, file_path: str) -> None:
+        """Записывает накопленные документы в файл счетчиков"""
+        positions = np.frombuffer(self.positions, dtype=np.uint32) if len(self.positions) \
+            else np.zeros(0, dtype=np.uint32)
+        write_counts(file_path, self.term_counts, self.token_lemmas, positions)
+
+
+def is_counts_file(file_path: str) -> bool:
+    """Проверяет, что файл - счетчики терминов корпуса (по MAGIC)"""
+    if not os.path.isfile(file_path):
+        return False
+    with open(file_path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class CorpusCounts:
+    """Счетчики терминов корпуса из бинарного файла: строки документов декодируются по запросу"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        data = np.fromfile(file_path, dtype=np.uint8)
+        if len(data) < HEADER_SIZE:
+            raise ValueError(f"Файл {file_path} не является файлом счетчиков терминов")
+        (magic, version, _flags, n_docs, n_tokens, n_lemmas,
+         docs_offset, vocab_offset, rows_offset) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Файл {file_path} не является файлом счетчиков терминов")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия счетчиков терминов {version} в файле {file_path}")
+
+        def take(offset: int, dtype: str, count: int) -> Tuple[np.ndarray, int]:
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            return array, offset + array.nbytes
+
+        doc_offsets, offset = take(docs_offset, '<u8', n_docs + 1)
+        self.doc_ids: List[str] = unpack_strings(data[offset:offset + doc_offsets[-1]], doc_offsets)
+
+        token_offsets, offset = take(vocab_offset, '<u8', n_tokens + 1)
+        lemma_offsets, offset = take(offset, '<u8', n_lemmas + 1)
+        self.token_lemma, offset = take(offset, '<i4', n_tokens)
+        self.tokens: List[str] = unpack_strings(data[offset:offset + token_offsets[-1]], token_offsets)
+        offset += int(token_offsets[-1])
+        self.lemmas: List[str] = unpack_strings(data[offset:offset + lemma_offsets[-1]], lemma_offsets)
+
+        self.row_offsets, offset = take(rows_offset, '<u8', n_docs + 1)
+        self.doc_lengths, offset = take(offset, '<u4', n_docs)
+        offset += -offset % 8
+        rows_end = offset + int(self.row_offsets[-1])
+        self._data = data[offset:rows_end]
+        self.position_offsets, offset = take(rows_end + (-rows_end % 8), '<u8', n_docs + 1)
+        self._positions = data[offset:offset + int(self.position_offsets[-1])]
+        self.doc_numbers = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+    def row(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """id токенов документа (по возрастанию) и число их вхождений"""
+        pairs = decode_varints(self._data[self.row_offsets[row]:self.row_offsets[row + 1]])
+        return np.cumsum(pairs[0::2]), pairs[1::2]
+
+    def token_counts(self, row: int) -> Dict[str, int]:
+        """Число вхождений каждого токена документа"""
+        ids, counts = self.row(row)
+        tokens = self.tokens
+        return {tokens[token_id]: count for token_id, count in zip(ids.tolist(), counts.tolist())}
+
+    def lemma_counts(self, row: int) -> Dict[str, int]:
+        """Число вхождений каждой леммы документа (сумма по ее словоформам)"""
+        lemma_counts = {}
+        ids, counts = self.row(row)
+        lemma_ids = self.token_lemma[ids]
+        for lemma_id, count in zip(lemma_ids.tolist(), counts.tolist()):
+            if lemma_id != NO_LEMMA:
+                lemma = self.lemmas[lemma_id]
+                lemma_counts[lemma] = lemma_counts.get(lemma, 0) + count
+        return lemma_counts
+
+    def positions(self, row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """id токенов документа, число их вхождений и позиции вхождений (подряд для каждого токена)"""
+        ids, counts = self.row(row)
+        deltas = decode_varints(self._positions[self.position_offsets[row]:self.position_offsets[row + 1]])
+        return ids, counts, group_cumsum(deltas, counts) if len(deltas) else deltas
+
+    def token_positions(self, row: int) -> Dict[str, List[int]]:
+        """Позиции вхождений каждого токена документа"""
+        ids, counts, positions = self.positions(row)
+        tokens = self.tokens
+        return {tokens[token_id]: group.tolist()
+                for token_id, group in zip(ids.tolist(), np.split(positions, np.cumsum(counts)[:-1]))}
+
+    def lemma_positions(self, row: int) -> Dict[str, np.ndarray]:
+        """Позиции вхождений каждой леммы документа (объединение позиций ее словоформ)"""
+        ids, counts, positions = self.positions(row)
+        lemma_ids = np.repeat(self.token_lemma[ids], counts)
+        keep = lemma_ids != NO_LEMMA
+        lemma_ids, positions = lemma_ids[keep], positions[keep]
+        order = np.lexsort((positions, lemma_ids))
+        lemma_ids, positions = lemma_ids[order], positions[order]
+        starts = np.flatnonzero(np.diff(lemma_ids, prepend=NO_LEMMA))
+        lemmas = self.lemmas
+        return {lemmas[lemma_id]: group
+                for lemma_id, group in zip(lemma_ids[starts].tolist(), np.split(positions, starts[1:]))}
+
+    def lemma_map(self) -> Dict[str, Optional[str]]:
+        """Лемма каждого токена словаря (None, если не определена)"""
+        lemmas = self.lemmas
+        return {token: lemmas[lemma_id] if lemma_id != NO_LEMMA else None
+                for token, lemma_id in zip(self.tokens, self.token_lemma.tolist())}
+
+    def lemma_tokens(self, row: int) -> Dict[str, Set[str]]:
+        """Леммы документа и их словоформы (как в файлах лемм задания 2)"""
+        terms: Dict[str, Set[str]] = {}
+        ids, _ = self.row(row)
+        for token_id, lemma_id in zip(ids.tolist(), self.token_lemma[ids].tolist()):
+            if lemma_id != NO_LEMMA:
+                terms.setdefault(self.lemmas[lemma_id], set()).add(self.tokens[token_id])
+        return terms
+
+    def term_counts(self, lemmas: bool = False) -> TermCounts:
+        """Счетчики токенов или лемм всех документов для расчета TF-IDF (декодируются за один проход)"""
+        pairs = decode_varints(self._data[:self.row_offsets[-1]])
+        # Смещения строк в байтах -> номера пар: число чисел, закодированных до смещения
+        value_ends = np.flatnonzero(self._data[:self.row_offsets[-1]] < 0x80) + 1
+        indptr = np.searchsorted(value_ends, self.row_offsets, side='right') // 2
+        rows = np.repeat(np.arange(self.n_docs), np.diff(indptr))
+
+        # id токенов - накопленные разности внутри каждой строки
+        ids = np.cumsum(pairs[0::2])
+        row_starts = indptr[:-1][np.diff(indptr) > 0]
+        base = np.zeros(self.n_docs, dtype=np.int64)
+        base[rows[row_starts]] = np.where(row_starts > 0, ids[row_starts - 1], 0)
+        ids -= base[rows]
+        counts = pairs[1::2]
+        terms = self.tokens
+
+        if lemmas:
+            # Словоформы одной леммы складываются; токены без леммы пропускаются
+            lemma_ids = self.token_lemma[ids].astype(np.int64)
+            keep = lemma_ids != NO_LEMMA
+            keys, inverse = np.unique(rows[keep] * len(self.lemmas) + lemma_ids[keep], return_inverse=True)
+            counts = np.bincount(inverse, weights=counts[keep]).astype(np.int64)
+            rows, ids = np.divmod(keys, max(1, len(self.lemmas)))
+            indptr = np.zeros(self.n_docs + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=self.n_docs), out=indptr[1:])
+            terms = self.lemmas
+
+        result = TermCounts()
+        result.vocabulary = {term: idx for idx, term in enumerate(terms)}
+        result.doc_ids = list(self.doc_ids)
+        result.indptr.frombytes(indptr[1:].astype(np.int64).tobytes())
+        result.indices.frombytes(ids.astype(np.int32).tobytes())
+        result.counts.frombytes(counts.astype(np.uint32).tobytes())
+        return result
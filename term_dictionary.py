@@ -0,0 +1,178 @@
+import re
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Словарь терминов для запросов с масками и автодополнения:
+#   - термины хранятся отсортированным списком, все термины с префиксом (програм*) - отрезок
+#     списка, границы которого находятся двоичным поиском;
+#   - маски * (любая последовательность символов) и ? (один символ) без префикса или с коротким
+#     префиксом (*грамм*, ?рограмма) проверяются через индекс k-грамм: для каждой тройки
+#     символов записи термина с границами ($программа$ -> $пр, про, ..., ма$) хранятся номера
+#     терминов. Кандидаты - пересечение списков k-грамм маски, затем каждый сверяется с маской.
+# Номера терминов - позиции в отсортированном списке; частоты (число документов) задают порядок
+# подсказок и выбор терминов, если маске подходит больше max_expansions.
+WILDCARDS = '*?'
+BOUNDARY = '$'
+KGRAM_SIZE = 3
+MAX_EXPANSIONS = 100
+# Префикс, под который попадает больше терминов, дополнительно сужается по k-граммам
+PREFIX_SCAN_LIMIT = 256
+# Код символа занимает 21 бит, k-грамма из 3 символов - одно число int64
+CHAR_BITS = 21
+
+
+def is_wildcard(token: str) -> bool:
+    """Содержит ли токен запроса символы маски"""
+    return any(char in token for char in WILDCARDS)
+
+
+def wildcard_regex(pattern: str) -> 're.Pattern':
+    """Регулярное выражение для проверки термина маской"""
+    return re.compile(''.join('.*' if char == '*' else '.' if char == '?' else re.escape(char) for char in pattern),
+                      re.DOTALL)
+
+
+def pattern_grams(pattern: str, k: int = KGRAM_SIZE) -> List[str]:
+    """k-граммы, которые обязательно есть в записи любого термина, подходящего под маску"""
+    grams = []
+    for piece in re.split('[*?]', BOUNDARY + pattern + BOUNDARY):
+        grams.extend(piece[i:i + k] for i in range(len(piece) - k + 1))
+    return list(dict.fromkeys(grams))
+
+
+class KGramIndex:
+    """Номера терминов по k-граммам их записи с границами ($термин$)"""
+
+    def __init__(self, terms: Sequence[str], k: int = KGRAM_SIZE):
+        self.k = k
+        padded = [BOUNDARY + term + BOUNDARY for term in terms]
+        lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+        chars = np.frombuffer(''.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+        # k-грамма начинается в каждой позиции, от которой до конца записи термина не меньше k символов
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else lengths
+        grams_per_term = np.maximum(lengths - k + 1, 0)
+        owners = np.repeat(np.arange(len(padded), dtype=np.int64), grams_per_term)
+        first = np.repeat(starts - np.concatenate(([0], np.cumsum(grams_per_term)[:-1])), grams_per_term) \
+            if len(lengths) else lengths
+        positions = np.arange(len(owners), dtype=np.int64) + first
+        codes = np.zeros(len(owners), dtype=np.int64)
+        for offset in range(k):
+            codes = (codes << CHAR_BITS) | chars[positions + offset]
+
+        # Пары (k-грамма, термин) по возрастанию без повторов (k-грамма может встретиться в термине дважды)
+        order = np.lexsort((owners, codes))
+        codes, owners = codes[order], owners[order]
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+        codes, owners = codes[keep], owners[keep]
+        boundaries = np.flatnonzero(np.concatenate(([len(codes) > 0], codes[1:] != codes[:-1])))
+        self.gram_codes = codes[boundaries]
+        self.gram_ptr = np.append(boundaries, len(codes)).astype(np.int64)
+        self.term_ids = owners.astype(np.uint32)
+
+    def gram_code(self, gram: str) -> int:
+        code = 0
+        for char in gram:
+            code = (code << CHAR_BITS) | ord(char)
+        return code
+
+    def postings(self, gram: str) -> np.ndarray:
+        """Номера терминов с k-граммой по возрастанию"""
+        code = self.gram_code(gram)
+        position = int(np.searchsorted(self.gram_codes, code))
+        if position == len(self.gram_codes) or self.gram_codes[position] != code:
+            return self.term_ids[:0]
+        return self.term_ids[self.gram_ptr[position]:self.gram_ptr[position + 1]]
+
+    def candidates(self, grams: Iterable[str]) -> np.ndarray:
+        """Номера терминов, в записи которых есть все k-граммы (пересечение от коротких списков)"""
+        lists = sorted((self.postings(gram) for gram in grams), key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return self.gram_codes.nbytes + self.gram_ptr.nbytes + self.term_ids.nbytes
+
+
+class TermDictionary:
+    """Отсортированный словарь терминов с частотами: префиксы, маски и подсказки"""
+
+    def __init__(self, terms: Iterable[str], frequencies: Optional[Iterable[int]] = None):
+        terms = list(terms)
+        frequencies = np.zeros(len(terms), dtype=np.int64) if frequencies is None \
+            else np.fromiter(frequencies, dtype=np.int64, count=len(terms))
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        self.terms = [terms[i] for i in order]
+        self.frequencies = frequencies[np.array(order, dtype=np.int64)] if terms else frequencies
+        self._kgrams: Optional[KGramIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @property
+    def kgrams(self) -> KGramIndex:
+        """Индекс k-грамм (строится при первой маске, которой он нужен)"""
+        if self._kgrams is None:
+            self._kgrams = KGramIndex(self.terms)
+        return self._kgrams
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Отрезок [low, high) номеров терминов, начинающихся с префикса"""
+        low = bisect_left(self.terms, prefix)
+        if not prefix:
+            return low, len(self.terms)
+        # Все строки с префиксом меньше префикса с увеличенным последним символом
+        return low, bisect_left(self.terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), low)
+
+    def match(self, pattern: str) -> np.ndarray:
+        """Номера терминов, подходящих под маску, по возрастанию"""
+        prefix = re.split('[*?]', pattern, maxsplit=1)[0]
+        low, high = self.prefix_range(prefix)
+        if prefix == pattern:
+            # Маски нет: точное совпадение
+            return np.arange(low, low + 1 if low < high and self.terms[low] == pattern else low, dtype=np.int64)
+        if pattern == prefix + '*':
+            return np.arange(low, high, dtype=np.int64)
+
+        grams = pattern_grams(pattern, KGRAM_SIZE)
+        if grams and high - low > PREFIX_SCAN_LIMIT:
+            candidates = self.kgrams.candidates(grams).astype(np.int64)
+            candidates = candidates[(candidates >= low) & (candidates < high)]
+        else:
+            candidates = np.arange(low, high, dtype=np.int64)
+        regex = wildcard_regex(pattern)
+        terms = self.terms
+        return np.array([i for i in candidates.tolist() if regex.fullmatch(terms[i])], dtype=np.int64)
+
+    def expand(self, pattern: str, limit: int = MAX_EXPANSIONS) -> Tuple[List[str], int]:
+        """Термины по маске (не больше limit самых частых, в порядке словаря) и число всех подходящих"""
+        ids = self.match(pattern)
+        total = len(ids)
+        if total > limit:
+            ids = np.sort(ids[self._by_frequency(ids)[:limit]])
+        return [self.terms[i] for i in ids.tolist()], total
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Самые частые термины с префиксом: (термин, частота) по убыванию частоты"""
+        if not prefix or limit <= 0:
+            return []
+        low, high = self.prefix_range(prefix)
+        ids = np.arange(low, high, dtype=np.int64)
+        if len(ids) > limit:
+            # Частичный выбор: сортируются только термины не реже limit-го
+            threshold = np.partition(self.frequencies[low:high], len(ids) - limit)[len(ids) - limit]
+            ids = ids[self.frequencies[low:high] >= threshold]
+        ids = ids[self._by_frequency(ids)[:limit]]
+        return [(self.terms[i], int(self.frequencies[i])) for i in ids.tolist()]
+
+    def _by_frequency(self, ids: np.ndarray) -> np.ndarray:
+        """Порядок номеров по убыванию частоты, при равной частоте - по словарю"""
+        return np.lexsort((ids, -self.frequencies[ids]))
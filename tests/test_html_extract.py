@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from html_extract import READ_BLOCK_SIZE, TextExtractor, get_extractor
+from lab2 import Tokenizer
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pages')
+PAGES = sorted(name for name in os.listdir(PAGES_DIR) if name.endswith('.html')) if os.path.isdir(PAGES_DIR) else []
+
+
+def assert_same_tokens(file_path: str) -> None:
+    """Потоковое извлечение дает те же токены на тех же позициях, что и BeautifulSoup"""
+    assert Tokenizer('stream').token_positions(file_path) == Tokenizer('bs4').token_positions(file_path)
+
+
+@pytest.mark.skipif(not PAGES, reason='нет загруженных страниц')
+@pytest.mark.parametrize('name', PAGES)
+def test_stream_matches_bs4_on_pages(name):
+    assert_same_tokens(os.path.join(PAGES_DIR, name))
+
+
+def test_stream_matches_bs4_on_markup(tmp_path):
+    # Скрытые теги, комментарии, сущности, вложенные теги и текстовый узел на границе блока чтения
+    padding = 'слово ' * (READ_BLOCK_SIZE // len('слово ') + 10)
+    html = ('<!DOCTYPE html><html><head><title>Заголовок страницы</title>'
+            '<style>.поиск { color: red }</style><script>var текст = "скрипт";</script></head>'
+            '<body><nav>Меню сайта</nav><!-- комментарий не текст -->'
+            '<p>Первый&nbsp;абзац &laquo;в кавычках&raquo; <b>жирный</b><i>курсив</i></p>'
+            '<template><p>шаблон</p></template><br/>после переноса'
+            f'<div>{padding}граница блока</div><footer>Подвал</footer></body></html>')
+    file_path = tmp_path / 'page.html'
+    file_path.write_text(html, encoding='utf-8')
+    assert_same_tokens(str(file_path))
+
+
+def test_stream_nochrome_skips_site_chrome(tmp_path):
+    file_path = tmp_path / 'page.html'
+    file_path.write_text('<header>шапка</header><nav>меню</nav><main>содержание</main>'
+                         '<aside>панель</aside><footer>подвал</footer>', encoding='utf-8')
+    text = ' '.join(get_extractor('stream-nochrome').iter_text(str(file_path))).split()
+    assert text == ['содержание']
+
+
+def test_text_extractor_is_abstract():
+    with pytest.raises(TypeError):
+        TextExtractor()
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+from spelling import SpellingCorrector, allowed_edits, bounded_levenshtein
+from term_dictionary import TermDictionary
+
+TERMS = ['абсолютный', 'абстрактный', 'алгоритм', 'алгоритмический', 'поиск', 'поиска']
+FREQUENCIES = [5, 3, 10, 2, 7, 1]
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Эталонное расстояние Левенштейна по строкам таблицы"""
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+
+def make_corrector(**options) -> SpellingCorrector:
+    return SpellingCorrector(TermDictionary(TERMS, FREQUENCIES), **options)
+
+
+def test_bounded_levenshtein_matches_reference():
+    rng = np.random.default_rng(0)
+    letters = 'абвгде'
+    for _ in range(200):
+        word = ''.join(rng.choice(list(letters), size=int(rng.integers(1, 8))))
+        candidates = [''.join(rng.choice(list(letters), size=int(rng.integers(1, 8)))) for _ in range(20)]
+        distances = bounded_levenshtein(word, candidates, 2)
+        assert distances.tolist() == [min(levenshtein(word, candidate), 3) for candidate in candidates]
+
+
+def test_allowed_edits_depends_on_length():
+    assert [allowed_edits(length) for length in (2, 3, 5, 6, 12)] == [0, 1, 1, 2, 2]
+
+
+def test_corrects_to_nearest_term():
+    corrector = make_corrector()
+    assert corrector.correct('абслютный') == 'абсолютный'
+    assert corrector.correct('алгоритн') == 'алгоритм'
+    assert corrector.correct('абсалютнэй') == 'абсолютный'
+
+
+def test_equal_distance_prefers_frequent_term():
+    # 'поиске' на расстоянии 1 и от 'поиск', и от 'поиска'; 'поиск' чаще
+    assert make_corrector().correct('поиске') == 'поиск'
+
+
+def test_no_correction_for_short_or_distant_words():
+    corrector = make_corrector()
+    assert corrector.correct('кд') is None
+    assert corrector.correct('метрополитен') is None
+
+
+def test_exhausted_budget_is_not_cached():
+    corrector = make_corrector()
+    # Срок уже прошел: исправление не ищется и не запоминается
+    assert corrector.correct('абслютный', deadline=time.perf_counter() - 1) is None
+    assert corrector.correct('абслютный') == 'абсолютный'
+
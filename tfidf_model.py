@@ -0,0 +1,178 @@
+import os
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from sparse_matrix import CSRMatrix
+from snapshot import pack_strings, unpack_strings
+
+# Колоночный бинарный формат модели TF-IDF (несжатый .npz):
+#   terms_blob/terms_offsets     - отсортированный словарь терминов (utf-8)
+#   doc_ids_blob/doc_ids_offsets - идентификаторы документов в порядке строк
+#   df, idf                      - документная частота и IDF по id термина
+#   indptr, indices              - структура CSR: строки - документы, столбцы - id терминов
+#   counts, weights              - число вхождений и вес TF-IDF для каждого ненулевого элемента
+FORMAT_VERSION = 1
+
+
+def _to_numpy(values: array, dtype) -> np.ndarray:
+    return np.frombuffer(values, dtype=dtype).copy() if len(values) else np.zeros(0, dtype=dtype)
+
+
+class TermCounts:
+    """Накопитель числа вхождений терминов по документам.
+
+    Термины получают целочисленные id в порядке появления, а счетчики документов
+    дописываются в компактные массивы, так что каждый файл читается один раз.
+    """
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}   # Термин -> id в порядке появления
+        self.doc_ids: List[str] = []
+        self.indptr = array('q', [0])
+        self.indices = array('i')
+        self.counts = array('I')
+
+    def add_document(self, doc_id: str, counts: Dict[str, int]) -> None:
+        """Добавляет строку документа: число вхождений каждого термина"""
+        vocabulary = self.vocabulary
+        indices = self.indices
+        for term, count in counts.items():
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                term_id = vocabulary[term] = len(vocabulary)
+            indices.append(term_id)
+        self.counts.extend(counts.values())
+        self.doc_ids.append(doc_id)
+        self.indptr.append(len(indices))
+
+    def extend(self, other: 'TermCounts') -> None:
+        """Дописывает документы другого накопителя (шаг reduce при параллельном подсчете).
+
+        id терминов другого накопителя переводятся в id этого, порядок документов сохраняется.
+        """
+        vocabulary = self.vocabulary
+        # Словарь заполнялся по порядку id, поэтому обход дает термины в порядке их id
+        remap = np.empty(len(other.vocabulary), dtype=np.int32)
+        for term, other_id in other.vocabulary.items():
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                term_id = vocabulary[term] = len(vocabulary)
+            remap[other_id] = term_id
+
+        offset = self.indptr[-1]
+        self.indices.frombytes(remap[_to_numpy(other.indices, np.int32)].tobytes())
+        self.indptr.frombytes((_to_numpy(other.indptr, np.int64)[1:] + offset).tobytes())
+        self.counts.extend(other.counts)
+        self.doc_ids.extend(other.doc_ids)
+
+
+class TfIdfModel:
+    """Веса TF-IDF корпуса в виде разреженной матрицы документ-термин.
+
+    TF - доля вхождений термина среди всех вхождений документа, IDF - log(N / DF).
+    """
+
+    def __init__(self, terms: List[str], doc_ids: List[str], df: np.ndarray, idf: np.ndarray,
+                 indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray, weights: np.ndarray):
+        self.terms = terms
+        self.doc_ids = doc_ids
+        self.df = df
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.weights = weights
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def from_counts(cls, term_counts: TermCounts) -> 'TfIdfModel':
+        """Вычисляет DF, IDF и веса по накопленным счетчикам одним векторным шагом"""
+        terms = sorted(term_counts.vocabulary)
+        n_terms = len(terms)
+        n_docs = len(term_counts.doc_ids)
+
+        # id в порядке появления -> id в алфавитном порядке
+        remap = np.empty(n_terms, dtype=np.int32)
+        first_seen = np.fromiter((term_counts.vocabulary[term] for term in terms), dtype=np.int64, count=n_terms)
+        remap[first_seen] = np.arange(n_terms, dtype=np.int32)
+
+        indptr = _to_numpy(term_counts.indptr, np.int64)
+        indices = remap[_to_numpy(term_counts.indices, np.int32)]
+        counts = _to_numpy(term_counts.counts, np.uint32)
+
+        # Внутри строки столбцы упорядочиваются по термину
+        rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+        order = np.lexsort((indices, rows))
+        indices = indices[order]
+        counts = counts[order]
+
+        df = np.bincount(indices, minlength=n_terms).astype(np.int64)
+        # math.log, чтобы значения совпадали с прежним построчным расчетом до бита
+        idf = np.array([math.log(n_docs / value) if value else 0.0 for value in df.tolist()], dtype=np.float64)
+        totals = np.bincount(rows, weights=counts, minlength=n_docs)
+        doc_totals = totals[rows]
+        tf = np.divide(counts, doc_totals, out=np.zeros(len(counts)), where=doc_totals > 0)
+        weights = tf * idf[indices]
+
+        return cls(terms, list(term_counts.doc_ids), df, idf, indptr, indices, counts, weights)
+
+    def row_counts(self, row: int) -> Dict[str, int]:
+        """Число вхождений терминов документа (для пересборки модели без перечитывания файлов)"""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        terms = self.terms
+        return {terms[col]: count for col, count in
+                zip(self.indices[start:end].tolist(), self.counts[start:end].tolist())}
+
+    def matrix(self) -> CSRMatrix:
+        """Матрица весов TF-IDF"""
+        return CSRMatrix(self.indptr, self.indices, self.weights, len(self.terms))
+
+    def rows_with_terms(self, term_ids: Sequence[int]) -> np.ndarray:
+        """Номера строк документов, содержащих хотя бы один из терминов"""
+        rows = np.repeat(np.arange(self.n_docs), np.diff(self.indptr))
+        return np.unique(rows[np.isin(self.indices, term_ids)])
+
+    def save(self, file_path: str) -> None:
+        """Сохраняет модель в колоночный бинарный файл (атомарной заменой)"""
+        terms_blob, terms_offsets = pack_strings(self.terms)
+        doc_ids_blob, doc_ids_offsets = pack_strings(self.doc_ids)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, format_version=np.array(FORMAT_VERSION),
+                     terms_blob=terms_blob, terms_offsets=terms_offsets,
+                     doc_ids_blob=doc_ids_blob, doc_ids_offsets=doc_ids_offsets,
+                     df=self.df, idf=self.idf, indptr=self.indptr, indices=self.indices,
+                     counts=self.counts, weights=self.weights)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'TfIdfModel':
+        """Загружает модель из бинарного файла"""
+        with np.load(file_path, allow_pickle=False) as data:
+            version = int(data['format_version'])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{file_path}: неподдерживаемая версия формата {version}")
+            return cls(unpack_strings(data['terms_blob'], data['terms_offsets']),
+                       unpack_strings(data['doc_ids_blob'], data['doc_ids_offsets']),
+                       data['df'], data['idf'], data['indptr'], data['indices'],
+                       data['counts'], data['weights'])
+
+    def export_text(self, output_dir: str, doc_ids: Optional[Iterable[str]] = None) -> None:
+        """Выгружает документы в текстовые файлы N.txt формата <термин> <idf> <tf-idf>"""
+        os.makedirs(output_dir, exist_ok=True)
+        selected = None if doc_ids is None else set(doc_ids)
+        terms = self.terms
+        idf = self.idf.tolist()
+        for row, doc_id in enumerate(self.doc_ids):
+            if selected is not None and doc_id not in selected:
+                continue
+            start, end = self.indptr[row], self.indptr[row + 1]
+            with open(os.path.join(output_dir, f"{doc_id}.txt"), 'w', encoding='utf-8') as f:
+                for col, tf_idf in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                    f.write(f"{terms[col]} {idf[col]:.6f} {tf_idf:.6f}\n")